@@ -0,0 +1,129 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Optional
+
+import httpx
+
+from observability.tracing import propagation_headers
+
+# How the agent's tools reach the parking API:
+#   "http" (default): a pooled keep-alive client against API_BASE_URL,
+#   "inprocess": straight into the FastAPI app in this process through httpx's ASGI transport,
+#   with no socket at all. Use it when the agent and the API run in the same process.
+AGENT_API_TRANSPORT = os.getenv("AGENT_API_TRANSPORT", "http").lower()
+API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
+API_TIMEOUT_SECONDS = float(os.getenv("API_TIMEOUT", "10"))
+API_CONNECT_TIMEOUT_SECONDS = float(os.getenv("API_CONNECT_TIMEOUT", "2"))
+# Retries only cover failures to connect, so a booking POST is never sent twice.
+API_RETRIES = int(os.getenv("API_RETRIES", "2"))
+API_MAX_CONNECTIONS = int(os.getenv("API_MAX_CONNECTIONS", "20"))
+# Base URL for in-process requests; it only fills in the Host header.
+IN_PROCESS_BASE_URL = "http://parking-api.internal"
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(API_TIMEOUT_SECONDS, connect=API_CONNECT_TIMEOUT_SECONDS)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=API_MAX_CONNECTIONS, max_keepalive_connections=API_MAX_CONNECTIONS)
+
+
+# Request hooks put the caller's trace in the headers, so the API's spans (and its crud spans)
+# land in the same trace as the tool call. Headers rather than the context: the in-process
+# transport runs the app on another thread's event loop.
+def _inject_trace(request: httpx.Request):
+    request.headers.update(propagation_headers())
+
+
+async def _ainject_trace(request: httpx.Request):
+    request.headers.update(propagation_headers())
+
+
+def _asgi_app():
+    # Imported lazily: in "http" mode the agent must not build the API's indexes on import.
+    from app.main import app
+    from app.release_scheduler import release_scheduler
+
+    # Uvicorn runs the app's lifespan, which starts the scheduler; with no server in this
+    # process nobody else would. start() is a no-op if it is already running.
+    release_scheduler.start()
+    return app
+
+
+class InProcessTransport(httpx.BaseTransport):
+    """
+    Synchronous httpx transport that hands each request to the ASGI app. The app runs on one
+    background event loop, so the agent's sync tools (called from any thread) can use it.
+    """
+
+    def __init__(self, app):
+        self._transport = httpx.ASGITransport(app=app)
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="agent-asgi-loop", daemon=True).start()
+
+    async def _handle(self, request: httpx.Request) -> httpx.Response:
+        response = await self._transport.handle_async_request(request)
+        content = await response.aread()
+        return httpx.Response(response.status_code, headers=response.headers, content=content, request=request)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return asyncio.run_coroutine_threadsafe(self._handle(request), self._loop).result()
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_client: Optional[httpx.Client] = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def build_api_client(transport: str = AGENT_API_TRANSPORT) -> httpx.Client:
+    if transport == "inprocess":
+        return httpx.Client(base_url=IN_PROCESS_BASE_URL, transport=InProcessTransport(_asgi_app()), timeout=_timeout(),
+                            event_hooks={"request": [_inject_trace]})
+    if transport == "http":
+        return httpx.Client(
+            base_url=API_BASE_URL,
+            timeout=_timeout(),
+            transport=httpx.HTTPTransport(retries=API_RETRIES, limits=_limits()),
+            event_hooks={"request": [_inject_trace]},
+        )
+    raise ValueError(f"Unknown AGENT_API_TRANSPORT '{transport}'; expected 'http' or 'inprocess'.")
+
+
+def build_async_api_client(transport: str = AGENT_API_TRANSPORT) -> httpx.AsyncClient:
+    if transport == "inprocess":
+        return httpx.AsyncClient(base_url=IN_PROCESS_BASE_URL, transport=httpx.ASGITransport(app=_asgi_app()), timeout=_timeout(),
+                                 event_hooks={"request": [_ainject_trace]})
+    if transport == "http":
+        return httpx.AsyncClient(
+            base_url=API_BASE_URL,
+            timeout=_timeout(),
+            transport=httpx.AsyncHTTPTransport(retries=API_RETRIES, limits=_limits()),
+            event_hooks={"request": [_ainject_trace]},
+        )
+    raise ValueError(f"Unknown AGENT_API_TRANSPORT '{transport}'; expected 'http' or 'inprocess'.")
+
+
+def get_api_client() -> httpx.Client:
+    """Process-wide client for the agent's tools; httpx.Client is thread-safe and keeps connections alive."""
+    global _client
+    if _client is None:
+        with _clients_lock:
+            if _client is None:
+                _client = build_api_client()
+    return _client
+
+
+def get_async_api_client() -> httpx.AsyncClient:
+    """Shared AsyncClient for the running event loop (an AsyncClient's connections belong to one loop)."""
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = _async_clients[loop] = build_async_api_client()
+        return client
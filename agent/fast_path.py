@@ -0,0 +1,209 @@
+import datetime
+import os
+import re
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+from .api_client import get_api_client
+from .tools import book_parking_tool, format_booking_window
+from observability.logs import get_logger
+from observability.tracing import span
+
+logger = get_logger(__name__)
+
+# Structured turns ("book slot 4 for KA01AB1234", "show my bookings", "booking 12 status") are
+# answered by FastPathRouter without the LLM; everything else, and anything it is unsure about,
+# still goes to the agent executor.
+AGENT_FAST_PATH = os.getenv("AGENT_FAST_PATH", "true").lower() not in ("0", "false", "no")
+# Longer messages usually carry something the rules would drop ("book slot 4 but only if...").
+MAX_FAST_PATH_WORDS = 14
+USER_BOOKINGS_SHOWN = 10
+
+# Any of these means the user wants something the rules don't handle, so the LLM takes the turn.
+HANDOFF_WORDS = re.compile(r"\b(cancel|change|extend|modify|move|instead|not|don't|dont|why|how|if|or|and then)\b", re.I)
+BOOK_SLOT = re.compile(r"\bbook(?:\s+(?:the|a))?\s+(?:parking\s+)?(?:slot|spot)\s*(?:id\s*|#\s*|number\s*|no\.?\s*)?(\d+)\b", re.I)
+# A registration number: letters and digits mixed, after "for", "vehicle", "plate"...
+VEHICLE = re.compile(
+    r"\b(?:for|vehicle|car|plate|registration|reg)\s*(?:number|no\.?)?\s*:?\s*"
+    r"([A-Za-z]{1,3}(?=[A-Za-z0-9-]*\d)[A-Za-z0-9-]{3,12}[0-9])\b",
+    re.I,
+)
+DURATION = re.compile(r"\b(\d{1,2})\s*(?:hours?|hrs?|h)\b", re.I)
+DATE = re.compile(r"\b(today|tomorrow|\d{4}-\d{2}-\d{2})\b", re.I)
+# Words a booking message may have left once the slot, plate, duration and date are taken out.
+# Anything else ("30 minutes", "next friday", "my other car") is something the rules didn't
+# understand, so the LLM takes the turn instead of the session state filling in a guess.
+FILLER_WORDS = frozenset("""
+    please pls kindly can could would will you i i'd want like to me my a the for it that this one
+    on now ok okay yes yeah sure thanks thank just go ahead with
+""".split())
+WORD = re.compile(r"[a-z0-9']+")
+MY_BOOKINGS = re.compile(r"^\s*(?:(?:please\s+)?(?:show|list|view|see|get|display|check)(?:\s+me)?\s+|what are\s+)?(?:all\s+)?my\s+bookings\s*\??\s*$", re.I)
+BOOKING_STATUS = re.compile(
+    r"^\s*(?:(?:what(?:'s| is) the\s+|check\s+(?:the\s+)?|show\s+(?:me\s+)?)?(?:status|details)\s+(?:of|for)\s+)?"
+    r"(?:my\s+)?booking\s*(?:id\s*|#\s*|number\s*|no\.?\s*)?(\d+)(?:\s+(?:status|details))?\s*\??\s*$",
+    re.I,
+)
+
+
+class FastPathMatch(NamedTuple):
+    intent: str
+    params: Dict[str, object]
+
+
+class SessionState:
+    """
+    What a session has already told the agent, learned from the tool calls the LLM made
+    (search criteria, vehicle number) so follow-ups like "book slot 4 for KA01AB1234" can be
+    completed without asking again.
+    """
+
+    def __init__(self):
+        self.vehicle_type: Optional[str] = None
+        self.location: Optional[str] = None
+        self.date: Optional[str] = None
+        self.duration_hours: Optional[int] = None
+        self.vehicle_number: Optional[str] = None
+
+    def observe_tool_call(self, tool: str, tool_input) -> None:
+        if not isinstance(tool_input, dict):
+            return
+        if tool == "SearchParkingSpots":
+            self.vehicle_type = tool_input.get("vehicle_type", self.vehicle_type)
+            self.location = tool_input.get("location", self.location)
+            # A search without a date means "now"; don't carry an older search's date over.
+            self.date = tool_input.get("date")
+            self.duration_hours = tool_input.get("duration_hours", self.duration_hours)
+        elif tool == "BookParkingSpot":
+            self.vehicle_number = tool_input.get("vehicle_number", self.vehicle_number)
+
+
+class FastPathRouter:
+    """
+    Rule-based intent parser with slot filling. parse() returns a FastPathMatch only when the
+    intent is unambiguous, every word of the message is understood, and every parameter it
+    needs is in the message or the session state; otherwise None, and the turn goes to the
+    LLM. handle() parses and answers through the same API the tools use, with the same reply
+    templates, and counts the turns for stats().
+    """
+
+    def __init__(self):
+        self.turns_total = 0
+        self.fast_path_total = 0
+        self.fast_path_seconds = 0.0
+        self.by_intent: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def parse(self, text: str, state: SessionState) -> Optional[FastPathMatch]:
+        if len(text.split()) > MAX_FAST_PATH_WORDS or HANDOFF_WORDS.search(text):
+            return None
+        if MY_BOOKINGS.match(text):
+            return FastPathMatch("my_bookings", {})
+        status = BOOKING_STATUS.match(text)
+        if status:
+            return FastPathMatch("booking_status", {"booking_id": int(status.group(1))})
+        book = BOOK_SLOT.search(text)
+        if book:
+            rest = text[:book.start()] + " " + text[book.end():]
+            found = {}
+            for field, pattern in (("vehicle", VEHICLE), ("duration", DURATION), ("date", DATE)):
+                matches = list(pattern.finditer(rest))
+                if len(matches) > 1:
+                    return None
+                found[field] = matches[0] if matches else None
+                if matches:
+                    rest = rest[:matches[0].start()] + " " + rest[matches[0].end():]
+            # Session state only fills a field the message says nothing about.
+            if any(word not in FILLER_WORDS for word in WORD.findall(rest.lower())):
+                return None
+            vehicle, duration, date = found["vehicle"], found["duration"], found["date"]
+            params = {
+                "slot_id": int(book.group(1)),
+                "vehicle_number": vehicle.group(1).replace("-", "").upper() if vehicle else state.vehicle_number,
+                "duration_hours": int(duration.group(1)) if duration else state.duration_hours,
+                # Same date as the search that found the slot, unless the message names one.
+                "date": date.group(1).lower() if date else state.date,
+            }
+            if not params["vehicle_number"] or not params["duration_hours"]:
+                return None
+            return FastPathMatch("book_slot", params)
+        return None
+
+    def handle(self, text: str, session_id: str, state: SessionState) -> Optional[str]:
+        """The reply for a structured turn, or None to hand the turn to the LLM."""
+        started = time.perf_counter()
+        match = self.parse(text, state) if AGENT_FAST_PATH else None
+        reply = None
+        if match is not None:
+            with span("agent.fast_path", intent=match.intent) as active:
+                reply = getattr(self, f"_{match.intent}")(session_id, state, **match.params)
+                active.set(answered=reply is not None)
+        with self._lock:
+            self.turns_total += 1
+            if reply is not None:
+                self.fast_path_total += 1
+                self.fast_path_seconds += time.perf_counter() - started
+                self.by_intent[match.intent] = self.by_intent.get(match.intent, 0) + 1
+        return reply
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "turns_total": self.turns_total,
+                "fast_path_total": self.fast_path_total,
+                "fast_path_fraction": self.fast_path_total / self.turns_total if self.turns_total else 0.0,
+                "fast_path_mean_ms": self.fast_path_seconds / self.fast_path_total * 1000 if self.fast_path_total else 0.0,
+                "by_intent": dict(self.by_intent),
+            }
+
+    def _book_slot(self, session_id: str, state: SessionState, slot_id: int, vehicle_number: str, duration_hours: int, date: Optional[str]) -> str:
+        state.vehicle_number = vehicle_number
+        return book_parking_tool._run(slot_id=slot_id, user_id=session_id, vehicle_number=vehicle_number, duration_hours=duration_hours, date=date)
+
+    def _my_bookings(self, session_id: str, state: SessionState) -> Optional[str]:
+        try:
+            response = get_api_client().get(f"/user-bookings/{session_id}", params={"limit": USER_BOOKINGS_SHOWN})
+            response.raise_for_status()
+        except Exception as e:
+            logger.warning("Listing bookings failed, handing the turn to the LLM: %s", e)
+            return None
+        page = response.json()
+        if not page["items"]:
+            return "You don't have any bookings yet. Tell me where and when you need parking and I'll find you a spot."
+        lines = []
+        for booking in page["items"]:
+            start, end = format_booking_window(booking)
+            lines.append(f"Booking ID {booking['id']}: vehicle {booking['vehicle_number']} at Slot ID {booking['slot']['id']} "
+                         f"({booking['slot']['location']}) from {start} to {end}, total cost ${booking['total_cost']:.2f}.")
+        heading = (f"Your {len(lines)} most recent bookings:" if page.get("next_cursor")
+                   else f"You have {len(lines)} booking(s):")
+        return heading + "\n" + "\n".join(lines)
+
+    def _booking_status(self, session_id: str, state: SessionState, booking_id: int) -> Optional[str]:
+        try:
+            response = get_api_client().get(f"/bookings/{booking_id}")
+            if response.status_code == 404:
+                return f"I couldn't find a booking with ID {booking_id}."
+            response.raise_for_status()
+        except Exception as e:
+            logger.warning("Booking lookup failed, handing the turn to the LLM: %s", e)
+            return None
+        booking = response.json()
+        if booking["user_id"] != session_id:
+            # Don't show other sessions' bookings.
+            return f"I couldn't find a booking with ID {booking_id}."
+        start, end = format_booking_window(booking)
+        now = datetime.datetime.utcnow().isoformat()
+        if booking["end_time"] <= now:
+            status = "has ended"
+        elif booking["start_time"] <= now:
+            status = "is active now"
+        else:
+            status = "is upcoming"
+        return (f"Booking ID {booking_id} {status}: vehicle {booking['vehicle_number']} at Slot ID {booking['slot']['id']} "
+                f"({booking['slot']['location']}) from {start} to {end} "
+                f"({booking['duration_hours']} hours). Total cost: ${booking['total_cost']:.2f}.")
+
+
+fast_path_router = FastPathRouter()
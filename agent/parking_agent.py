@@ -1,31 +1,65 @@
 
+import asyncio
+import contextvars
+import logging
 import os
+import queue
+import threading
+import time
+from typing import AsyncIterator, Iterator
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
-from langchain.agents import AgentExecutor, create_openai_functions_agent
+from langchain_classic.agents import AgentExecutor, create_openai_functions_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, HumanMessagePromptTemplate, SystemMessagePromptTemplate
-from langchain_core.messages import AIMessage, HumanMessage
 from .tools import list_of_tools
-from .prompts import SYSTEM_PROMPT_TEMPLATE
-from milvus_utils.milvus_connector import MilvusService
-import uuid
+from .fast_path import SessionState, fast_path_router
+from .prompts import get_system_prompt
+from .token_budget import HistoryPacker, TokenUsageCallback, count_tokens
+from milvus_utils.vector_store import get_history_store
+from observability.logs import get_logger
+from observability.metrics import registry
+from observability.tracing import current_span, traced
 
 load_dotenv()
 
-class ParkingAgent:
-    def __init__(self, session_id: str):
-        self.session_id = session_id
-        self.llm = ChatOpenAI(
+logger = get_logger(__name__)
+# Agent-side metrics, in the process-wide registry: served by the API's /metrics when the agent
+# runs in the API process, or on AGENT_METRICS_PORT from the UI. Tool, LLM, embedding and Milvus
+# latencies come from their spans (parking_span_duration_seconds).
+TURNS = registry.counter("agent_turns", "Agent turns, by whether the fast path or the LLM answered.", ("path",))
+TURN_DURATION = registry.histogram("agent_turn_duration_seconds", "Agent turn latency, by path.", ("path",))
+LLM_CALLS_PER_TURN = registry.histogram("agent_llm_calls_per_turn", "LLM calls (agent iterations) per turn.",
+                                        buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10))
+# Marks the end of a stream_agent stream on its queue.
+_STREAM_END = object()
+
+class AgentRuntime:
+    """
+    Everything a ParkingAgent needs that doesn't depend on the session: the LLM client (and its
+    HTTP connection pool), the history store with its open Milvus connection and loaded
+    collection, the compiled prompt, agent and executor, the fast-path router and the history
+    packer. Built once per process; the session id is a prompt variable passed in on every call.
+    llm and history_store replace the OpenAI chat model and the HISTORY_STORE store, e.g. with
+    fakes for an offline benchmark.
+    """
+
+    def __init__(self, llm=None, history_store=None):
+        self.llm = llm or ChatOpenAI(
             temperature=0.1, 
             model_name="gpt-3.5-turbo-0125", 
 
-            api_key=os.getenv("OPENAI_API_KEY")
+            api_key=os.getenv("OPENAI_API_KEY"),
+            # Streamed answers report token usage too.
+            stream_usage=True
         )
         self.tools = list_of_tools
-        self.milvus_service = MilvusService()
+        self.milvus_service = history_store or get_history_store()
+        self.router = fast_path_router
+        self.history_packer = HistoryPacker()
+        self.system_prompt = get_system_prompt()
 
         self.prompt = ChatPromptTemplate.from_messages([
-            SystemMessagePromptTemplate.from_template(SYSTEM_PROMPT_TEMPLATE.format(session_id=self.session_id)),
+            SystemMessagePromptTemplate.from_template(self.system_prompt),
             MessagesPlaceholder(variable_name="chat_history", optional=True),
             HumanMessagePromptTemplate.from_template("{input}"),
             MessagesPlaceholder(variable_name="agent_scratchpad")
@@ -35,36 +69,146 @@ class ParkingAgent:
         self.agent_executor = AgentExecutor(
             agent=self.agent,
             tools=self.tools,
-            verbose=True,
+            # LangChain's chain trace prints straight to stdout, tool responses and all; only at DEBUG.
+            verbose=logger.isEnabledFor(logging.DEBUG),
             handle_parsing_errors="Check your output and make sure it conforms to the Tool input JSON schema.", 
-            max_iterations=10 
+            max_iterations=10,
+            # The tool calls are read back into the session's fast-path state.
+            return_intermediate_steps=True
         )
-        print(f"ParkingAgent initialized for session: {self.session_id} with model {self.llm.model_name}")
+        logger.info("Shared runtime ready with model %s, system prompt %d tokens, history budget %d tokens",
+                    getattr(self.llm, "model_name", type(self.llm).__name__), count_tokens(self.system_prompt), self.history_packer.budget)
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+_loop = None
+
+
+def get_agent_runtime() -> AgentRuntime:
+    """The process-wide AgentRuntime, built by whichever session asks first."""
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                _runtime = AgentRuntime()
+    return _runtime
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Event loop on a daemon thread that stream_agent runs astream_agent on."""
+    global _loop
+    if _loop is None:
+        with _runtime_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="agent-stream-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+class ParkingAgent:
+    def __init__(self, session_id: str, runtime: AgentRuntime = None):
+        # Only the session id is per session; opening one costs microseconds once the runtime exists.
+        self.session_id = session_id
+        self.runtime = runtime or get_agent_runtime()
+        self.llm = self.runtime.llm
+        self.tools = self.runtime.tools
+        self.milvus_service = self.runtime.milvus_service
+        self.agent_executor = self.runtime.agent_executor
+        self.state = SessionState()
+        self.last_turn_timings = {}
+        self.last_turn_tokens = {}
+        self._history_stats = {}
+        self._pending_writes = set()
 
     def _load_chat_history_from_milvus(self, query_for_context: str):
 
-        raw_history = self.milvus_service.get_relevant_history(self.session_id, query_for_context, k=10) 
-        chat_history_messages = []
+        # Last few turns plus the most similar older ones, newest first; reversed below into chronological order.
+        raw_history = self.milvus_service.get_relevant_history(self.session_id, query_for_context, k=5, recent=5) 
+        return self._to_chat_messages(raw_history)
 
-        for item in reversed(raw_history): 
-            if item['role'] == 'user':
-                chat_history_messages.append(HumanMessage(content=item['content']))
-            elif item['role'] == 'ai':
-                chat_history_messages.append(AIMessage(content=item['content']))
- 
-        return chat_history_messages[-10:] 
+    def _to_chat_messages(self, raw_history):
+        # Packed into the token budget by relevance and recency, oldest first; see HistoryPacker.
+        chat_history_messages, self._history_stats = self.runtime.history_packer.pack(raw_history)
+        return chat_history_messages
 
+    def _store_turn(self, user_input: str, agent_response_text: str):
+        self.milvus_service.add_conversation_history(self.session_id, user_input, "user")
+        self.milvus_service.add_conversation_history(self.session_id, agent_response_text, "ai")
+
+    def _fast_path(self, user_input: str):
+        """The fast-path router's reply for a structured turn, or None if the LLM should take it."""
+        try:
+            return self.runtime.router.handle(user_input, self.session_id, self.state)
+        except Exception as e:
+            logger.error("Fast path failed for session %s, using the LLM: %s", self.session_id, e)
+            return None
+
+    def _observe_steps(self, response: dict):
+        for action, _ in response.get("intermediate_steps", []):
+            self.state.observe_tool_call(action.tool, action.tool_input)
+
+    def fast_path_stats(self) -> dict:
+        """Process-wide share of turns the fast path answered, and their mean latency."""
+        return self.runtime.router.stats()
+
+    def _record_tokens(self, usage: TokenUsageCallback = None):
+        """Keeps the last turn's token counts on the agent and logs them; None for a turn without the LLM."""
+        if usage is None:
+            self.last_turn_tokens = {"prompt_tokens": 0, "completion_tokens": 0, "llm_calls": 0}
+            LLM_CALLS_PER_TURN.observe(0)
+            return
+        LLM_CALLS_PER_TURN.observe(usage.llm_calls)
+        self.last_turn_tokens = {**usage.totals(), **{f"history_{key}": value for key, value in self._history_stats.items()}}
+        current_span().set(**self.last_turn_tokens)
+        logger.info("Session %s tokens - prompt %d, completion %d over %d LLM call(s); history %d tokens (%d kept, %d summarized)",
+                    self.session_id, usage.prompt_tokens, usage.completion_tokens, usage.llm_calls,
+                    self._history_stats.get("tokens", 0), self._history_stats.get("kept", 0), self._history_stats.get("summarized", 0))
+
+    def _record_timings(self, timings: dict):
+        """Keeps the last turn's stage timings (seconds) on the agent, logs them and counts the turn in the metrics."""
+        self.last_turn_timings = timings
+        path = "fast_path" if "fast_path" in timings else "llm"
+        TURNS.labels(path).inc()
+        TURN_DURATION.labels(path).observe(timings["total"])
+        current_span().set(session_id=self.session_id, path=path,
+                           **{f"{stage}_ms": round(seconds * 1000, 3) for stage, seconds in timings.items()})
+        if logger.isEnabledFor(logging.INFO):
+            stages = ", ".join(f"{stage} {seconds * 1000:.1f}ms" for stage, seconds in timings.items())
+            logger.info("Session %s timing - %s", self.session_id, stages)
+
+    @traced("agent.turn")
     def invoke_agent(self, user_input: str):
+        timings = {}
+        turn_started = stage_started = time.perf_counter()
+        fast_reply = self._fast_path(user_input)
+        if fast_reply is not None:
+            timings["fast_path"] = time.perf_counter() - stage_started
+            stage_started = time.perf_counter()
+            self._store_turn(user_input, fast_reply)
+            timings["store"] = time.perf_counter() - stage_started
+            timings["total"] = time.perf_counter() - turn_started
+            self._record_timings(timings)
+            self._record_tokens()
+            return fast_reply
+
+        stage_started = time.perf_counter()
         chat_history_for_prompt = self._load_chat_history_from_milvus(user_input)
+        timings["history"] = time.perf_counter() - stage_started
         
-        print(f"DEBUG AGENT: Session {self.session_id} - User Input: {user_input}")
+        logger.debug("Session %s - user input: %s", self.session_id, user_input)
 
 
+        stage_started = time.perf_counter()
+        usage = TokenUsageCallback()
         try:
             response = self.agent_executor.invoke({
                 "input": user_input,
                 "chat_history": chat_history_for_prompt,
-            })
+                "session_id": self.session_id,
+            }, config={"callbacks": [usage]})
+            self._observe_steps(response)
             agent_response_text = response.get("output", "Sorry, I encountered an issue processing your request.")
 
    
@@ -72,11 +216,172 @@ class ParkingAgent:
 
 
         except Exception as e:
-            print(f"ERROR AGENT: invoke_agent failed for session {self.session_id}: {e}")
+            logger.exception("invoke_agent failed for session %s: %s", self.session_id, e)
 
             agent_response_text = "I'm sorry, I ran into an unexpected problem. Could you please try rephrasing or try again in a moment?"
+        timings["agent"] = time.perf_counter() - stage_started
 
-        self.milvus_service.add_conversation_history(self.session_id, user_input, "user")
-        self.milvus_service.add_conversation_history(self.session_id, agent_response_text, "ai")
+        stage_started = time.perf_counter()
+        self._store_turn(user_input, agent_response_text)
+        timings["store"] = time.perf_counter() - stage_started
+        timings["total"] = time.perf_counter() - turn_started
+        self._record_timings(timings)
+        self._record_tokens(usage)
         
-        return agent_response_text
\ No newline at end of file
+        return agent_response_text
+
+    @traced("agent.turn")
+    async def ainvoke_agent(self, user_input: str):
+        """
+        Async invoke_agent. The history lookup embeds the input while the session's recent
+        messages load, tool calls go through the tools' _arun on the shared AsyncClient, and the
+        two history writes are handed to a worker thread, so the reply is returned as soon as
+        the LLM is done. Stage timings end up in last_turn_timings.
+        """
+        timings = {}
+        turn_started = stage_started = time.perf_counter()
+        fast_reply = await asyncio.to_thread(self._fast_path, user_input)
+        if fast_reply is not None:
+            timings["fast_path"] = time.perf_counter() - stage_started
+            self._finish_fast_turn(user_input, fast_reply, timings, turn_started)
+            return fast_reply
+
+        stage_started = time.perf_counter()
+        raw_history = await self.milvus_service.aget_relevant_history(self.session_id, user_input, k=5, recent=5)
+        chat_history_for_prompt = self._to_chat_messages(raw_history)
+        timings["history"] = time.perf_counter() - stage_started
+
+        logger.debug("Session %s - user input: %s", self.session_id, user_input)
+
+        stage_started = time.perf_counter()
+        usage = TokenUsageCallback()
+        try:
+            response = await self.agent_executor.ainvoke({
+                "input": user_input,
+                "chat_history": chat_history_for_prompt,
+                "session_id": self.session_id,
+            }, config={"callbacks": [usage]})
+            self._observe_steps(response)
+            agent_response_text = response.get("output", "Sorry, I encountered an issue processing your request.")
+            agent_response_text = agent_response_text.replace("**", "")
+        except Exception as e:
+            logger.exception("ainvoke_agent failed for session %s: %s", self.session_id, e)
+            agent_response_text = "I'm sorry, I ran into an unexpected problem. Could you please try rephrasing or try again in a moment?"
+        timings["agent"] = time.perf_counter() - stage_started
+
+        stage_started = time.perf_counter()
+        self._store_turn_in_background(user_input, agent_response_text)
+        timings["store"] = time.perf_counter() - stage_started
+        timings["total"] = time.perf_counter() - turn_started
+        self._record_timings(timings)
+        self._record_tokens(usage)
+        return agent_response_text
+
+    @traced("agent.turn")
+    async def astream_agent(self, user_input: str) -> AsyncIterator[str]:
+        """
+        ainvoke_agent, but yields the final answer's tokens as the LLM produces them. Tool-calling
+        steps stream no text, so only the answer comes through. If nothing was streamed (an
+        error, or the executor gave up) the whole reply is yielded once at the end. Adds
+        "first_token" (from the start of the turn) to last_turn_timings.
+        """
+        timings = {}
+        turn_started = stage_started = time.perf_counter()
+        fast_reply = await asyncio.to_thread(self._fast_path, user_input)
+        if fast_reply is not None:
+            timings["fast_path"] = timings["first_token"] = time.perf_counter() - stage_started
+            yield fast_reply
+            self._finish_fast_turn(user_input, fast_reply, timings, turn_started)
+            return
+
+        stage_started = time.perf_counter()
+        raw_history = await self.milvus_service.aget_relevant_history(self.session_id, user_input, k=5, recent=5)
+        chat_history_for_prompt = self._to_chat_messages(raw_history)
+        timings["history"] = time.perf_counter() - stage_started
+
+        logger.debug("Session %s - user input (streaming): %s", self.session_id, user_input)
+
+        stage_started = time.perf_counter()
+        streamed, output = [], None
+        usage = TokenUsageCallback()
+        try:
+            async for event in self.agent_executor.astream_events({
+                "input": user_input,
+                "chat_history": chat_history_for_prompt,
+                "session_id": self.session_id,
+            }, config={"callbacks": [usage]}, version="v2"):
+                if event["event"] == "on_chat_model_stream":
+                    token = event["data"]["chunk"].content
+                    if token:
+                        if not streamed:
+                            timings["first_token"] = time.perf_counter() - turn_started
+                        streamed.append(token)
+                        yield token
+                elif event["event"] == "on_tool_start":
+                    self.state.observe_tool_call(event["name"], event["data"].get("input"))
+                elif event["event"] == "on_chain_end" and not event.get("parent_ids"):
+                    output = event["data"]["output"].get("output")
+        except Exception as e:
+            logger.exception("astream_agent failed for session %s: %s", self.session_id, e)
+            if not streamed:
+                output = "I'm sorry, I ran into an unexpected problem. Could you please try rephrasing or try again in a moment?"
+        agent_response_text = (output or "".join(streamed) or "Sorry, I encountered an issue processing your request.").replace("**", "")
+        if not streamed:
+            timings["first_token"] = time.perf_counter() - turn_started
+            yield agent_response_text
+        timings["agent"] = time.perf_counter() - stage_started
+
+        stage_started = time.perf_counter()
+        self._store_turn_in_background(user_input, agent_response_text)
+        timings["store"] = time.perf_counter() - stage_started
+        timings["total"] = time.perf_counter() - turn_started
+        self._record_timings(timings)
+        self._record_tokens(usage)
+
+    def stream_agent(self, user_input: str) -> Iterator[str]:
+        """
+        astream_agent for synchronous callers such as the Streamlit UI. The stream runs on one
+        shared background event loop, so the async API client's connections are reused across
+        turns and sessions. It is consumed by a single task that hands tokens over a queue: the
+        task starts in a copy of the caller's context, so the turn joins the caller's trace, and
+        the turn's span stays current across tokens.
+        """
+        tokens: "queue.Queue" = queue.Queue()
+
+        async def pump():
+            try:
+                async for token in self.astream_agent(user_input):
+                    tokens.put(token)
+            except Exception as e:
+                tokens.put(e)
+            finally:
+                tokens.put(_STREAM_END)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), _background_loop())
+        try:
+            while True:
+                item = tokens.get()
+                if item is _STREAM_END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # A caller that stops early cancels the turn; a finished one is a no-op.
+            future.cancel()
+
+    def _finish_fast_turn(self, user_input: str, reply: str, timings: dict, turn_started: float):
+        stage_started = time.perf_counter()
+        self._store_turn_in_background(user_input, reply)
+        timings["store"] = time.perf_counter() - stage_started
+        timings["total"] = time.perf_counter() - turn_started
+        self._record_timings(timings)
+        self._record_tokens()
+
+    def _store_turn_in_background(self, user_input: str, agent_response_text: str):
+        # run_in_executor doesn't carry the context over; copy it so the history write joins the turn's trace.
+        context = contextvars.copy_context()
+        write = asyncio.get_running_loop().run_in_executor(None, context.run, self._store_turn, user_input, agent_response_text)
+        # Hold a reference until it finishes, or the pending write could be garbage collected.
+        self._pending_writes.add(write)
+        write.add_done_callback(self._pending_writes.discard)
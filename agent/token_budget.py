@@ -0,0 +1,187 @@
+import functools
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from observability.logs import get_logger
+from observability.tracing import start_span
+
+logger = get_logger(__name__)
+
+# Model whose tokenizer is used for counting (matches the agent's ChatOpenAI model).
+TOKEN_MODEL = os.getenv("TOKEN_MODEL", "gpt-3.5-turbo-0125")
+# Tokens of chat history the agent sends per LLM call, including the summary of what didn't fit.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1000"))
+# Part of the budget kept for the summary line of older turns that didn't fit.
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "150"))
+# A single message (e.g. an earlier reply listing 40 slots) is clipped to this before packing.
+HISTORY_MESSAGE_MAX_TOKENS = int(os.getenv("HISTORY_MESSAGE_MAX_TOKENS", "300"))
+# Each turn's gist in the summary is cut to this many tokens.
+SUMMARY_CLIP_TOKENS = 24
+# Per-message overhead of the chat format (role and separators), as in OpenAI's token counting guide.
+TOKENS_PER_MESSAGE = 4
+# Used when tiktoken or its encoding files aren't available (e.g. offline): ~4 characters per token.
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.encoding_for_model(TOKEN_MODEL)
+    except Exception as e:
+        logger.warning("tiktoken encoding for %s unavailable (%s), estimating %d characters per token.",
+                       TOKEN_MODEL, type(e).__name__, CHARS_PER_TOKEN)
+        return None
+
+
+def token_counter_name() -> str:
+    encoding = _encoding()
+    return f"tiktoken:{encoding.name}" if encoding is not None else f"estimate:{CHARS_PER_TOKEN}-chars-per-token"
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    """text cut to at most max_tokens tokens, with an ellipsis if anything was cut."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _encoding()
+    if encoding is None:
+        head = text[:max(0, max_tokens - 1) * CHARS_PER_TOKEN]
+    else:
+        head = encoding.decode(encoding.encode(text, disallowed_special=())[:max(0, max_tokens - 1)])
+    return head.rstrip() + "…"
+
+
+def count_message_tokens(messages: List[BaseMessage]) -> int:
+    return sum(TOKENS_PER_MESSAGE + count_tokens(message.content if isinstance(message.content, str) else str(message.content))
+               for message in messages)
+
+
+class HistoryPacker:
+    """
+    Turns get_relevant_history output (newest first) into the chat_history messages for the
+    prompt, within budget tokens. Messages are taken in priority order: a message's priority is
+    the better of its recency (0 = newest) and its relevance_rank (0 = closest to the input), so
+    the last turn and the best match go in first. Oversized messages are clipped first. What
+    doesn't fit is summarized, one clipped line per message, in a system message in front of
+    the history, so the agent still knows e.g. which slot was discussed earlier. The summary is
+    extractive (no LLM call), so packing costs nothing but tokenizing.
+    """
+
+    def __init__(self, budget: int = HISTORY_TOKEN_BUDGET, summary_tokens: int = HISTORY_SUMMARY_TOKENS,
+                 message_max_tokens: int = HISTORY_MESSAGE_MAX_TOKENS):
+        self.budget = budget
+        self.summary_tokens = min(summary_tokens, budget)
+        self.message_max_tokens = message_max_tokens
+
+    def pack(self, raw_history: List[dict]) -> Tuple[List[BaseMessage], Dict[str, int]]:
+        """(chat messages oldest first, stats: tokens, kept, summarized, clipped)."""
+        candidates = []
+        clipped = 0
+        for recency, item in enumerate(raw_history):
+            if item["role"] not in ("user", "ai"):
+                continue
+            content = clip_to_tokens(item["content"], self.message_max_tokens)
+            clipped += content != item["content"]
+            rank = item.get("relevance_rank")
+            priority = recency if rank is None else min(recency, rank)
+            candidates.append((priority, recency, item["role"], content, TOKENS_PER_MESSAGE + count_tokens(content)))
+
+        # Everything fits: no summary needed, so the summary's share of the budget is usable too.
+        if sum(candidate[4] for candidate in candidates) <= self.budget:
+            kept, dropped = candidates, []
+        else:
+            room = self.budget - self.summary_tokens
+            kept, dropped = [], []
+            for candidate in sorted(candidates):
+                if candidate[4] <= room:
+                    kept.append(candidate)
+                    room -= candidate[4]
+                else:
+                    dropped.append(candidate)
+
+        messages: List[BaseMessage] = []
+        summary = self._summarize(sorted(dropped, key=lambda c: -c[1]))
+        if summary:
+            messages.append(SystemMessage(content=summary))
+        for _, _, role, content, _ in sorted(kept, key=lambda c: -c[1]):
+            messages.append(HumanMessage(content=content) if role == "user" else AIMessage(content=content))
+        return messages, {"tokens": count_message_tokens(messages), "kept": len(kept), "summarized": len(dropped), "clipped": clipped}
+
+    def _summarize(self, dropped) -> Optional[str]:
+        """One clipped first sentence per dropped message, oldest first, within summary_tokens."""
+        if not dropped:
+            return None
+        summary = "Earlier in this conversation (summarized):"
+        room = self.summary_tokens - TOKENS_PER_MESSAGE - count_tokens(summary)
+        for _, _, role, content, _ in dropped:
+            gist = clip_to_tokens(_SENTENCE_END.split(content.strip(), 1)[0], SUMMARY_CLIP_TOKENS)
+            line = f"\n{'User' if role == 'user' else 'Assistant'}: {gist}"
+            cost = count_tokens(line)
+            if cost > room:
+                break
+            summary += line
+            room -= cost
+        return summary
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """
+    Adds up prompt and completion tokens over the LLM calls of one agent turn. Uses the usage
+    the API reports; when it reports none (e.g. a stream without usage) the prompt is counted
+    with count_tokens instead. Each call is also recorded as an "llm.call" span, with its
+    tokens, in the trace of the turn.
+    """
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_calls = 0
+        self._estimated_prompt: Dict[object, int] = {}
+        self._spans: Dict[object, object] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._estimated_prompt[run_id] = sum(count_message_tokens(batch) for batch in messages)
+        model = (kwargs.get("invocation_params") or {}).get("model") or ((serialized or {}).get("kwargs") or {}).get("model_name")
+        self._spans[run_id] = start_span("llm.call", model=model)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self.llm_calls += 1
+        estimated_prompt = self._estimated_prompt.pop(run_id, 0)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if not usage:
+            message = getattr(response.generations[0][0], "message", None) if response.generations and response.generations[0] else None
+            metadata = getattr(message, "usage_metadata", None) or {}
+            usage = {"prompt_tokens": metadata.get("input_tokens"), "completion_tokens": metadata.get("output_tokens")}
+        completion = usage.get("completion_tokens")
+        if completion is None:
+            completion = sum(count_tokens(generation.text) for batch in response.generations for generation in batch)
+        prompt = usage.get("prompt_tokens") or estimated_prompt
+        self.prompt_tokens += prompt
+        self.completion_tokens += completion
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.set(prompt_tokens=prompt, completion_tokens=completion)
+            span.finish()
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._estimated_prompt.pop(run_id, None)
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.finish(error=error)
+
+    def totals(self) -> Dict[str, int]:
+        return {"prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens, "llm_calls": self.llm_calls}
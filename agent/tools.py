@@ -1,12 +1,32 @@
 
+import abc
 import httpx
-from langchain.tools import BaseTool
+import logging
+from langchain_core.tools import BaseTool
 from pydantic import BaseModel, Field
-from typing import Type, Optional, List
+from typing import Dict, Type, Optional, List, Tuple
+import collections
 import json
 import datetime 
+import os
+import threading
+import time
+from .api_client import get_api_client, get_async_api_client
+from observability.logs import get_logger
+from observability.metrics import registry
+from observability.tracing import span
 
-BASE_API_URL = "http://localhost:8000"
+logger = get_logger(__name__)
+# Outcome per call: ok, rejected (bad input, no API call), http_error or error. Latency is in
+# parking_span_duration_seconds{span="tool.call"}.
+TOOL_CALLS = registry.counter("agent_tool_calls", "Agent tool calls, by tool and outcome.", ("tool", "outcome"))
+
+# Seconds the SearchParkingSpots tool reuses its own reply for a repeated search. Off (0) by
+# default: the API already caches searches and invalidates them exactly, while this cache only
+# hears about bookings made through BookParkingSpot in this process and relies on the TTL for
+# the rest. Worth turning on when the API is remote and the round trip dominates.
+TOOL_SEARCH_CACHE_TTL_SECONDS = float(os.getenv("TOOL_SEARCH_CACHE_TTL", "0"))
+TOOL_SEARCH_CACHE_SIZE = 256
 
 class ParkingSearchToolInput(BaseModel):
     vehicle_type: str = Field(description="Type of vehicle, e.g., 'car', 'two-wheeler', 'suv'.")
@@ -20,142 +40,261 @@ class ParkingBookingToolInput(BaseModel):
     user_id: str = Field(description="A unique identifier for the user or session (this should be the session_id).")
     vehicle_number: str = Field(description="The vehicle's registration number.")
     duration_hours: int = Field(description="The duration for which the parking is booked, in hours (this should be the same duration used for the search that found this slot).")
+    date: Optional[str] = Field(None, description="The date the booking starts (e.g., 'YYYY-MM-DD', 'today', 'tomorrow'). Use the same date as the search that found this slot.")
 
 class GetAvailableLocationsForVehicleToolInput(BaseModel):
     vehicle_type: str = Field(description="Type of vehicle, e.g., 'car', 'two-wheeler'.")
 
-class SearchParkingSpotsTool(BaseTool):
+def format_booking_window(booking) -> Tuple[str, str]:
+    """Start and end of a BookingResponse as shown to the user."""
+    start_dt = datetime.datetime.fromisoformat(booking['start_time'].replace('Z', '+00:00')) 
+    end_dt = datetime.datetime.fromisoformat(booking['end_time'].replace('Z', '+00:00'))
+    return start_dt.strftime('%Y-%m-%d %I:%M %p %Z'), end_dt.strftime('%Y-%m-%d %I:%M %p %Z')
+
+def format_booking_confirmation(booking_confirmation) -> str:
+    """The reply the agent gets (and the fast path returns) for a successful booking."""
+    start, end = format_booking_window(booking_confirmation)
+    return (
+        f"Booking successful! Your parking for vehicle {booking_confirmation['vehicle_number']} "
+        f"at Slot ID {booking_confirmation['slot']['id']} ({booking_confirmation['slot']['location']}) "
+        f"is confirmed from {start} to {end} " 
+        f"({booking_confirmation['duration_hours']} hours). Total cost: ${booking_confirmation['total_cost']:.2f}. "
+        f"Your Booking ID is {booking_confirmation['id']}."
+    )
+
+class ToolSearchCache:
+    """Small TTL/LRU of SearchParkingSpots replies, keyed on the normalized search."""
+
+    def __init__(self, ttl_seconds: float = TOOL_SEARCH_CACHE_TTL_SECONDS, max_entries: int = TOOL_SEARCH_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "collections.OrderedDict[tuple, Tuple[float, str]]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated_entries = 0
+
+    @staticmethod
+    def key(vehicle_type: str, location: str, duration_hours: int, date: Optional[str] = None, slot_type: Optional[str] = None) -> tuple:
+        normalize = lambda value: (value or "").strip().lower()
+        return (normalize(vehicle_type), normalize(location), normalize(slot_type), normalize(date), duration_hours)
+
+    def get(self, key: tuple) -> Optional[str]:
+        if self.ttl_seconds <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, output: str):
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, output)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, vehicle_type: str, location: str):
+        """Drops searches a slot of this vehicle type at this location could show up in (same substring rule as the API)."""
+        vehicle_type, location = (vehicle_type or "").strip().lower(), (location or "").strip().lower()
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == vehicle_type and key[1] in location]
+            for key in stale:
+                del self._entries[key]
+            self.invalidated_entries += len(stale)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "invalidated_entries": self.invalidated_entries}
+
+
+tool_search_cache = ToolSearchCache()
+
+class ParkingAPITool(BaseTool):
+    """
+    Plumbing shared by the tools below: each builds its API request in _request and turns the
+    JSON reply into text for the agent in _format. _run sends it on the shared keep-alive client,
+    _arun on the shared AsyncClient (used by ParkingAgent.ainvoke_agent), with the same handling.
+    Each call is a "tool.call" span; the API client passes its trace on to the API.
+    """
+    error_prefix: str = "Error calling the parking API"
+    error_action: str = "calling the parking API"
+
+    def _check(self, **kwargs) -> Optional[str]:
+        """A message for the agent if the input can't be sent as is, else None."""
+        return None
+
+    @abc.abstractmethod
+    def _request(self, **kwargs) -> dict:
+        """Keyword arguments for the API client's request() (method, url, params/json)."""
+
+    @abc.abstractmethod
+    def _format(self, data, **kwargs) -> str:
+        """The decoded JSON reply as text for the agent."""
+
+    def _run(self, **kwargs) -> str:
+        with span("tool.call", tool=self.name) as active:
+            logger.debug("%s: _run called with %s", self.name, kwargs)
+            problem = self._check(**kwargs)
+            if problem:
+                TOOL_CALLS.labels(self.name, "rejected").inc()
+                return problem
+            try:
+                request = self._request(**kwargs)
+                logger.debug("%s: request sent to API: %s", self.name, request)
+                return self._respond(get_api_client().request(**request), kwargs, active)
+            except Exception as e:
+                return self._error(e, active)
+
+    async def _arun(self, **kwargs) -> str:
+        with span("tool.call", tool=self.name) as active:
+            logger.debug("%s: _arun called with %s", self.name, kwargs)
+            problem = self._check(**kwargs)
+            if problem:
+                TOOL_CALLS.labels(self.name, "rejected").inc()
+                return problem
+            try:
+                request = self._request(**kwargs)
+                logger.debug("%s: request sent to API: %s", self.name, request)
+                return self._respond(await get_async_api_client().request(**request), kwargs, active)
+            except Exception as e:
+                return self._error(e, active)
+
+    def _respond(self, response: httpx.Response, kwargs: dict, active) -> str:
+        active.set(status_code=response.status_code)
+        if logger.isEnabledFor(logging.DEBUG):
+            # Only decoded when someone is reading it; search replies can list hundreds of slots.
+            logger.debug("%s: API response %s: %s", self.name, response.status_code, response.text)
+        response.raise_for_status()
+        output_for_agent = self._format(response.json(), **kwargs)
+        TOOL_CALLS.labels(self.name, "ok").inc()
+        logger.debug("%s: output sent to agent: %s", self.name, output_for_agent)
+        return output_for_agent
+
+    def _error(self, e: Exception, active) -> str:
+        active.set(error=type(e).__name__)
+        if isinstance(e, httpx.HTTPStatusError):
+            error_detail = e.response.json().get("detail", e.response.text) if e.response else e.request.url
+            status_code_info = f"(Status: {e.response.status_code})" if e.response else "(No response status)"
+            TOOL_CALLS.labels(self.name, "http_error").inc()
+            logger.info("%s: HTTPStatusError: %s %s", self.name, error_detail, status_code_info)
+            return f"{self.error_prefix}: {error_detail} {status_code_info}"
+        TOOL_CALLS.labels(self.name, "error").inc()
+        logger.warning("%s: unexpected tool error: %s", self.name, e)
+        return f"An unexpected error occurred while {self.error_action}: {str(e)}"
+
+class SearchParkingSpotsTool(ParkingAPITool):
     name: str = "SearchParkingSpots"
     description: str = (
         "Use this tool to search for available parking spots. "
         "Provide vehicle_type, location, duration_hours, and optionally slot_type and date (e.g., 'today', 'YYYY-MM-DD'). "
-        "Returns a list of currently available parking spots matching criteria or an empty list if none are found. "
-        "Note: Current search checks general availability, not specific time-slot clashes for the given date."
+        "Returns a list of parking spots that are free for the whole requested date and duration, or an empty list if none are found."
     )
     args_schema: Type[BaseModel] = ParkingSearchToolInput
+    error_prefix: str = "Error searching for parking spots"
+    error_action: str = "searching for parking spots"
 
-    def _run(self, vehicle_type: str, location: str, duration_hours: int, date: Optional[str] = None, slot_type: Optional[str] = None) -> str:
-        print(f"DEBUG TOOL (SearchParkingSpotsTool): _run CALLED. vehicle_type='{vehicle_type}', location='{location}', duration_hours={duration_hours}, date='{date}', slot_type='{slot_type}'")
-        try:
-            payload = {
-                "vehicle_type": vehicle_type.lower(),
-                "location": location,
-                "slot_type": slot_type.lower() if slot_type else None,
-                "date": date, 
-                "duration_hours": duration_hours
-            }
-            payload_cleaned = {k: v for k, v in payload.items() if v is not None} 
-            print(f"DEBUG TOOL (SearchParkingSpotsTool): PAYLOAD SENT TO API: {payload_cleaned}")
-
-            response = httpx.post(f"{BASE_API_URL}/get-parking-spots/", json=payload_cleaned)
-            print(f"DEBUG TOOL (SearchParkingSpotsTool): API RESPONSE STATUS: {response.status_code}")
-            raw_api_response_text = response.text
-            print(f"DEBUG TOOL (SearchParkingSpotsTool): RAW API RESPONSE TEXT: {raw_api_response_text}")
-            response.raise_for_status()
-            results = response.json()
-
-            if not results:
-                print("DEBUG TOOL (SearchParkingSpotsTool): API returned empty list. No spots found by API.")
-                return "No parking spots found matching your criteria for the specified details. You can try a different location or vehicle type."
-            else:
-                summary = (f"Successfully found {len(results)} parking spot(s) generally matching criteria for {vehicle_type} at {location} "
-                           f"(date context: {date if date else 'any available day'}, duration: {duration_hours} hours). "
-                           f"Details are in the following JSON. Please present these options to the user clearly:\n")
-                output_for_agent = summary + json.dumps(results)
-                print(f"DEBUG TOOL (SearchParkingSpotsTool): OUTPUT SENT TO AGENT: {output_for_agent}")
-                return output_for_agent
-        except httpx.HTTPStatusError as e:
-            error_detail = e.response.json().get("detail", e.response.text) if e.response else e.request.url
-            status_code_info = f"(Status: {e.response.status_code})" if e.response else "(No response status)"
-            print(f"DEBUG TOOL (SearchParkingSpotsTool): HTTPStatusError: {error_detail} {status_code_info}")
-            return f"Error searching for parking spots: {error_detail} {status_code_info}"
-        except Exception as e:
-            print(f"DEBUG TOOL (SearchParkingSpotsTool): UNEXPECTED TOOL ERROR: {str(e)}")
-            return f"An unexpected error occurred while searching for parking spots: {str(e)}"
+    def _run(self, **kwargs) -> str:
+        key = tool_search_cache.key(**kwargs)
+        output = tool_search_cache.get(key)
+        if output is None:
+            output = super()._run(**kwargs)
+            if not output.startswith(("Error", "An unexpected error")):
+                tool_search_cache.put(key, output)
+        return output
+
+    async def _arun(self, **kwargs) -> str:
+        key = tool_search_cache.key(**kwargs)
+        output = tool_search_cache.get(key)
+        if output is None:
+            output = await super()._arun(**kwargs)
+            if not output.startswith(("Error", "An unexpected error")):
+                tool_search_cache.put(key, output)
+        return output
+
+    def _request(self, vehicle_type: str, location: str, duration_hours: int, date: Optional[str] = None, slot_type: Optional[str] = None) -> dict:
+        payload = {
+            "vehicle_type": vehicle_type.lower(),
+            "location": location,
+            "slot_type": slot_type.lower() if slot_type else None,
+            "date": date, 
+            "duration_hours": duration_hours
+        }
+        payload_cleaned = {k: v for k, v in payload.items() if v is not None} 
+        return {"method": "POST", "url": "/get-parking-spots/", "json": payload_cleaned}
 
-class BookParkingSpotTool(BaseTool):
+    def _format(self, results, vehicle_type: str, location: str, duration_hours: int, date: Optional[str] = None, slot_type: Optional[str] = None) -> str:
+        if not results:
+            return "No parking spots found matching your criteria for the specified details. You can try a different location or vehicle type."
+        summary = (f"Successfully found {len(results)} parking spot(s) free for {vehicle_type} at {location} "
+                   f"(date context: {date if date else 'any available day'}, duration: {duration_hours} hours). "
+                   f"Details are in the following JSON. Please present these options to the user clearly:\n")
+        return summary + json.dumps(results)
+
+class BookParkingSpotTool(ParkingAPITool):
     name: str = "BookParkingSpot"
     description: str = (
         "Use this tool to book a specific parking spot AFTER it has been found and user has confirmed which slot_id to book and provided their vehicle_number. "
         "Requires slot_id, user_id (session_id), vehicle_number, and duration_hours (from the original search). "
-        "Booking is assumed to be for the current time or the conceptually discussed date."
+        "Pass the date from the original search as well; without it the booking starts now."
     )
     args_schema: Type[BaseModel] = ParkingBookingToolInput
+    error_prefix: str = "Error booking parking spot"
+    error_action: str = "booking the parking spot"
 
-    def _run(self, slot_id: int, user_id: str, vehicle_number: str, duration_hours: int) -> str:
-        print(f"DEBUG TOOL (BookParkingSpotTool): _run CALLED. slot_id={slot_id}, user_id='{user_id}', vehicle_number='{vehicle_number}', duration_hours={duration_hours}")
-        try:
-            payload = {
-                "slot_id": slot_id,
-                "user_id": user_id,
-                "vehicle_number": vehicle_number,
-                "duration_hours": duration_hours
-            }
-            print(f"DEBUG TOOL (BookParkingSpotTool): PAYLOAD SENT TO API: {payload}")
-            response = httpx.post(f"{BASE_API_URL}/book-parking/", json=payload)
-            print(f"DEBUG TOOL (BookParkingSpotTool): API RESPONSE STATUS: {response.status_code}")
-            raw_api_response_text = response.text
-            print(f"DEBUG TOOL (BookParkingSpotTool): RAW API RESPONSE TEXT: {raw_api_response_text}")
-            response.raise_for_status()
-            booking_confirmation = response.json() 
-            
-
-            start_dt = datetime.datetime.fromisoformat(booking_confirmation['start_time'].replace('Z', '+00:00')) 
-            end_dt = datetime.datetime.fromisoformat(booking_confirmation['end_time'].replace('Z', '+00:00'))
-            
-            confirmation_message = (
-                f"Booking successful! Your parking for vehicle {booking_confirmation['vehicle_number']} "
-                f"at Slot ID {booking_confirmation['slot']['id']} ({booking_confirmation['slot']['location']}) "
-                f"is confirmed from {start_dt.strftime('%Y-%m-%d %I:%M %p %Z')} to {end_dt.strftime('%Y-%m-%d %I:%M %p %Z')} " 
-                f"({booking_confirmation['duration_hours']} hours). Total cost: ${booking_confirmation['total_cost']:.2f}. "
-                f"Your Booking ID is {booking_confirmation['id']}."
-            )
-            print(f"DEBUG TOOL (BookParkingSpotTool): OUTPUT SENT TO AGENT: {confirmation_message}")
-            return confirmation_message
-        except httpx.HTTPStatusError as e:
-            error_detail = e.response.json().get("detail", e.response.text) if e.response else e.request.url
-            status_code_info = f"(Status: {e.response.status_code})" if e.response else "(No response status)"
-            print(f"DEBUG TOOL (BookParkingSpotTool): HTTPStatusError: {error_detail} {status_code_info}")
-            return f"Error booking parking spot: {error_detail} {status_code_info}"
-        except Exception as e:
-            print(f"DEBUG TOOL (BookParkingSpotTool): UNEXPECTED TOOL ERROR: {str(e)}")
-            return f"An unexpected error occurred while booking the parking spot: {str(e)}"
+    def _request(self, slot_id: int, user_id: str, vehicle_number: str, duration_hours: int, date: Optional[str] = None) -> dict:
+        payload = {
+            "slot_id": slot_id,
+            "user_id": user_id,
+            "vehicle_number": vehicle_number,
+            "duration_hours": duration_hours
+        }
+        if date:
+            payload["date"] = date
+        return {"method": "POST", "url": "/book-parking/", "json": payload}
+
+    def _format(self, booking_confirmation, **kwargs) -> str:
+        slot = booking_confirmation['slot']
+        tool_search_cache.invalidate(slot['vehicle_type'], slot['location'])
+        return format_booking_confirmation(booking_confirmation)
 
-class GetAvailableLocationsForVehicleTool(BaseTool):
+class GetAvailableLocationsForVehicleTool(ParkingAPITool):
     name: str = "GetAvailableLocationsForVehicle"
     description: str = (
         "Use this tool to get a list of general locations where parking might be available "
         "for a specific vehicle_type. This is useful if the user asks 'Where can I park my car?' "
-        "without specifying a particular location. It does not give specific slots, only location names."
+        "without specifying a particular location. It does not give specific slots, only location names "
+        "with the number of slots free at each right now."
     )
     args_schema: Type[BaseModel] = GetAvailableLocationsForVehicleToolInput
+    error_prefix: str = "Error getting available locations"
+    error_action: str = "getting available locations"
 
-    def _run(self, vehicle_type: str) -> str:
-        print(f"TOOL (GetAvailableLocationsForVehicleTool): _run CALLED. vehicle_type='{vehicle_type}'")
-        try:
-            if not vehicle_type:
-                return "Error: Vehicle type is required to find available locations."
-            response = httpx.get(f"{BASE_API_URL}/get-available-locations-for-vehicle/", params={"vehicle_type": vehicle_type.lower()})
-            print(f"TOOL (GetAvailableLocationsForVehicleTool): API RESPONSE STATUS: {response.status_code}")
-            raw_api_response_text = response.text
-            print(f"TOOL (GetAvailableLocationsForVehicleTool): RAW API RESPONSE TEXT: {raw_api_response_text}")
-            response.raise_for_status()
-            data = response.json()
-            locations = data.get("locations", [])
-            if not locations:
-                return f"I couldn't find any general locations with available parking for a {vehicle_type} right now."
-            else:
-                return (f"Based on current availability, you might find parking for a {vehicle_type} at the following locations: "
-                        f"{', '.join(locations)}. If you'd like to search at one of these, please tell me the specific location, "
-                        f"the date, and for how long you need parking.")
-        except httpx.HTTPStatusError as e:
-            error_detail = e.response.json().get("detail", e.response.text) if e.response else e.request.url
-            status_code_info = f"(Status: {e.response.status_code})" if e.response else "(No response status)"
-            print(f"DEBUG TOOL (GetAvailableLocationsForVehicleTool): HTTPStatusError: {error_detail} {status_code_info}")
-            return f"Error getting available locations: {error_detail} {status_code_info}"
-        except Exception as e:
-            print(f"DEBUG TOOL (GetAvailableLocationsForVehicleTool): UNEXPECTED TOOL ERROR: {str(e)}")
-            return f"An unexpected error occurred while getting available locations: {str(e)}"
+    def _check(self, vehicle_type: str) -> Optional[str]:
+        if not vehicle_type:
+            return "Error: Vehicle type is required to find available locations."
+        return None
+
+    def _request(self, vehicle_type: str) -> dict:
+        return {"method": "GET", "url": "/get-available-locations-for-vehicle/", "params": {"vehicle_type": vehicle_type.lower()}}
+
+    def _format(self, data, vehicle_type: str) -> str:
+        locations = data.get("locations", [])
+        free_counts = data.get("free_counts", {})
+        if not locations:
+            return f"I couldn't find any general locations with available parking for a {vehicle_type} right now."
+        described = [f"{location} ({free_counts[location]} free)" if location in free_counts else location for location in locations]
+        return (f"Based on current availability, you might find parking for a {vehicle_type} at the following locations "
+                f"(most free slots first): {', '.join(described)}. If you'd like to search at one of these, please tell me the specific location, "
+                f"the date, and for how long you need parking.")
 
 
 search_parking_tool = SearchParkingSpotsTool()
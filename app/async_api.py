@@ -0,0 +1,69 @@
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from . import async_crud, crud, schemas
+from .database import get_async_db
+
+# async def versions of the endpoints in main.py, mounted instead of the sync ones when
+# PARKING_API_MODE=async. Handlers run on the event loop instead of the threadpool.
+router = APIRouter()
+
+
+@router.post("/parking-slots/", response_model=schemas.ParkingSlotResponse, tags=["Parking Slots"])
+async def create_parking_slot_endpoint(slot: schemas.ParkingSlotCreate, db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.create_parking_slot(db=db, slot=slot)
+
+@router.get("/parking-slots/", response_model=schemas.ParkingSlotPage, tags=["Parking Slots"])
+async def read_parking_slots(limit: int = Query(10, ge=1, le=crud.MAX_PAGE_SIZE), cursor: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    try:
+        slots, next_cursor = await async_crud.get_parking_slots_page(db, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": slots, "next_cursor": next_cursor}
+
+@router.get("/parking-slots/export", tags=["Parking Slots"])
+async def export_parking_slots(cursor: Optional[str] = None):
+    # Validate up front: once streaming has started the status code can't change.
+    try:
+        if cursor:
+            crud.decode_slot_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(async_crud.export_slots_ndjson(cursor), media_type="application/x-ndjson")
+
+@router.post("/get-parking-spots/", response_model=List[schemas.ParkingSlotResponse], tags=["Parking Search & Booking"])
+async def search_parking_spots_endpoint(search_params: schemas.ParkingSearchRequest, db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.search_available_slots(db=db, search_params=search_params)
+
+@router.post("/book-parking/", response_model=schemas.BookingResponse, tags=["Parking Search & Booking"])
+async def book_parking_endpoint(booking_request: schemas.BookingCreate, db: AsyncSession = Depends(get_async_db)):
+    try:
+        booking = await async_crud.create_booking(db=db, booking_data=booking_request)
+    except crud.BookingConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not booking:
+        raise HTTPException(status_code=400, detail="Failed to book parking spot. Slot might be unavailable or invalid.")
+    return booking
+
+@router.get("/get-available-locations-for-vehicle/", response_model=schemas.AvailableLocationsResponse, tags=["Parking Search & Booking"])
+async def get_available_locations_for_vehicle_endpoint(vehicle_type: str):
+    free_counts = crud.get_location_free_counts(None, vehicle_type=vehicle_type)
+    return schemas.AvailableLocationsResponse(vehicle_type=vehicle_type, locations=list(free_counts), free_counts=free_counts)
+
+@router.get("/bookings/{booking_id}", response_model=schemas.BookingResponse, tags=["Bookings"])
+async def read_booking(booking_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_booking = await async_crud.get_booking(db, booking_id=booking_id)
+    if db_booking is None:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    return db_booking
+
+@router.get("/user-bookings/{user_id}", response_model=schemas.BookingPage, tags=["Bookings"])
+async def read_user_bookings(user_id: str, limit: int = Query(50, ge=1, le=crud.MAX_PAGE_SIZE), cursor: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    try:
+        bookings, next_cursor = await async_crud.get_user_bookings_page(db, user_id=user_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": bookings, "next_cursor": next_cursor}
@@ -0,0 +1,102 @@
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
+from . import crud, models, schemas
+from .availability import availability_index, location_index, resolve_window
+from .database import get_async_engine
+from .search_cache import search_cache
+from observability.logs import get_logger
+from observability.tracing import current_span, traced
+
+# Async twins of the functions in crud.py for PARKING_API_MODE=async. Statements and booking
+# logic are shared with crud so the two modes can't drift; only the I/O is awaited here.
+# Async sessions can't lazy-load; the shared booking statements already join in the slot.
+
+logger = get_logger(__name__)
+
+
+async def get_parking_slot(db: AsyncSession, slot_id: int):
+    return await db.get(models.ParkingSlot, slot_id)
+
+async def get_parking_slots_page(db: AsyncSession, limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[models.ParkingSlot], Optional[str]]:
+    result = await db.execute(crud.slots_page_statement(limit, cursor))
+    return crud.paginate(result.scalars().all(), limit, crud.encode_slot_cursor)
+
+async def export_slots_ndjson(cursor: Optional[str] = None, chunk_size: int = crud.EXPORT_CHUNK_SIZE):
+    """Async twin of crud.export_slots_ndjson on the aiosqlite engine."""
+    after_id = crud.decode_slot_cursor(cursor) if cursor else 0
+    while True:
+        async with get_async_engine().connect() as conn:
+            rows = (await conn.execute(crud.slot_export_statement(after_id, chunk_size))).all()
+        if rows:
+            yield crud.slot_rows_to_ndjson(rows)
+            after_id = rows[-1].id
+        if len(rows) < chunk_size:
+            return
+
+async def create_parking_slot(db: AsyncSession, slot: schemas.ParkingSlotCreate):
+    db_slot = models.ParkingSlot(**slot.model_dump())
+
+    db.add(db_slot)
+    await db.commit()
+    await db.refresh(db_slot)
+    if db_slot.is_available:
+        location_index.slot_freed(db_slot.vehicle_type, db_slot.location)
+    search_cache.invalidate(db_slot.vehicle_type, db_slot.location)
+    return db_slot
+
+@traced("crud.find_available_slots")
+async def find_available_slots(db: AsyncSession, search_params: schemas.ParkingSearchRequest):
+    start_time, end_time = resolve_window(search_params.date, search_params.duration_hours)
+    result = await db.execute(crud.build_search_statement(search_params, start_time))
+    candidates = result.scalars().all()
+    results = [slot for slot in candidates if availability_index.is_free(slot.id, start_time, end_time)]
+    current_span().set(candidates=len(candidates), results=len(results))
+    return results
+
+@traced("crud.search_available_slots")
+async def search_available_slots(db: AsyncSession, search_params: schemas.ParkingSearchRequest) -> List[schemas.ParkingSlotResponse]:
+    """Async twin of crud.search_available_slots; same cache."""
+    if not search_cache.enabled:
+        return await find_available_slots(db, search_params)
+    key, cached, generation = crud.search_cache_lookup(search_params)
+    current_span().set(cache_hit=cached is not None)
+    if cached is not None:
+        return cached
+    results = [schemas.ParkingSlotResponse.model_validate(slot, from_attributes=True) for slot in await find_available_slots(db, search_params)]
+    search_cache.put(key, results, generation)
+    return results
+
+@traced("crud.create_booking")
+async def create_booking(db: AsyncSession, booking_data: schemas.BookingCreate):
+    """Same conditional claim as crud.create_booking; None for an unknown slot, BookingConflictError on a clash."""
+    slot = await get_parking_slot(db, booking_data.slot_id)
+    if not slot:
+        logger.info("create_booking: Slot ID %s not found.", booking_data.slot_id)
+        crud.BOOKINGS.labels("not_found").inc()
+        return None
+
+    plan = crud.plan_booking(slot, booking_data)
+    db.expunge(slot)
+
+    booking_id = (await db.execute(plan.claim)).scalar()
+    if booking_id is None:
+        await db.rollback()
+        crud.BOOKINGS.labels("conflict").inc()
+        raise crud.BookingConflictError(crud.booking_conflict_message(slot.id, plan.start_time, plan.end_time))
+
+    if plan.starts_now:
+        await db.execute(crud.mark_slot_taken_statement(slot.id))
+    await db.commit()
+
+    return crud.record_booking(slot, plan, booking_id)
+
+@traced("crud.get_booking")
+async def get_booking(db: AsyncSession, booking_id: int):
+    result = await db.execute(crud.booking_statement().where(models.Booking.id == booking_id))
+    return result.scalars().first()
+
+@traced("crud.get_user_bookings_page")
+async def get_user_bookings_page(db: AsyncSession, user_id: str, limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[models.Booking], Optional[str]]:
+    result = await db.execute(crud.user_bookings_statement(user_id, limit=limit, cursor=cursor))
+    return crud.paginate(result.scalars().all(), limit, crud.encode_booking_cursor)
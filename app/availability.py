@@ -0,0 +1,192 @@
+
+import bisect
+import datetime
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+from observability.logs import get_logger
+
+logger = get_logger(__name__)
+
+
+def resolve_window(date: Optional[str], duration_hours: int, now: Optional[datetime.datetime] = None) -> Tuple[datetime.datetime, datetime.datetime]:
+    """
+    Turns the free-form 'date' the agent passes (None, 'today', 'tomorrow', 'YYYY-MM-DD'
+    or a full ISO datetime) into a concrete [start, end) window in naive UTC.
+    Today (or anything we can't parse) starts now; a future day starts at midnight.
+    """
+    now = now or datetime.datetime.utcnow()
+    start = now
+    text = (date or "").strip().lower()
+
+    if text in ("", "today", "now"):
+        start = now
+    elif text == "tomorrow":
+        start = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time.min)
+    else:
+        try:
+            parsed = datetime.datetime.fromisoformat(text.replace("z", "+00:00"))
+            if parsed.tzinfo is not None:
+                parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+            if len(text) == 10 and parsed.date() == now.date():
+                start = now
+            else:
+                start = max(parsed, now)
+        except ValueError:
+            logger.warning("Could not parse date %r, using the current time.", date)
+            start = now
+
+    return start, start + datetime.timedelta(hours=duration_hours)
+
+
+class SlotIntervalIndex:
+    """
+    In-memory index of booked [start, end) windows, one sorted interval list per slot.
+    Overlapping windows are coalesced on insert, so both the start and end lists stay
+    sorted and a free/busy check is two bisects regardless of how many bookings exist.
+    """
+
+    def __init__(self):
+        self._starts: Dict[int, List[datetime.datetime]] = {}
+        self._ends: Dict[int, List[datetime.datetime]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(starts) for starts in self._starts.values())
+
+    def clear(self):
+        with self._lock:
+            self._starts.clear()
+            self._ends.clear()
+
+    def add(self, slot_id: int, start: datetime.datetime, end: datetime.datetime):
+        if end <= start:
+            return
+        with self._lock:
+            starts = self._starts.setdefault(slot_id, [])
+            ends = self._ends.setdefault(slot_id, [])
+
+            # [lo, hi) is the run of existing intervals touching the new one.
+            lo = bisect.bisect_left(ends, start)
+            hi = bisect.bisect_right(starts, end)
+            if lo < hi:
+                start = min(start, starts[lo])
+                end = max(end, ends[hi - 1])
+            starts[lo:hi] = [start]
+            ends[lo:hi] = [end]
+
+    def is_free(self, slot_id: int, start: datetime.datetime, end: datetime.datetime) -> bool:
+        with self._lock:
+            starts = self._starts.get(slot_id)
+            if not starts:
+                return True
+            # Intervals before i start before our window ends; only the last of them can reach into it.
+            i = bisect.bisect_left(starts, end)
+            return i == 0 or self._ends[slot_id][i - 1] <= start
+
+    def free_slot_ids(self, slot_ids: Iterable[int], start: datetime.datetime, end: datetime.datetime) -> List[int]:
+        with self._lock:
+            return [slot_id for slot_id in slot_ids if self.is_free(slot_id, start, end)]
+
+    def prune(self, before: datetime.datetime) -> int:
+        """Drops windows that ended at or before 'before'. Returns how many were removed."""
+        removed = 0
+        with self._lock:
+            for slot_id in list(self._ends):
+                ends = self._ends[slot_id]
+                cut = bisect.bisect_right(ends, before)
+                if cut:
+                    del ends[:cut]
+                    del self._starts[slot_id][:cut]
+                    removed += cut
+                if not ends:
+                    del self._ends[slot_id]
+                    del self._starts[slot_id]
+        return removed
+
+    def rebuild(self, db: Session, now: Optional[datetime.datetime] = None) -> int:
+        """Reloads the index from the bookings table. Finished bookings can't block anything, so they are skipped."""
+        now = now or datetime.datetime.utcnow()
+        rows = (
+            db.query(models.Booking.slot_id, models.Booking.start_time, models.Booking.end_time)
+            .filter(models.Booking.end_time > now)
+            .order_by(models.Booking.slot_id, models.Booking.start_time)
+            .yield_per(10000)
+        )
+        with self._lock:
+            self.clear()
+            for slot_id, start, end in rows:
+                self.add(slot_id, start, end)
+            count = len(self)
+        logger.info("Index rebuilt with %d active booking window(s).", count)
+        return count
+
+
+availability_index = SlotIntervalIndex()
+
+
+class LocationAvailabilityIndex:
+    """
+    vehicle_type -> {location: number of slots free right now}, kept in memory so the
+    locations endpoint doesn't run a SELECT DISTINCT ... ILIKE per call. Rebuilt with one
+    GROUP BY at startup and adjusted by crud whenever a slot is created, taken or released.
+    Vehicle types are keyed with models.normalize_key, matching the vehicle_type_key column.
+    """
+
+    def __init__(self):
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+    def adjust(self, vehicle_type: str, location: str, delta: int):
+        if not vehicle_type or not location:
+            return
+        with self._lock:
+            by_location = self._counts.setdefault(models.normalize_key(vehicle_type), {})
+            count = by_location.get(location, 0) + delta
+            if count > 0:
+                by_location[location] = count
+            else:
+                by_location.pop(location, None)
+
+    def slot_freed(self, vehicle_type: str, location: str):
+        self.adjust(vehicle_type, location, 1)
+
+    def slot_taken(self, vehicle_type: str, location: str):
+        self.adjust(vehicle_type, location, -1)
+
+    def snapshot(self) -> Dict[Tuple[str, str], int]:
+        """(vehicle type key, location) -> free slots, for every group with at least one free."""
+        with self._lock:
+            return {(vehicle_type, location): count for vehicle_type, by_location in self._counts.items()
+                    for location, count in by_location.items()}
+
+    def free_counts(self, vehicle_type: str) -> Dict[str, int]:
+        """Free slots per location for a vehicle type (a copy, safe to hand out)."""
+        with self._lock:
+            return dict(self._counts.get(models.normalize_key(vehicle_type), {}))
+
+    def rebuild(self, db: Session) -> int:
+        rows = (
+            db.query(models.ParkingSlot.vehicle_type, models.ParkingSlot.location, func.count(models.ParkingSlot.id))
+            .filter(models.ParkingSlot.is_available == True)
+            .group_by(models.ParkingSlot.vehicle_type, models.ParkingSlot.location)
+            .all()
+        )
+        with self._lock:
+            self._counts.clear()
+        for vehicle_type, location, count in rows:
+            self.adjust(vehicle_type, location, count)
+        logger.info("Location index rebuilt from %d (vehicle_type, location) group(s).", len(rows))
+        return len(rows)
+
+
+location_index = LocationAvailabilityIndex()
@@ -0,0 +1,175 @@
+
+import argparse
+import collections
+import csv
+import json
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+from . import schemas
+from .availability import location_index
+from .search_cache import search_cache
+from .database import bulk_insert_slots
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+_slot_batch_adapter = TypeAdapter(List[schemas.ParkingSlotCreate])
+
+
+def detect_format(content_type: Optional[str], filename: Optional[str] = None) -> str:
+    """'csv' or 'ndjson' from a Content-Type header or file extension; CSV is the default."""
+    hint = f"{content_type or ''} {filename or ''}".lower()
+    if "ndjson" in hint or "jsonl" in hint or "json" in hint:
+        return "ndjson"
+    return "csv"
+
+
+class RecordParser:
+    """
+    Turns input lines into (line_number, record) pairs one line at a time, so callers can feed it
+    from a file or an HTTP body stream. CSV needs a header row naming the ParkingSlotCreate fields;
+    empty CSV cells are dropped so schema defaults (e.g. is_available) apply. Lines that can't be
+    parsed come back with an Exception as the record, for the importer to report.
+    """
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        self.line_number = 0
+        self.fields: Optional[List[str]] = None
+
+    def parse(self, line: str) -> Optional[Tuple[int, object]]:
+        self.line_number += 1
+        if not line.strip():
+            return None
+        if self.fmt == "ndjson":
+            try:
+                return self.line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                return self.line_number, e
+
+        values = next(csv.reader([line]))
+        if self.fields is None:
+            self.fields = [name.strip() for name in values]
+            return None
+        if len(values) != len(self.fields):
+            return self.line_number, ValueError(f"expected {len(self.fields)} columns, got {len(values)}")
+        return self.line_number, {name: value for name, value in zip(self.fields, values) if value != ""}
+
+
+class LineSplitter:
+    """Re-splits a stream of byte chunks into text lines without holding the whole body."""
+
+    def __init__(self):
+        self._pending = b""
+
+    def feed(self, chunk: bytes) -> List[str]:
+        *lines, self._pending = (self._pending + chunk).split(b"\n")
+        return [line.decode("utf-8").rstrip("\r") for line in lines]
+
+    def finish(self) -> List[str]:
+        pending, self._pending = self._pending, b""
+        return [pending.decode("utf-8").rstrip("\r")] if pending else []
+
+
+class SlotImporter:
+    """
+    Accumulates records into batches, validates each batch with one pydantic call and inserts the
+    valid rows with a single executemany (see database.bulk_insert_slots). Invalid rows are reported
+    by line number and skipped; they don't abort the rest of the import.
+    """
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[schemas.BulkImportError] = []
+        self._line_numbers: List[int] = []
+        self._records: List[object] = []
+
+    def add(self, line_number: int, record: object) -> bool:
+        """Queues a record; returns True once a full batch is waiting for flush()."""
+        if isinstance(record, Exception):
+            self._error(line_number, str(record))
+        else:
+            self._line_numbers.append(line_number)
+            self._records.append(record)
+        return len(self._records) >= self.batch_size
+
+    def add_all(self, records: Iterable[Tuple[int, object]]) -> "SlotImporter":
+        for line_number, record in records:
+            if self.add(line_number, record):
+                self.flush()
+        self.flush()
+        return self
+
+    def flush(self):
+        if not self._records:
+            return
+        line_numbers, records = self._line_numbers, self._records
+        self._line_numbers, self._records = [], []
+
+        try:
+            rows = [slot.model_dump() for slot in _slot_batch_adapter.validate_python(records)]
+        except ValidationError as e:
+            bad: Dict[int, str] = {}
+            for error in e.errors():
+                index = error["loc"][0]
+                field = ".".join(str(part) for part in error["loc"][1:]) or "row"
+                bad.setdefault(index, f"{field}: {error['msg']}")
+            for index, message in bad.items():
+                self._error(line_numbers[index], message)
+            good = [record for index, record in enumerate(records) if index not in bad]
+            rows = [slot.model_dump() for slot in _slot_batch_adapter.validate_python(good)]
+
+        if not rows:
+            return
+        bulk_insert_slots(rows)
+        self.inserted += len(rows)
+
+        free = collections.Counter((row["vehicle_type"], row["location"]) for row in rows if row["is_available"])
+        for (vehicle_type, location), count in free.items():
+            location_index.adjust(vehicle_type, location, count)
+        # Unavailable slots still show up in searches for future windows.
+        search_cache.invalidate_many((row["vehicle_type"], row["location"]) for row in rows)
+
+    def _error(self, line_number: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(schemas.BulkImportError(line=line_number, error=message))
+
+    def result(self) -> schemas.BulkImportResponse:
+        errors = sorted(self.errors, key=lambda error: error.line)
+        return schemas.BulkImportResponse(inserted=self.inserted, failed=self.failed, errors=errors)
+
+
+def import_slots_file(path: str, fmt: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> schemas.BulkImportResponse:
+    fmt = fmt or detect_format(None, path)
+    parser = RecordParser(fmt)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        records = (parser.parse(line.rstrip("\r\n")) for line in f)
+        return SlotImporter(batch_size).add_all(record for record in records if record).result()
+
+
+def import_slot_dicts(slots: Iterable[dict], batch_size: int = DEFAULT_BATCH_SIZE) -> schemas.BulkImportResponse:
+    """In-process entry point used for seeding: slots are plain dicts with ParkingSlotCreate fields."""
+    return SlotImporter(batch_size).add_all(enumerate(slots, start=1)).result()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load parking slots from a CSV or NDJSON file.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default=None, help="Default: from the file extension")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    from .database import create_db_and_tables
+
+    create_db_and_tables()
+    started = time.perf_counter()
+    result = import_slots_file(args.path, args.format, args.batch_size)
+    print(f"BULK IMPORT: Inserted {result.inserted} slot(s), {result.failed} failed, in {time.perf_counter() - started:.2f}s.")
+    for error in result.errors:
+        print(f"  line {error.line}: {error.error}")
@@ -1,16 +1,84 @@
 
-from sqlalchemy.orm import Session
-from sqlalchemy import func, distinct
-from typing import List 
-from . import models, schemas
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, column, exists, insert, literal, or_, select, table, update
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from . import database, models, schemas
+from .availability import availability_index, location_index, resolve_window
+from .release_scheduler import release_scheduler
+from .search_cache import search_cache, search_key
+from observability.logs import get_logger
+from observability.metrics import registry
+from observability.tracing import current_span, traced
+import base64
+import binascii
 import datetime 
+import json
+
+logger = get_logger(__name__)
+
+# Outcomes of create_booking (sync and async): success, conflict (the window is taken, including
+# lost races) or not_found (unknown slot).
+BOOKINGS = registry.counter("parking_bookings", "Booking attempts, by result.", ("result",))
+
+MAX_PAGE_SIZE = 200
+# Rows per keyset chunk when exporting the whole slot table as NDJSON.
+EXPORT_CHUNK_SIZE = 1000
 
 
 def get_parking_slot(db: Session, slot_id: int):
     return db.query(models.ParkingSlot).filter(models.ParkingSlot.id == slot_id).first()
 
-def get_parking_slots(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.ParkingSlot).offset(skip).limit(limit).all()
+def get_parking_slots_page(db: Session, limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[models.ParkingSlot], Optional[str]]:
+    """One keyset page of slots in id order, plus the cursor for the next page (None at the end)."""
+    slots = db.execute(slots_page_statement(limit, cursor)).scalars().all()
+    return paginate(slots, limit, encode_slot_cursor)
+
+def slots_page_statement(limit: int, cursor: Optional[str] = None):
+    """Seeks past the last id already returned instead of OFFSET, so deep pages cost the same as the first."""
+    statement = select(models.ParkingSlot).order_by(models.ParkingSlot.id)
+    if cursor:
+        statement = statement.where(models.ParkingSlot.id > decode_slot_cursor(cursor))
+    return statement.limit(limit + 1)
+
+def encode_slot_cursor(slot: models.ParkingSlot) -> str:
+    return base64.urlsafe_b64encode(str(slot.id).encode()).decode()
+
+def decode_slot_cursor(cursor: str) -> int:
+    """Raises ValueError for a cursor we didn't issue."""
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def slot_export_statement(after_id: int, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """Plain rows (no ORM objects) for the NDJSON export; ParkingSlotResponse fields in id order."""
+    return (
+        select(*(models.ParkingSlot.__table__.c[name] for name in schemas.ParkingSlotResponse.model_fields))
+        .where(models.ParkingSlot.id > after_id)
+        .order_by(models.ParkingSlot.id)
+        .limit(chunk_size)
+    )
+
+def slot_rows_to_ndjson(rows) -> str:
+    return "".join(json.dumps(dict(row._mapping)) + "\n" for row in rows)
+
+def export_slots_ndjson(cursor: Optional[str] = None, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Yields the whole slot table as NDJSON text, chunk_size rows at a time. Each chunk is its own
+    short keyset query on a pooled connection, so memory stays bounded and SQLite's read lock is
+    never held while the client drains the response (a single long cursor would block booking
+    writes for the whole export). Rows inserted mid-export with higher ids are included.
+    A cursor from the paged endpoint resumes the export after that slot.
+    """
+    after_id = decode_slot_cursor(cursor) if cursor else 0
+    while True:
+        with database.engine.connect() as conn:
+            rows = conn.execute(slot_export_statement(after_id, chunk_size)).all()
+        if rows:
+            yield slot_rows_to_ndjson(rows)
+            after_id = rows[-1].id
+        if len(rows) < chunk_size:
+            return
 
 def create_parking_slot(db: Session, slot: schemas.ParkingSlotCreate):
  
@@ -19,83 +87,263 @@ def create_parking_slot(db: Session, slot: schemas.ParkingSlotCreate):
     db.add(db_slot)
     db.commit()
     db.refresh(db_slot)
+    if db_slot.is_available:
+        location_index.slot_freed(db_slot.vehicle_type, db_slot.location)
+    search_cache.invalidate(db_slot.vehicle_type, db_slot.location)
     return db_slot
 
-def find_available_slots(db: Session, search_params: schemas.ParkingSearchRequest):
+def _location_matches(location: str):
     """
-    Finds currently available slots.
-    NOTE: The 'date' from search_params is NOT used for DB filtering in this version.
-    This function checks general availability (ParkingSlot.is_available == True).
-    A full time-based availability check would require comparing requested date/duration
-    against start_time/end_time of existing bookings for each slot.
+    Case-insensitive substring match on location. Uses the FTS5 trigram table when it exists,
+    which turns the LIKE '%...%' into an index lookup returning matching slot ids.
     """
-    print(f"CRUD: Searching with params: vehicle_type='{search_params.vehicle_type}', "
-          f"location='{search_params.location}', slot_type='{search_params.slot_type}', "
-          f"date='{search_params.date}', duration='{search_params.duration_hours}'")
+    pattern = f"%{models.normalize_key(location)}%"
+    if not database.location_search_enabled:
+        return models.ParkingSlot.location_key.like(pattern)
+    fts = table(database.LOCATION_SEARCH_TABLE, column("rowid"), column("location"))
+    return models.ParkingSlot.id.in_(select(fts.c.rowid).where(fts.c.location.like(pattern)))
 
-    query = db.query(models.ParkingSlot).filter(
-        models.ParkingSlot.is_available == True,
-        models.ParkingSlot.vehicle_type.ilike(search_params.vehicle_type),
-        models.ParkingSlot.location.ilike(f"%{search_params.location}%")
+def build_search_statement(search_params: schemas.ParkingSearchRequest, start_time: datetime.datetime):
+    """SELECT for slots matching vehicle/location/slot type; shared by the sync and async crud."""
+    statement = select(models.ParkingSlot).where(
+        models.ParkingSlot.vehicle_type_key == models.normalize_key(search_params.vehicle_type),
+        _location_matches(search_params.location)
     )
     
     if search_params.slot_type:
-        query = query.filter(models.ParkingSlot.slot_type.ilike(search_params.slot_type))
-    
-    results = query.all()
-    print(f"CRUD: Found {len(results)} generally available slots matching criteria (not yet time-filtered).")
+        statement = statement.where(models.ParkingSlot.slot_type_key == models.normalize_key(search_params.slot_type))
+
+    if start_time <= datetime.datetime.utcnow():
+        statement = statement.where(models.ParkingSlot.is_available == True)
+    return statement
+
+@traced("crud.find_available_slots")
+def find_available_slots(db: Session, search_params: schemas.ParkingSearchRequest):
+    """
+    Finds slots that are free for the whole requested window.
+    The 'date' and 'duration_hours' from search_params are resolved into a [start, end) window,
+    candidates are filtered in SQL on the normalized vehicle/slot type keys (composite index) and
+    the location search index, and each candidate is then
+    checked against the in-memory booking interval index (two bisects per slot).
+    Windows starting now additionally require ParkingSlot.is_available, so slots taken
+    out of service by hand stay hidden.
+    """
+    start_time, end_time = resolve_window(search_params.date, search_params.duration_hours)
+    logger.debug("Searching with params: vehicle_type=%r, location=%r, slot_type=%r, date=%r, duration=%r, window=%s..%s",
+                 search_params.vehicle_type, search_params.location, search_params.slot_type, search_params.date,
+                 search_params.duration_hours, start_time.isoformat(), end_time.isoformat())
+
+    candidates = db.execute(build_search_statement(search_params, start_time)).scalars().all()
+    results = [slot for slot in candidates if availability_index.is_free(slot.id, start_time, end_time)]
+    current_span().set(candidates=len(candidates), results=len(results))
+    logger.debug("Found %d of %d matching slots free for the requested window.", len(results), len(candidates))
+    return results
+
+
+def search_cache_lookup(search_params: schemas.ParkingSearchRequest):
+    """
+    (key, cached results or None, generation) for a search; shared by the sync and async crud.
+    Take the generation before running the query and hand it back to search_cache.put.
+    """
+    now = datetime.datetime.utcnow()
+    start_time, end_time = resolve_window(search_params.date, search_params.duration_hours, now=now)
+    key = search_key(search_params, start_time, end_time, now)
+    return key, search_cache.get(key), search_cache.generation(search_params.vehicle_type)
+
+
+@traced("crud.search_available_slots")
+def search_available_slots(db: Session, search_params: schemas.ParkingSearchRequest) -> List[schemas.ParkingSlotResponse]:
+    """
+    find_available_slots behind the search result cache, for the search endpoint. Results are
+    kept as ParkingSlotResponse objects, so cached entries hold no ORM state or session.
+    """
+    if not search_cache.enabled:
+        return find_available_slots(db, search_params)
+    key, cached, generation = search_cache_lookup(search_params)
+    current_span().set(cache_hit=cached is not None)
+    if cached is not None:
+        return cached
+    results = [schemas.ParkingSlotResponse.model_validate(slot, from_attributes=True) for slot in find_available_slots(db, search_params)]
+    search_cache.put(key, results, generation)
     return results
 
 
+class BookingConflictError(Exception):
+    """Raised by create_booking when the slot is already taken for the requested window."""
+
+
+class BookingPlan(NamedTuple):
+    start_time: datetime.datetime
+    end_time: datetime.datetime
+    starts_now: bool
+    values: Dict[str, object]
+    claim: object
+
+
+def plan_booking(slot: models.ParkingSlot, booking_data: schemas.BookingCreate) -> BookingPlan:
+    """
+    Resolves the booking window and builds the conditional claim statement for a slot.
+    Raises BookingConflictError straight away if the in-memory state already shows a clash;
+    the claim itself is what actually guarantees no double booking.
+    """
+    now = datetime.datetime.utcnow()
+    start_time, end_time = resolve_window(booking_data.date, booking_data.duration_hours, now=now)
+    starts_now = start_time <= now
+    if (starts_now and not slot.is_available) or not availability_index.is_free(slot.id, start_time, end_time):
+        message = booking_conflict_message(slot.id, start_time, end_time)
+        logger.info("create_booking: %s", message)
+        BOOKINGS.labels("conflict").inc()
+        raise BookingConflictError(message)
+
+    values = {
+        "slot_id": slot.id,
+        "user_id": booking_data.user_id,
+        "vehicle_number": booking_data.vehicle_number,
+        "start_time": start_time,
+        "end_time": end_time,
+        "duration_hours": booking_data.duration_hours,
+        "total_cost": slot.price_per_hour * booking_data.duration_hours,
+        "is_confirmed": True,
+    }
+    columns = models.Booking.__table__.c
+    claimable = ~exists().where(
+        models.Booking.slot_id == slot.id,
+        models.Booking.end_time > start_time,
+        models.Booking.start_time < end_time,
+    )
+    # is_available tracks whether the slot is occupied right now; future windows live in the index.
+    if starts_now:
+        claimable = claimable & exists().where(models.ParkingSlot.id == slot.id, models.ParkingSlot.is_available == True)
+
+    claim = (
+        insert(models.Booking)
+        .from_select(list(values), select(*[literal(value, columns[name].type) for name, value in values.items()]).where(claimable))
+        .returning(models.Booking.id)
+    )
+    return BookingPlan(start_time, end_time, starts_now, values, claim)
+
+
+def booking_conflict_message(slot_id: int, start_time: datetime.datetime, end_time: datetime.datetime) -> str:
+    return f"Slot ID {slot_id} is already booked between {start_time:%Y-%m-%d %H:%M} and {end_time:%Y-%m-%d %H:%M} UTC."
+
+
+def mark_slot_taken_statement(slot_id: int):
+    return update(models.ParkingSlot).where(models.ParkingSlot.id == slot_id).values(is_available=False)
+
+
+def record_booking(slot: models.ParkingSlot, plan: BookingPlan, booking_id: int) -> models.Booking:
+    """Updates the in-memory indexes after a committed claim and builds the response object."""
+    if plan.starts_now:
+        slot.is_available = False
+    availability_index.add(slot.id, plan.start_time, plan.end_time)
+    # Any window can be affected, not just "now", so searches for this slot's bucket are dropped either way.
+    search_cache.invalidate(slot.vehicle_type, slot.location)
+    BOOKINGS.labels("success").inc()
+    if plan.starts_now:
+        location_index.slot_taken(slot.vehicle_type, slot.location)
+        release_scheduler.schedule(slot.id, plan.end_time)
+    else:
+        # is_available and the location index only change once the window opens.
+        release_scheduler.schedule_start(slot.id, plan.start_time, plan.end_time)
+    return models.Booking(id=booking_id, slot=slot, **plan.values)
+
+
+@traced("crud.create_booking")
 def create_booking(db: Session, booking_data: schemas.BookingCreate):
+    """
+    Books a slot with a single conditional INSERT ... SELECT ... WHERE NOT EXISTS(overlapping booking).
+    SQLite takes the write lock at the start of that statement, so the overlap check and the insert
+    are atomic: concurrent requests for the same window can't both succeed. Returns None for an
+    unknown slot and raises BookingConflictError when the window is already taken.
+    """
     slot = get_parking_slot(db, booking_data.slot_id)
     if not slot:
-        print(f"CRUD create_booking: Slot ID {booking_data.slot_id} not found.")
-        return None
-    if not slot.is_available:
-        print(f"CRUD create_booking: Slot ID {booking_data.slot_id} is not generally available.")
+        logger.info("create_booking: Slot ID %s not found.", booking_data.slot_id)
+        BOOKINGS.labels("not_found").inc()
         return None
 
-    start_time = datetime.datetime.utcnow()
-    end_time = start_time + datetime.timedelta(hours=booking_data.duration_hours)
-    total_cost = slot.price_per_hour * booking_data.duration_hours
-
-    db_booking = models.Booking(
-        slot_id=booking_data.slot_id,
-        user_id=booking_data.user_id,
-        vehicle_number=booking_data.vehicle_number,
-        start_time=start_time,
-        end_time=end_time,
-        duration_hours=booking_data.duration_hours,
-        total_cost=total_cost,
-        is_confirmed=True
-    )
-    
-    slot.is_available = False
-    
-    db.add(db_booking)
-    db.add(slot)
+    plan = plan_booking(slot, booking_data)
+    # The response is built from this slot; detach it so the commit doesn't expire it and force a refresh.
+    db.expunge(slot)
+
+    booking_id = db.execute(plan.claim).scalar()
+    if booking_id is None:
+        db.rollback()
+        message = booking_conflict_message(slot.id, plan.start_time, plan.end_time)
+        logger.info("create_booking: Lost the race, %s", message)
+        BOOKINGS.labels("conflict").inc()
+        raise BookingConflictError(message)
+
+    if plan.starts_now:
+        db.execute(mark_slot_taken_statement(slot.id))
     db.commit()
-    
-    db.refresh(db_booking)
-    db.refresh(slot)
-    
-    return db_booking
 
+    return record_booking(slot, plan, booking_id)
+
+@traced("crud.get_booking")
 def get_booking(db: Session, booking_id: int):
-    return db.query(models.Booking).filter(models.Booking.id == booking_id).first()
+    # BookingResponse nests the slot; load it in the same query instead of lazily afterwards.
+    return db.execute(booking_statement().where(models.Booking.id == booking_id)).scalars().first()
+
+@traced("crud.get_user_bookings_page")
+def get_user_bookings_page(db: Session, user_id: str, limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[models.Booking], Optional[str]]:
+    """One keyset page of a user's bookings, newest first, plus the cursor for the next page (None at the end)."""
+    bookings = db.execute(user_bookings_statement(user_id, limit=limit, cursor=cursor)).scalars().all()
+    return paginate(bookings, limit, encode_booking_cursor)
+
+
+def booking_statement():
+    return select(models.Booking).options(joinedload(models.Booking.slot))
+
+def user_bookings_statement(user_id: str, limit: int, cursor: Optional[str] = None):
+    """
+    A user's bookings ordered by (start_time, id) descending, slots joined in. Fetches limit + 1
+    rows so paginate can tell whether another page exists; the cursor is the
+    (start_time, id) of the last row already returned, served by ix_bookings_user_id_start_time.
+    """
+    statement = (
+        booking_statement()
+        .where(models.Booking.user_id == user_id)
+        .order_by(models.Booking.start_time.desc(), models.Booking.id.desc())
+    )
+    if cursor:
+        start_time, booking_id = decode_booking_cursor(cursor)
+        statement = statement.where(or_(
+            models.Booking.start_time < start_time,
+            and_(models.Booking.start_time == start_time, models.Booking.id < booking_id),
+        ))
+    return statement.limit(limit + 1)
+
+def paginate(rows: list, limit: int, encode_cursor) -> Tuple[list, Optional[str]]:
+    """Trims the extra row a keyset statement fetched (limit + 1) and turns the last kept row into the next cursor."""
+    if len(rows) <= limit:
+        return list(rows), None
+    page = list(rows[:limit])
+    return page, encode_cursor(page[-1])
 
-def get_user_bookings(db: Session, user_id: str) -> List[models.Booking]: 
-    return db.query(models.Booking).filter(models.Booking.user_id == user_id).order_by(models.Booking.start_time.desc()).all()
+def encode_booking_cursor(booking: models.Booking) -> str:
+    raw = f"{booking.start_time.isoformat()}|{booking.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_booking_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    """Raises ValueError for a cursor we didn't issue."""
+    try:
+        start_time, booking_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(start_time), int(booking_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def get_location_free_counts(db, vehicle_type: str) -> Dict[str, int]:
+    """
+    Free-right-now slot counts per location for a vehicle type, most free first.
+    Served from the in-memory location index, so it never uses db (sync or async session).
+    """
+    counts = location_index.free_counts(vehicle_type)
+    return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
 
 
 def get_distinct_locations_for_vehicle_type(db: Session, vehicle_type: str) -> List[str]:
-    print(f"CRUD (get_distinct_locations_for_vehicle_type): Searching for vehicle_type='{vehicle_type}'")
-    query_result = db.query(distinct(models.ParkingSlot.location)).filter(
-        models.ParkingSlot.is_available == True, 
-        models.ParkingSlot.vehicle_type.ilike(vehicle_type)
-    ).all()
-    locations = [location_tuple[0] for location_tuple in query_result]
-    print(f"CRUD (get_distinct_locations_for_vehicle_type): Found locations: {locations}")
+    locations = list(get_location_free_counts(db, vehicle_type))
+    logger.debug("get_distinct_locations_for_vehicle_type: vehicle_type=%r -> %s", vehicle_type, locations)
     return locations
-
@@ -1,21 +1,55 @@
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func, inspect, select, text
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 
-DATABASE_URL = "sqlite:///./data/parking.db"
+from observability.logs import get_logger
+
+logger = get_logger(__name__)
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/parking.db")
 
 
 os.makedirs("./data", exist_ok=True)
 
+# Unlimited overflow: a request holds its connection until the session is closed in a threadpool
+# teardown, so a capped pool can starve those teardowns under load and stall the whole API.
+# SQLite connections are cheap, and only pool_size of them are kept open between requests.
+# The 30s busy timeout lets writers queue for SQLite's single write lock instead of failing at 5s.
 engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
+    DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 30}, pool_size=10, max_overflow=-1
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# "sync" serves the API from def handlers on Starlette's threadpool; "async" swaps in async def
+# handlers on an aiosqlite engine (see app/async_api.py).
+API_MODE = os.getenv("PARKING_API_MODE", "sync").lower()
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1))
+
+# Created on first use so sync deployments don't need aiosqlite installed.
+async_engine = None
+AsyncSessionLocal = None
+
 Base = declarative_base() 
 
+LOCATION_SEARCH_TABLE = "parking_slots_fts"
+# Set by create_db_and_tables once the FTS5 trigram table exists; crud falls back to LIKE without it.
+location_search_enabled = False
+
+_LOCATION_SEARCH_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {LOCATION_SEARCH_TABLE} USING fts5("
+    "location, content='parking_slots', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {LOCATION_SEARCH_TABLE}_ai AFTER INSERT ON parking_slots BEGIN "
+    f"INSERT INTO {LOCATION_SEARCH_TABLE}(rowid, location) VALUES (new.id, new.location); END",
+    f"CREATE TRIGGER IF NOT EXISTS {LOCATION_SEARCH_TABLE}_ad AFTER DELETE ON parking_slots BEGIN "
+    f"INSERT INTO {LOCATION_SEARCH_TABLE}({LOCATION_SEARCH_TABLE}, rowid, location) VALUES ('delete', old.id, old.location); END",
+    f"CREATE TRIGGER IF NOT EXISTS {LOCATION_SEARCH_TABLE}_au AFTER UPDATE OF location ON parking_slots BEGIN "
+    f"INSERT INTO {LOCATION_SEARCH_TABLE}({LOCATION_SEARCH_TABLE}, rowid, location) VALUES ('delete', old.id, old.location); "
+    f"INSERT INTO {LOCATION_SEARCH_TABLE}(rowid, location) VALUES (new.id, new.location); END",
+]
+
 def get_db():
     db = SessionLocal()
     try:
@@ -23,13 +57,110 @@ def get_db():
     finally:
         db.close()
 
+def get_async_sessionmaker():
+    global async_engine, AsyncSessionLocal
+    if AsyncSessionLocal is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        async_engine = create_async_engine(ASYNC_DATABASE_URL, connect_args={"timeout": 30}, pool_size=10, max_overflow=-1)
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return AsyncSessionLocal
+
+def get_async_engine():
+    get_async_sessionmaker()
+    return async_engine
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
 def create_db_and_tables():
-    print("DATABASE: Attempting to create tables...")
+    logger.debug("Attempting to create tables...")
     try:
       
         from . import models 
         Base.metadata.create_all(bind=engine)
-        print("DATABASE: Base.metadata.create_all(bind=engine) executed.")
+        logger.debug("Base.metadata.create_all(bind=engine) executed.")
+        _add_missing_columns()
+        # create_all skips indexes on tables that already exist, so add any new ones explicitly.
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+        _create_location_search_index()
+        refresh_planner_stats()
     except Exception as e:
-        print(f"DATABASE: ERROR during table creation: {e}")
-        raise 
\ No newline at end of file
+        logger.error("Error during table creation: %s", e)
+        raise
+
+def _add_missing_columns():
+    """create_all never alters existing tables; add columns introduced since the database was created."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                    logger.info("Added column %s.%s.", table.name, column.name)
+
+def _create_location_search_index():
+    """
+    Trigram FTS5 index over parking_slots.location, kept in sync by triggers, so substring
+    location searches don't need a LIKE '%...%' scan of the whole table.
+    """
+    global location_search_enabled
+    if engine.dialect.name != "sqlite":
+        return
+    try:
+        with engine.begin() as conn:
+            is_new = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": LOCATION_SEARCH_TABLE}
+            ).first() is None
+            for statement in _LOCATION_SEARCH_DDL:
+                conn.execute(text(statement))
+            if is_new:
+                conn.execute(text(f"INSERT INTO {LOCATION_SEARCH_TABLE}({LOCATION_SEARCH_TABLE}) VALUES ('rebuild')"))
+                logger.info("Built %s location search index.", LOCATION_SEARCH_TABLE)
+        location_search_enabled = True
+    except Exception as e:
+        # Older SQLite builds lack FTS5 or the trigram tokenizer; searches fall back to LIKE on location_key.
+        logger.warning("Location search index unavailable, falling back to LIKE scans: %s", e)
+        location_search_enabled = False
+
+def refresh_planner_stats():
+    """
+    Sampled ANALYZE so SQLite knows vehicle_type_key has few distinct values and drives location
+    searches from the FTS hits instead of the lookup index. Call again after large bulk loads.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        conn.execute(text("PRAGMA analysis_limit=1000"))
+        conn.execute(text("ANALYZE parking_slots"))
+
+def bulk_insert_slots(rows):
+    """
+    Inserts parking_slots rows with one executemany inside a BEGIN IMMEDIATE transaction.
+    The per-row FTS trigger is dropped for the duration and the new rows are indexed with a
+    single INSERT ... SELECT, which is several times faster than firing the trigger per row.
+    Holding the write lock from the start means no other writer can slip in while the trigger
+    is gone, and a failure rolls the DDL back with everything else.
+    """
+    from .models import ParkingSlot
+
+    table = ParkingSlot.__table__
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        last_id = conn.execute(select(func.coalesce(func.max(table.c.id), 0))).scalar()
+        if location_search_enabled:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {LOCATION_SEARCH_TABLE}_ai"))
+        conn.execute(table.insert(), rows)
+        if location_search_enabled:
+            conn.execute(text(
+                f"INSERT INTO {LOCATION_SEARCH_TABLE}(rowid, location) "
+                "SELECT id, location FROM parking_slots WHERE id > :last_id"
+            ), {"last_id": last_id})
+            conn.execute(text(_LOCATION_SEARCH_DDL[1]))
+    return last_id + 1
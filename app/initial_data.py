@@ -3,20 +3,24 @@
 from .database import SessionLocal, create_db_and_tables 
 from .models import ParkingSlot 
 from .schemas import ParkingSlotCreate
-from .crud import create_parking_slot
+from .bulk_import import import_slot_dicts
+from observability.logs import get_logger
+
+# Named explicitly: run as a script, __name__ is "__main__".
+logger = get_logger("app.initial_data")
 
 def init_db():
 
-    print("Ensuring database tables are created...")
+    logger.info("Ensuring database tables are created...")
     create_db_and_tables() 
-    print("Database tables checked/created.")
+    logger.info("Database tables checked/created.")
  
     db = SessionLocal()
     
     try:
     
         if db.query(ParkingSlot).count() == 0:
-            print("Populating initial parking slot data (all will be initially available by default)...")
+            logger.info("Populating initial parking slot data (all will be initially available by default)...")
             slots_data = [
                 ParkingSlotCreate(location="Downtown Mall", slot_type="covered", vehicle_type="car", price_per_hour=5.0),
                 ParkingSlotCreate(location="Downtown Mall", slot_type="open", vehicle_type="car", price_per_hour=4.0),
@@ -30,17 +34,16 @@ def init_db():
    
             ]
             
-            for slot_data in slots_data:
-                create_parking_slot(db=db, slot=slot_data)
-            print("Initial data populated.")
+            result = import_slot_dicts(slot_data.model_dump() for slot_data in slots_data)
+            logger.info("Initial data populated (%d slots).", result.inserted)
         else:
-            print("Database already contains data. Skipping population.")
+            logger.info("Database already contains data. Skipping population.")
     finally:
      
         db.close()
-        print("Database session closed.")
+        logger.debug("Database session closed.")
 
 if __name__ == "__main__":
-    print("Script execution started: Initializing database and populating data...")
+    logger.info("Script execution started: Initializing database and populating data...")
     init_db() 
-    print("Script execution finished: Database initialization complete.")
\ No newline at end of file
+    logger.info("Script execution finished: Database initialization complete.")
\ No newline at end of file
@@ -1,15 +1,47 @@
 
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from . import crud, models, schemas, database
+from . import bulk_import, crud, models, schemas, database
+from .availability import availability_index, location_index
 from .database import SessionLocal, engine, create_db_and_tables
+from .release_scheduler import release_scheduler
+from .search_cache import search_cache
+from observability.logs import get_logger
+from observability.metrics import CONTENT_TYPE, MetricsMiddleware, registry
+from observability.tracing import TraceMiddleware
+import contextlib
+
+logger = get_logger(__name__)
 
 
 create_db_and_tables()
 
-app = FastAPI(title="Parking Management API")
+with SessionLocal() as startup_db:
+    availability_index.rebuild(startup_db)
+    # Before the location index, so slots freed by the catch-up release are counted.
+    release_scheduler.rebuild(startup_db)
+    location_index.rebuild(startup_db)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    release_scheduler.start()
+    yield
+    release_scheduler.stop()
+
+app = FastAPI(title="Parking Management API", lifespan=lifespan)
+# Each request gets an "http.request" span, joining the agent's trace when the tool sent X-Trace-Id.
+app.add_middleware(TraceMiddleware)
+# Request count and latency per route for /metrics. Added last, so it is outermost and times the tracing too.
+app.add_middleware(MetricsMiddleware)
+
+registry.gauge("parking_free_slots", "Slots free right now, by vehicle type and location.", ("vehicle_type", "location"),
+               location_index.snapshot)
+router = APIRouter()
 
 
 def get_db():
@@ -19,36 +51,62 @@ def get_db():
     finally:
         db.close()
 
-@app.post("/parking-slots/", response_model=schemas.ParkingSlotResponse, tags=["Parking Slots"])
+@router.post("/parking-slots/", response_model=schemas.ParkingSlotResponse, tags=["Parking Slots"])
 def create_parking_slot_endpoint(slot: schemas.ParkingSlotCreate, db: Session = Depends(get_db)):
     return crud.create_parking_slot(db=db, slot=slot)
 
-@app.get("/parking-slots/", response_model=List[schemas.ParkingSlotResponse], tags=["Parking Slots"])
-def read_parking_slots(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
-    slots = crud.get_parking_slots(db, skip=skip, limit=limit)
-    return slots
+@router.get("/parking-slots/", response_model=schemas.ParkingSlotPage, tags=["Parking Slots"])
+def read_parking_slots(limit: int = Query(10, ge=1, le=crud.MAX_PAGE_SIZE), cursor: Optional[str] = None, db: Session = Depends(get_db)):
+    """
+    Slots in id order, one page at a time. Follow next_cursor until it is null,
+    or use /parking-slots/export to fetch everything in one request.
+    """
+    try:
+        slots, next_cursor = crud.get_parking_slots_page(db, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": slots, "next_cursor": next_cursor}
+
+@router.get("/parking-slots/export", tags=["Parking Slots"])
+def export_parking_slots(cursor: Optional[str] = None):
+    """
+    The whole slot inventory as NDJSON, one ParkingSlotResponse object per line, streamed in
+    id order with bounded memory. Pass a cursor from /parking-slots/ to resume after that slot.
+    """
+    # Validate up front: once streaming has started the status code can't change.
+    try:
+        if cursor:
+            crud.decode_slot_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(crud.export_slots_ndjson(cursor), media_type="application/x-ndjson")
 
-@app.post("/get-parking-spots/", response_model=List[schemas.ParkingSlotResponse], tags=["Parking Search & Booking"])
+@router.post("/get-parking-spots/", response_model=List[schemas.ParkingSlotResponse], tags=["Parking Search & Booking"])
 def search_parking_spots_endpoint(search_params: schemas.ParkingSearchRequest, db: Session = Depends(get_db)):
     """
     Search for available parking spots based on vehicle type, location, slot type, and duration.
-    Note: duration is used by the agent to decide, but not directly by this SQL query for availability.
-    The agent should ensure the user wants a slot for a certain duration.
+    The date and duration define the window a slot must be free for; existing bookings
+    overlapping that window exclude the slot.
     """
-    available_slots = crud.find_available_slots(db=db, search_params=search_params)
+    available_slots = crud.search_available_slots(db=db, search_params=search_params)
     if not available_slots:
 
         return []
     return available_slots
 
-@app.post("/book-parking/", response_model=schemas.BookingResponse, tags=["Parking Search & Booking"])
+@router.post("/book-parking/", response_model=schemas.BookingResponse, tags=["Parking Search & Booking"])
 def book_parking_endpoint(booking_request: schemas.BookingCreate, db: Session = Depends(get_db)):
     """
     Book a parking spot.
     Requires slot_id, user_id (can be a session_id), vehicle_number, and duration_hours.
+    An optional date books a future window instead of starting now.
+    Returns 409 if the slot is already booked for an overlapping window.
     """
 
-    booking = crud.create_booking(db=db, booking_data=booking_request)
+    try:
+        booking = crud.create_booking(db=db, booking_data=booking_request)
+    except crud.BookingConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     if not booking:
         raise HTTPException(status_code=400, detail="Failed to book parking spot. Slot might be unavailable or invalid.")
 
@@ -56,34 +114,98 @@ def book_parking_endpoint(booking_request: schemas.BookingCreate, db: Session =
     return booking 
 
 
-@app.get("/bookings/{booking_id}", response_model=schemas.BookingResponse, tags=["Bookings"])
+@router.get("/get-available-locations-for-vehicle/", response_model=schemas.AvailableLocationsResponse, tags=["Parking Search & Booking"])
+def get_available_locations_for_vehicle_endpoint(vehicle_type: str, db: Session = Depends(get_db)):
+    """
+    List locations with slots free right now for a vehicle type, with the number of free slots at each.
+    Served from an in-memory index, so it doesn't touch the database.
+    """
+    free_counts = crud.get_location_free_counts(db, vehicle_type=vehicle_type)
+    return schemas.AvailableLocationsResponse(vehicle_type=vehicle_type, locations=list(free_counts), free_counts=free_counts)
+
+
+@router.get("/bookings/{booking_id}", response_model=schemas.BookingResponse, tags=["Bookings"])
 def read_booking(booking_id: int, db: Session = Depends(get_db)):
     db_booking = crud.get_booking(db, booking_id=booking_id)
     if db_booking is None:
         raise HTTPException(status_code=404, detail="Booking not found")
     return db_booking
 
-@app.get("/user-bookings/{user_id}", response_model=List[schemas.BookingResponse], tags=["Bookings"])
-def read_user_bookings(user_id: str, db: Session = Depends(get_db)):
-    bookings = crud.get_user_bookings(db, user_id=user_id)
-    if not bookings:
-        return []
-    return bookings
-
-
-@app.get("/health")
-def health_check():
-    return {"status": "ok"}
-
-
-
+@router.get("/user-bookings/{user_id}", response_model=schemas.BookingPage, tags=["Bookings"])
+def read_user_bookings(user_id: str, limit: int = Query(50, ge=1, le=crud.MAX_PAGE_SIZE), cursor: Optional[str] = None, db: Session = Depends(get_db)):
+    """
+    A user's bookings, newest first, one page at a time. Follow next_cursor until it is null.
+    """
+    try:
+        bookings, next_cursor = crud.get_user_bookings_page(db, user_id=user_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": bookings, "next_cursor": next_cursor}
 
 
+@app.post("/parking-slots/bulk", response_model=schemas.BulkImportResponse, tags=["Parking Slots"])
+async def bulk_import_parking_slots(request: Request, format: Optional[str] = None, batch_size: int = bulk_import.DEFAULT_BATCH_SIZE):
+    """
+    Bulk-load slots from a CSV (with header row) or NDJSON request body, e.g.
+    curl --data-binary @slots.csv -H 'Content-Type: text/csv' .../parking-slots/bulk
+    The body is streamed and inserted in batches, so memory stays flat for large files.
+    Invalid rows are skipped and reported by line number; valid rows are still inserted.
+    Shared by both API modes; batch inserts run on the threadpool to keep the event loop free.
+    """
+    fmt = format or bulk_import.detect_format(request.headers.get("content-type"))
+    splitter = bulk_import.LineSplitter()
+    parser = bulk_import.RecordParser(fmt)
+    importer = bulk_import.SlotImporter(batch_size=max(1, batch_size))
+
+    async for chunk in request.stream():
+        for line in splitter.feed(chunk):
+            record = parser.parse(line)
+            if record and importer.add(*record):
+                await run_in_threadpool(importer.flush)
+    for line in splitter.finish():
+        record = parser.parse(line)
+        if record:
+            importer.add(*record)
+    await run_in_threadpool(importer.flush)
+    return importer.result()
+
+
+@app.get("/release-scheduler/stats", response_model=schemas.ReleaseSchedulerStats, tags=["Operations"])
+def release_scheduler_stats():
+    """
+    State of the background job that frees slots when their booking ends: how many releases are
+    pending, and how far behind the bookings' end times releases have been happening (lag).
+    """
+    return release_scheduler.stats()
 
 
+@app.get("/search-cache/stats", response_model=schemas.SearchCacheStats, tags=["Operations"])
+def search_cache_stats():
+    """
+    Hit/miss counts of the /get-parking-spots/ result cache, and how many entries bookings, new
+    slots and releases have invalidated.
+    """
+    return search_cache.stats()
 
 
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Operations"])
+def metrics():
+    """
+    Prometheus text format: request latency histograms per route, booking results, slots free
+    per location, and latency of every traced operation (crud functions, the search cache,
+    and, when the agent runs in this process, its tool, LLM, embedding and Milvus calls).
+    """
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
 
 
+@app.get("/health")
+def health_check():
+    return {"status": "ok"}
 
 
+if database.API_MODE == "async":
+    from .async_api import router as async_router
+    app.include_router(async_router)
+    logger.info("Serving endpoints with async handlers (PARKING_API_MODE=async).")
+else:
+    app.include_router(router)
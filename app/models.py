@@ -1,11 +1,19 @@
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Computed, Integer, String, Float, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .database import Base 
 import datetime 
 
+def normalize_key(value):
+    """Python twin of the lower(trim(...)) expression behind the *_key columns."""
+    return (value or "").strip().lower()
+
+
 class ParkingSlot(Base): 
     __tablename__ = "parking_slots"
+    __table_args__ = (
+        Index("ix_parking_slots_lookup", "vehicle_type_key", "slot_type_key", "location_key"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     location = Column(String, index=True)
@@ -14,17 +22,28 @@ class ParkingSlot(Base):
     is_available = Column(Boolean, default=True)
     price_per_hour = Column(Float)
 
+    # Case-normalized lookup columns, computed by SQLite so every insert path (ORM, bulk, raw SQL) fills them.
+    location_key = Column(String, Computed("lower(trim(location))", persisted=False))
+    slot_type_key = Column(String, Computed("lower(trim(slot_type))", persisted=False))
+    vehicle_type_key = Column(String, Computed("lower(trim(vehicle_type))", persisted=False))
+
     bookings = relationship("Booking", back_populates="slot")
 
 class Booking(Base): 
     __tablename__ = "bookings"
+    __table_args__ = (
+        # Serves the overlap check in crud.create_booking: a slot's bookings that end after a given time.
+        Index("ix_bookings_slot_id_end_time", "slot_id", "end_time"),
+        # Keyset pagination of /user-bookings/: WHERE user_id = ? ORDER BY start_time DESC, id DESC.
+        Index("ix_bookings_user_id_start_time", "user_id", "start_time", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     slot_id = Column(Integer, ForeignKey("parking_slots.id"))
     user_id = Column(String, index=True)
     vehicle_number = Column(String)
     start_time = Column(DateTime, default=datetime.datetime.utcnow)
-    end_time = Column(DateTime)
+    end_time = Column(DateTime, index=True)
     duration_hours = Column(Integer)
     total_cost = Column(Float)
     is_confirmed = Column(Boolean, default=False)
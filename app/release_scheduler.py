@@ -0,0 +1,268 @@
+import datetime
+import heapq
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import exists, update
+from sqlalchemy.orm import Session
+
+from . import database, models
+from .availability import availability_index, location_index
+from .search_cache import search_cache
+from observability.logs import get_logger
+
+logger = get_logger(__name__)
+
+# Slot ids per UPDATE; keeps each statement well under SQLite's bound-parameter limit.
+RELEASE_BATCH_SIZE = 500
+# The worker waits this long past the earliest end time before releasing, so bookings ending close
+# together go out in one UPDATE instead of one each. It is also the target worst-case release lag.
+COALESCE_SECONDS = 1.0
+# Longest the worker sleeps when nothing is due; it is woken early for earlier end times and on stop.
+MAX_IDLE_SECONDS = 60.0
+# Back-off after a failed release before trying again (e.g. the database stayed locked past its busy timeout).
+RETRY_SECONDS = 1.0
+# How often ended windows are dropped from the in-memory availability index.
+PRUNE_INTERVAL_SECONDS = 300.0
+# Heap event kinds. Releases sort first at the same instant, so when one booking ends as the next
+# begins the release sees the new booking and keeps the slot taken.
+RELEASE, TAKE = 0, 1
+
+# (due at, kind, slot id, booking end): a TAKE is due at the booking's start and queues the
+# RELEASE for its end; a RELEASE is due at the end.
+Event = Tuple[datetime.datetime, int, int, datetime.datetime]
+
+
+def release_slots_statement(now: datetime.datetime, slot_ids: Optional[Iterable[int]] = None):
+    """
+    UPDATE flipping is_available back to True for slots whose occupying booking has ended.
+    A slot is only released if no booking covers 'now', so back-to-back bookings keep it taken.
+    Without slot_ids it sweeps every taken slot that has at least one ended booking (startup
+    catch-up); slots switched off by hand with no bookings are left alone either way.
+    RETURNING gives the rows actually flipped, for the location index.
+    """
+    Slot, Booking = models.ParkingSlot, models.Booking
+    occupied = exists().where(Booking.slot_id == Slot.id, Booking.start_time <= now, Booking.end_time > now)
+    statement = update(Slot).where(Slot.is_available == False, ~occupied)
+    if slot_ids is None:
+        statement = statement.where(exists().where(Booking.slot_id == Slot.id, Booking.end_time <= now))
+    else:
+        statement = statement.where(Slot.id.in_(list(slot_ids)))
+    return statement.values(is_available=True).returning(Slot.id, Slot.vehicle_type, Slot.location)
+
+
+def take_slots_statement(now: datetime.datetime, slot_ids: Optional[Iterable[int]] = None):
+    """
+    UPDATE flipping is_available to False for free slots that a booking covers at 'now', i.e.
+    future-dated bookings whose window has opened. Without slot_ids it sweeps every free slot
+    (startup catch-up for bookings that started while the API was down). RETURNING gives the
+    rows actually flipped, for the location index.
+    """
+    Slot, Booking = models.ParkingSlot, models.Booking
+    occupied = exists().where(Booking.slot_id == Slot.id, Booking.start_time <= now, Booking.end_time > now)
+    statement = update(Slot).where(Slot.is_available == True, occupied)
+    if slot_ids is not None:
+        statement = statement.where(Slot.id.in_(list(slot_ids)))
+    return statement.values(is_available=False).returning(Slot.id, Slot.vehicle_type, Slot.location)
+
+
+class SlotReleaseScheduler:
+    """
+    Background thread that keeps ParkingSlot.is_available (and the location index) in step with
+    bookings: it marks a slot taken when a future-dated booking's window opens and sets it back
+    to True when the booking holding it ends. Keeps a min-heap of events (see Event), loaded from
+    the bookings table at startup and pushed to by crud.record_booking. Everything due is popped
+    per wake-up and applied with one UPDATE per RELEASE_BATCH_SIZE slots, so a burst of
+    expirations costs a handful of statements rather than one per booking.
+    """
+
+    def __init__(self, batch_size: int = RELEASE_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._heap: List[Event] = []
+        self._wakeup = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._last_prune = 0.0
+        self.released_total = 0
+        self.taken_total = 0
+        self.batches_total = 0
+        self.errors_total = 0
+        self.last_run_at: Optional[datetime.datetime] = None
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+        self._lag_seconds_sum = 0.0
+        self._lag_count = 0
+
+    def __len__(self) -> int:
+        with self._wakeup:
+            return len(self._heap)
+
+    def schedule(self, slot_id: int, end_time: datetime.datetime):
+        """Releases the slot at end_time, for a booking holding it now."""
+        self._push((end_time, RELEASE, slot_id, end_time))
+
+    def schedule_start(self, slot_id: int, start_time: datetime.datetime, end_time: datetime.datetime):
+        """Marks the slot taken at start_time and releases it at end_time, for a future-dated booking."""
+        self._push((start_time, TAKE, slot_id, end_time))
+
+    def _push(self, event: Event):
+        with self._wakeup:
+            heapq.heappush(self._heap, event)
+            if self._heap[0] == event:
+                self._wakeup.notify()
+
+    def rebuild(self, db: Session, now: Optional[datetime.datetime] = None) -> int:
+        """
+        Catches up on what happened while the API was down (releases slots whose bookings ended,
+        takes slots whose bookings started), then reloads the heap: a release for every booking
+        in progress and a take for every booking that hasn't started.
+        """
+        now = now or datetime.datetime.utcnow()
+        released = db.execute(release_slots_statement(now), execution_options={"synchronize_session": False}).all()
+        taken = db.execute(take_slots_statement(now), execution_options={"synchronize_session": False}).all()
+        db.commit()
+        search_cache.invalidate_many((vehicle_type, location) for _, vehicle_type, location in released + taken)
+        rows = (
+            db.query(models.Booking.start_time, models.Booking.end_time, models.Booking.slot_id)
+            .filter(models.Booking.end_time > now)
+            .all()
+        )
+        events = [(end, RELEASE, slot_id, end) if start <= now else (start, TAKE, slot_id, end) for start, end, slot_id in rows]
+        with self._wakeup:
+            self._heap = events
+            heapq.heapify(self._heap)
+            self._wakeup.notify()
+        starts = sum(1 for event in events if event[1] == TAKE)
+        logger.info("Released %d and took %d slot(s) for bookings that ended or started while the API was down; "
+                    "tracking %d booking(s) in progress and %d upcoming.", len(released), len(taken), len(events) - starts, starts)
+        return len(events)
+
+    def release_due(self, now: Optional[datetime.datetime] = None) -> int:
+        """
+        Pops every event due by 'now', releases the slots of ended bookings and takes those of
+        bookings that started (queueing their releases), in batches. Returns how many slots were flipped.
+        """
+        now = now or datetime.datetime.utcnow()
+        due: List[Event] = []
+        with self._wakeup:
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap))
+        if not due:
+            return 0
+
+        releases = [event for event in due if event[1] == RELEASE]
+        takes = [event for event in due if event[1] == TAKE]
+        released, _ = self._apply(releases, lambda batch: release_slots_statement(now, batch), location_index.slot_freed)
+        taken, applied = self._apply(takes, lambda batch: take_slots_statement(now, batch), location_index.slot_taken)
+        # Queued even when the slot was already taken (back-to-back bookings), or nothing would free it at this end.
+        for _, _, slot_id, end_time in applied:
+            self.schedule(slot_id, end_time)
+
+        lags = [(now - due_at).total_seconds() for due_at, _, _, _ in due]
+        self.released_total += released
+        self.taken_total += taken
+        self.last_run_at = now
+        self.last_lag_seconds = max(lags)
+        self.max_lag_seconds = max(self.max_lag_seconds, self.last_lag_seconds)
+        self._lag_seconds_sum += sum(lags)
+        self._lag_count += len(lags)
+        logger.debug("Released %d and took %d of %d due slot(s), lag up to %.2fs.", released, taken, len(due), self.last_lag_seconds)
+        return released + taken
+
+    def _apply(self, events: List[Event], statement_for, on_flipped) -> Tuple[int, List[Event]]:
+        """
+        Runs statement_for(slot ids) per batch of events and calls on_flipped(vehicle_type, location)
+        for each slot it flipped. A failed batch and everything after it go back on the heap for
+        the next wake-up. Returns the slots flipped and the events whose batch committed.
+        """
+        slot_ids = list(dict.fromkeys(slot_id for _, _, slot_id, _ in events))
+        flipped, done = 0, set()
+        for offset in range(0, len(slot_ids), self.batch_size):
+            batch = slot_ids[offset:offset + self.batch_size]
+            try:
+                with database.engine.begin() as conn:
+                    rows = conn.execute(statement_for(batch)).all()
+            except Exception as e:
+                # Put the rest back and retry on the next wake-up rather than losing them.
+                self.errors_total += 1
+                with self._wakeup:
+                    for event in events:
+                        if event[2] not in done:
+                            heapq.heappush(self._heap, event)
+                logger.error("Error updating %d slot(s), will retry: %s", len(slot_ids) - offset, e)
+                break
+            for _, vehicle_type, location in rows:
+                on_flipped(vehicle_type, location)
+            search_cache.invalidate_many((vehicle_type, location) for _, vehicle_type, location in rows)
+            flipped += len(rows)
+            done.update(batch)
+            self.batches_total += 1
+        return flipped, [event for event in events if event[2] in done]
+
+    def stats(self, now: Optional[datetime.datetime] = None) -> Dict[str, object]:
+        now = now or datetime.datetime.utcnow()
+        with self._wakeup:
+            pending = len(self._heap)
+            next_due = self._heap[0][0] if self._heap else None
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "pending": pending,
+            "next_release_at": next_due,
+            "overdue_seconds": max(0.0, (now - next_due).total_seconds()) if next_due else 0.0,
+            "released_total": self.released_total,
+            "taken_total": self.taken_total,
+            "batches_total": self.batches_total,
+            "errors_total": self.errors_total,
+            "last_run_at": self.last_run_at,
+            "last_lag_seconds": self.last_lag_seconds,
+            "max_lag_seconds": self.max_lag_seconds,
+            "mean_lag_seconds": self._lag_seconds_sum / self._lag_count if self._lag_count else 0.0,
+        }
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="slot-release-scheduler", daemon=True)
+        self._thread.start()
+        logger.info("Scheduler started.")
+
+    def stop(self, timeout: float = 5.0):
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        logger.info("Scheduler stopped.")
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                if self._stopping:
+                    return
+                if self._heap:
+                    wait = (self._heap[0][0] - datetime.datetime.utcnow()).total_seconds() + COALESCE_SECONDS
+                else:
+                    wait = MAX_IDLE_SECONDS
+                if wait > 0:
+                    self._wakeup.wait(min(wait, MAX_IDLE_SECONDS))
+                if self._stopping:
+                    return
+            errors_before = self.errors_total
+            try:
+                self.release_due()
+            except Exception as e:
+                self.errors_total += 1
+                logger.exception("Error in scheduler loop: %s", e)
+            if self.errors_total != errors_before:
+                with self._wakeup:
+                    if not self._stopping:
+                        self._wakeup.wait(RETRY_SECONDS)
+            if time.monotonic() - self._last_prune >= PRUNE_INTERVAL_SECONDS:
+                self._last_prune = time.monotonic()
+                availability_index.prune(datetime.datetime.utcnow())
+
+
+release_scheduler = SlotReleaseScheduler()
@@ -1,7 +1,7 @@
 
 
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 import datetime
 
 class ParkingSlotBase(BaseModel):
@@ -25,12 +25,17 @@ class ParkingSlotResponse(BaseModel):
     class Config:
         orm_mode = True
 
+class ParkingSlotPage(BaseModel):
+    items: List[ParkingSlotResponse]
+    next_cursor: Optional[str] = Field(None, description="Pass as ?cursor= to get the next page; null on the last page.")
+
 class BookingBase(BaseModel):
     slot_id: int
     user_id: str
     vehicle_number: str
 
     duration_hours: int
+    date: Optional[str] = Field(None, description="Day the booking starts (e.g., YYYY-MM-DD, 'today', 'tomorrow'). Defaults to now.")
 
 class BookingCreate(BookingBase):
 
@@ -51,6 +56,10 @@ class BookingResponse(BaseModel):
     class Config:
         orm_mode = True
 
+class BookingPage(BaseModel):
+    items: List[BookingResponse]
+    next_cursor: Optional[str] = Field(None, description="Pass as ?cursor= to get the next page; null on the last page.")
+
 class ParkingSearchRequest(BaseModel):
     vehicle_type: str
     location: str
@@ -59,4 +68,40 @@ class ParkingSearchRequest(BaseModel):
     duration_hours: int
 
 class AvailableLocationsResponse(BaseModel):
-    locations: List[str]
\ No newline at end of file
+    vehicle_type: str
+    locations: List[str]
+    free_counts: Dict[str, int] = Field(default_factory=dict, description="Slots free right now, per location. Locations are ordered most free first.")
+
+class BulkImportError(BaseModel):
+    line: int
+    error: str
+
+class BulkImportResponse(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[BulkImportError] = Field(default_factory=list, description="Per-row errors by input line number (capped at the first 1000).")
+
+class ReleaseSchedulerStats(BaseModel):
+    running: bool
+    pending: int = Field(..., description="Scheduled slot updates: releases for bookings in progress, and takes for bookings that haven't started.")
+    next_release_at: Optional[datetime.datetime] = Field(None, description="When the next pending release or take is due.")
+    overdue_seconds: float = Field(..., description="How far past its due time the next pending update is; >0 means the scheduler is behind.")
+    released_total: int
+    taken_total: int = Field(..., description="Slots marked taken when a future-dated booking's window opened.")
+    batches_total: int
+    errors_total: int
+    last_run_at: Optional[datetime.datetime] = None
+    last_lag_seconds: float = Field(..., description="Worst delay between a booking's end (or start) and its slot's release (or take) in the last run.")
+    max_lag_seconds: float
+    mean_lag_seconds: float
+
+class SearchCacheStats(BaseModel):
+    enabled: bool
+    entries: int
+    hits: int
+    misses: int
+    hit_rate: float
+    invalidations: int = Field(..., description="Bookings, new slots and releases that touched a (vehicle_type, location) bucket.")
+    invalidated_entries: int = Field(..., description="Cached searches dropped by those invalidations.")
+    expired: int
+    evictions: int
@@ -0,0 +1,150 @@
+import collections
+import datetime
+import os
+import threading
+import time
+from typing import Dict, Hashable, Optional, Set, Tuple
+
+from . import models
+
+# Seconds a search result is served from memory. Bookings, new slots and releases drop the
+# affected entries straight away; the TTL only bounds drift that no event reports, e.g. a
+# future booking's window being reached for searches that start "now". 0 turns the cache off.
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL", "30"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+
+SearchKey = Tuple[str, str, str, Hashable]
+
+
+def search_key(search_params, start_time: datetime.datetime, end_time: datetime.datetime, now: datetime.datetime) -> SearchKey:
+    """
+    (vehicle type, location, slot type, window), normalized like the *_key columns, so "Car" and
+    " car" share an entry. Windows starting now are keyed on the duration alone: the start moves
+    with the clock, and the TTL keeps those entries fresh. Future windows are keyed on the
+    resolved [start, end), so "tomorrow" and the matching YYYY-MM-DD share an entry too.
+    """
+    window = ("now", search_params.duration_hours) if start_time <= now else (start_time, end_time)
+    return (
+        models.normalize_key(search_params.vehicle_type),
+        models.normalize_key(search_params.location),
+        models.normalize_key(search_params.slot_type),
+        window,
+    )
+
+
+class SearchResultCache:
+    """
+    LRU of /get-parking-spots/ results with a TTL. Entries are also indexed by vehicle type and
+    searched location, so invalidate(vehicle_type, location) for a slot drops exactly the cached
+    searches that could include it. A search matches a slot when its location is a substring of
+    the slot's location (see crud._location_matches), so "zone" and "zone 03" are both dropped for
+    a slot at "Zone 03" but "zone 04" is kept.
+
+    A search that was running while its bucket was invalidated must not store its (possibly
+    stale) result: callers take generation() before querying and pass it to put(), which skips
+    the store if the vehicle type has been invalidated since.
+    """
+
+    def __init__(self, ttl_seconds: float = SEARCH_CACHE_TTL_SECONDS, max_entries: int = SEARCH_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "collections.OrderedDict[SearchKey, Tuple[float, list]]" = collections.OrderedDict()
+        # vehicle type key -> searched location key -> cache keys
+        self._buckets: Dict[str, Dict[str, Set[SearchKey]]] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.invalidated_entries = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def generation(self, vehicle_type: str) -> int:
+        with self._lock:
+            return self._generations.get(models.normalize_key(vehicle_type), 0)
+
+    def get(self, key: SearchKey) -> Optional[list]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._drop(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: SearchKey, results: list, generation: int):
+        if not self.enabled:
+            return
+        vehicle_type, location = key[0], key[1]
+        with self._lock:
+            if self._generations.get(vehicle_type, 0) != generation:
+                return
+            self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, results)
+            self._buckets.setdefault(vehicle_type, {}).setdefault(location, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, vehicle_type: str, location: str) -> int:
+        """Drops the cached searches a slot of this vehicle type at this location could appear in."""
+        vehicle_key, slot_location = models.normalize_key(vehicle_type), models.normalize_key(location)
+        with self._lock:
+            self._generations[vehicle_key] = self._generations.get(vehicle_key, 0) + 1
+            self.invalidations += 1
+            by_location = self._buckets.get(vehicle_key, {})
+            stale = [key for searched, keys in by_location.items() if searched in slot_location for key in keys]
+            for key in stale:
+                self._drop(key)
+            self.invalidated_entries += len(stale)
+        return len(stale)
+
+    def invalidate_many(self, buckets) -> int:
+        """invalidate() for each distinct (vehicle_type, location) pair."""
+        return sum(self.invalidate(vehicle_type, location) for vehicle_type, location in set(buckets))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            for vehicle_key in self._generations:
+                self._generations[vehicle_key] += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "invalidated_entries": self.invalidated_entries,
+                "expired": self.expired,
+                "evictions": self.evictions,
+            }
+
+    def _drop(self, key: SearchKey):
+        # Caller holds the lock.
+        if self._entries.pop(key, None) is None:
+            return
+        by_location = self._buckets.get(key[0])
+        keys = by_location.get(key[1]) if by_location else None
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del by_location[key[1]]
+
+
+search_cache = SearchResultCache()
@@ -0,0 +1,359 @@
+"""
+Where an agent turn's time goes when the LLM and the embeddings aren't the bottleneck: ParkingAgent
+against a scripted fake chat model and a deterministic fake embedder, both with set latencies.
+
+    python -m benchmarks.agent_offline --sessions 20 --llm-ms 400 --token-ms 10 --embed-ms 40 --mode sync
+
+Needs the agent's dependencies (requirements.txt, incl. langchain-classic) but no network and no OpenAI key.
+Seeds a scratch database, serves the tools through the in-process transport and keeps history
+in a temp NumPy store. Each session replays a recorded conversation; the default one is
+  "I need parking for my suv at Zone 07 on 2026-11-02 for 3 hours"    LLM: search, then answer
+  "Slot 42 looks good, please reserve it for KA01AB1234, same 3 hours on 2026-11-02"
+                                                                      LLM: book, then answer
+  "show my bookings"                                                  fast path
+where the slot is the first one the previous reply listed, as a user would pick it.
+--conversations replays a JSONL file instead, one JSON list of user messages per line, with
+{vehicle_type}, {location}, {hours}, {date}, {plate} and {slot_id} filled in the same way.
+
+The fake model answers from the messages it gets, so sessions can run concurrently: a search
+request becomes a SearchParkingSpots call, a "slot N ... plate" message a BookParkingSpot call,
+a tool result the reply the system prompt asks for, anything else a clarifying question. Each
+call sleeps --llm-ms plus --token-ms per output token (streamed token by token in --mode
+stream); each embedding call sleeps --embed-ms. The sleeps are logged with the time they
+started, so for every turn they are split out of the stage they fell in (history, agent, store,
+from ParkingAgent.last_turn_timings) and the rest of each stage is our own code: prompt
+building, history loading and packing, tool dispatch, the API and database, parsing the reply.
+
+Reports per stage p50/p95 of the own-code time, the injected wait, turns/sec and (from the
+span histograms) the mean time per turn in each kind of traced operation. --output writes the
+JSON report. --concurrency runs that many sessions at once (async and stream modes).
+"""
+import argparse
+import asyncio
+import contextvars
+import datetime
+import json
+import os
+import random
+import re
+import tempfile
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from .api_modes import LOCATIONS, seed
+from .common import format_stats, percentiles, quiet_logs, use_scratch_database
+from .prompt_tokens import listing_reply
+
+DEFAULT_CONVERSATION = [
+    "I need parking for my {vehicle_type} at {location} on {date} for {hours} hours",
+    "Slot {slot_id} looks good, please reserve it for {plate}, same {hours} hours on {date}",
+    "show my bookings",
+]
+VEHICLE_TYPES = ("car", "suv", "two-wheeler")
+STAGES = ("fast_path", "history", "agent", "store")
+
+SEARCH_REQUEST = re.compile(r"\b(car|suv|two-wheeler)\b.*?\bat\s+(.+?)\s+(?:on\s+)?(today|tomorrow|\d{4}-\d{2}-\d{2})\s+for\s+(\d+)\s+hours?", re.I)
+SLOT_CHOICE = re.compile(r"\bslot\s+(\d+)\b.*?\bfor\s+([A-Z]{2}\d{2}[A-Z]{1,2}\d{4})\b.*?(\d+)\s+hours?\s+(?:on\s+)?(today|tomorrow|\d{4}-\d{2}-\d{2})", re.I)
+LISTED_SLOT = re.compile(r"Slot ID: (\d+)")
+SESSION_ID = re.compile(r"\b(offline-\d+)\b")
+
+# The injected waits of the turn running in this context: (kind, started, seconds).
+_waits: "contextvars.ContextVar[Optional[list]]" = contextvars.ContextVar("offline_bench_waits", default=None)
+
+
+def _record_wait(kind: str, started: float, seconds: float):
+    waits = _waits.get()
+    if waits is not None:
+        waits.append((kind, started, seconds))
+
+
+def build_fakes(args):
+    """The scripted chat model class and the slow embedder; imported late so the scratch env is set first."""
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage, AIMessageChunk, FunctionMessage, HumanMessage, SystemMessage
+    from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+    from milvus_utils.embedding_providers import HashingEmbeddingProvider
+
+    class ScriptedChatModel(BaseChatModel):
+        """Answers like the agent's LLM would for the recorded conversations, after first_token_ms + token_ms per token."""
+
+        first_token_ms: float = 0.0
+        token_ms: float = 0.0
+
+        @property
+        def _llm_type(self) -> str:
+            return "scripted-fake"
+
+        @property
+        def _identifying_params(self) -> Dict[str, Any]:
+            return {"model": "scripted-fake"}
+
+        def _reply(self, messages) -> AIMessage:
+            system = next((m.content for m in messages if isinstance(m, SystemMessage)), "")
+            last_human = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+            user_input = messages[last_human].content
+            results = [m for m in messages[last_human + 1:] if isinstance(m, FunctionMessage)]
+            if results:
+                calls = [m for m in messages[last_human + 1:] if isinstance(m, AIMessage) and "function_call" in m.additional_kwargs]
+                call = json.loads(calls[-1].additional_kwargs["function_call"]["arguments"]) if calls else {}
+                output = results[-1].content
+                if results[-1].name == "SearchParkingSpots":
+                    slots = json.loads(output[output.index("["):]) if "[" in output else []
+                    if not slots:
+                        return AIMessage(content=f"Sorry, there are no free {call.get('vehicle_type')} slots at {call.get('location')} then.")
+                    return AIMessage(content=listing_reply(call["vehicle_type"], call["location"], call.get("date") or "today",
+                                                           call["duration_hours"], slots[:5]))
+                return AIMessage(content=output)
+            search = SEARCH_REQUEST.search(user_input)
+            if search:
+                return self._call("SearchParkingSpots", {"vehicle_type": search.group(1).lower(), "location": search.group(2),
+                                                         "date": search.group(3), "duration_hours": int(search.group(4))})
+            choice = SLOT_CHOICE.search(user_input)
+            session = SESSION_ID.search(system)
+            if choice and session:
+                return self._call("BookParkingSpot", {"slot_id": int(choice.group(1)), "user_id": session.group(1),
+                                                      "vehicle_number": choice.group(2), "duration_hours": int(choice.group(3)),
+                                                      "date": choice.group(4)})
+            return AIMessage(content="Could you tell me your vehicle type, the location, the date and how many hours you need?")
+
+        @staticmethod
+        def _call(name: str, arguments: dict) -> AIMessage:
+            return AIMessage(content="", additional_kwargs={"function_call": {"name": name, "arguments": json.dumps(arguments)}})
+
+        @staticmethod
+        def _tokens(message: AIMessage) -> List[str]:
+            if message.content:
+                return re.findall(r"\S+\s*", message.content)
+            return [message.additional_kwargs["function_call"]["arguments"]]
+
+        def _latency(self, tokens: int) -> float:
+            return (self.first_token_ms + self.token_ms * tokens) / 1000
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+            message = self._reply(messages)
+            wait, started = self._latency(len(self._tokens(message))), time.perf_counter()
+            time.sleep(wait)
+            _record_wait("llm", started, wait)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+            message = self._reply(messages)
+            wait, started = self._latency(len(self._tokens(message))), time.perf_counter()
+            await asyncio.sleep(wait)
+            _record_wait("llm", started, wait)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        def _chunks(self, message: AIMessage) -> Iterator[AIMessageChunk]:
+            if not message.content:
+                yield AIMessageChunk(content="", additional_kwargs=message.additional_kwargs)
+                return
+            for token in self._tokens(message):
+                yield AIMessageChunk(content=token)
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+            delay = self.first_token_ms / 1000
+            for chunk in self._chunks(self._reply(messages)):
+                started = time.perf_counter()
+                time.sleep(delay)
+                _record_wait("llm", started, delay)
+                delay = self.token_ms / 1000
+                if run_manager and chunk.content:
+                    run_manager.on_llm_new_token(chunk.content)
+                yield ChatGenerationChunk(message=chunk)
+
+        async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+            delay = self.first_token_ms / 1000
+            for chunk in self._chunks(self._reply(messages)):
+                started = time.perf_counter()
+                await asyncio.sleep(delay)
+                _record_wait("llm", started, delay)
+                delay = self.token_ms / 1000
+                if run_manager and chunk.content:
+                    await run_manager.on_llm_new_token(chunk.content)
+                yield ChatGenerationChunk(message=chunk)
+
+    class SlowHashingProvider(HashingEmbeddingProvider):
+        """The local hashing encoder, plus a fixed sleep per call standing in for the embeddings API."""
+
+        name = "offline-bench-hashing"
+
+        def __init__(self, latency_ms: float):
+            super().__init__()
+            self.latency = latency_ms / 1000
+
+        def embed_documents(self, texts: List[str]) -> List[List[float]]:
+            started = time.perf_counter()
+            time.sleep(self.latency)
+            _record_wait("embedding", started, self.latency)
+            return super().embed_documents(texts)
+
+    return ScriptedChatModel(first_token_ms=args.llm_ms, token_ms=args.token_ms), SlowHashingProvider(args.embed_ms)
+
+
+def load_conversations(path: Optional[str]) -> List[List[str]]:
+    if not path:
+        return [DEFAULT_CONVERSATION]
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def split_waits(timings: Dict[str, float], waits: list, turn_started: float) -> Dict[str, Dict[str, float]]:
+    """Per stage: its wall time, the injected waits that started inside it, and the difference (our code)."""
+    split, boundary = {}, turn_started
+    for stage in STAGES:
+        if stage not in timings:
+            continue
+        end = boundary + timings[stage]
+        waited = sum(seconds for _, started, seconds in waits if boundary <= started < end)
+        split[stage] = {"wall": timings[stage], "waited": min(waited, timings[stage]), "own": max(timings[stage] - waited, 0.0)}
+        boundary = end
+    return split
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--llm-ms", type=float, default=400, help="Injected latency per LLM call (time to first token)")
+    parser.add_argument("--token-ms", type=float, default=10, help="Injected latency per output token")
+    parser.add_argument("--embed-ms", type=float, default=40, help="Injected latency per embedding call")
+    parser.add_argument("--mode", default="sync", choices=("sync", "async", "stream"),
+                        help="invoke_agent, ainvoke_agent or astream_agent")
+    parser.add_argument("--concurrency", type=int, default=1, help="Sessions replayed at once (async and stream modes)")
+    parser.add_argument("--conversations", default=None, help="JSONL of recorded conversations (lists of user messages)")
+    parser.add_argument("--slots", type=int, default=2000)
+    parser.add_argument("--output", default=None, help="Also write the JSON report here")
+    parser.add_argument("--db", default=None, help="Scratch database path (default: a temp file)")
+    args = parser.parse_args()
+    if args.mode == "sync" and args.concurrency != 1:
+        parser.error("--concurrency needs --mode async or stream")
+
+    root = tempfile.mkdtemp(prefix="agent_offline_bench_")
+    os.environ.setdefault("OPENAI_API_KEY", "unused-by-this-benchmark")
+    os.environ["AGENT_API_TRANSPORT"] = "inprocess"
+    os.environ["VECTOR_STORE_PATH"] = os.path.join(root, "vector_store")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(root, "embedding_cache")
+    use_scratch_database(args.db)
+    seed(args.slots, 200)
+
+    from agent.parking_agent import AgentRuntime, ParkingAgent
+    from milvus_utils.vector_store import NumpyVectorStore
+    from observability.metrics import SPAN_DURATION
+
+    quiet_logs()
+    llm, provider = build_fakes(args)
+    runtime = AgentRuntime(llm=llm, history_store=NumpyVectorStore(provider=provider, path=os.environ["VECTOR_STORE_PATH"]))
+    conversations = load_conversations(args.conversations)
+    turns: List[dict] = []
+
+    def fill(template: str, session: dict, previous_reply: str) -> str:
+        listed = LISTED_SLOT.search(previous_reply or "")
+        return template.format(slot_id=listed.group(1) if listed else "1", **session)
+
+    def new_session(n: int):
+        rng = random.Random(n)
+        session = {"vehicle_type": rng.choice(VEHICLE_TYPES), "location": LOCATIONS[n % len(LOCATIONS)], "hours": rng.randint(1, 4),
+                   "date": (datetime.date.today() + datetime.timedelta(days=rng.randint(2, 60))).isoformat(),
+                   "plate": f"KA{rng.randint(10, 99)}AB{rng.randint(1000, 9999)}"}
+        return ParkingAgent(f"offline-{n:04d}", runtime=runtime), session, conversations[n % len(conversations)]
+
+    def record(agent, user_input: str, reply: str, waits: list, turn_started: float):
+        timings = agent.last_turn_timings
+        turns.append({"input": user_input, "path": "fast_path" if "fast_path" in timings else "llm", "total": timings["total"],
+                      "first_token": timings.get("first_token"), "llm_calls": agent.last_turn_tokens.get("llm_calls", 0),
+                      "stages": split_waits(timings, waits, turn_started), "reply": reply})
+
+    def replay_sync(n: int):
+        agent, session, script = new_session(n)
+        reply = ""
+        for template in script:
+            user_input, waits = fill(template, session, reply), []
+            token = _waits.set(waits)
+            turn_started = time.perf_counter()
+            try:
+                reply = agent.invoke_agent(user_input)
+            finally:
+                _waits.reset(token)
+            record(agent, user_input, reply, waits, turn_started)
+
+    async def replay_async(n: int):
+        agent, session, script = new_session(n)
+        reply = ""
+        for template in script:
+            user_input, waits = fill(template, session, reply), []
+            _waits.set(waits)
+            turn_started = time.perf_counter()
+            if args.mode == "stream":
+                reply = "".join([token async for token in agent.astream_agent(user_input)])
+            else:
+                reply = await agent.ainvoke_agent(user_input)
+            _waits.set(None)
+            record(agent, user_input, reply, waits, turn_started)
+
+    async def run_async():
+        pending = iter(range(args.sessions))
+
+        async def worker():
+            for n in pending:
+                # Each session in its own task, so its waits land in its own context.
+                await asyncio.create_task(replay_async(n))
+
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+    spans_before = {values[0]: series.sum for values, series in list(SPAN_DURATION._series.items())}
+    started = time.perf_counter()
+    if args.mode == "sync":
+        for n in range(args.sessions):
+            replay_sync(n)
+    else:
+        asyncio.run(run_async())
+    elapsed = time.perf_counter() - started
+    runtime.milvus_service.flush_pending()
+    span_seconds = {values[0]: series.sum - spans_before.get(values[0], 0.0) for values, series in list(SPAN_DURATION._series.items())}
+
+    llm_turns = [t for t in turns if t["path"] == "llm"]
+    report = {
+        "parameters": {key: getattr(args, key) for key in ("sessions", "llm_ms", "token_ms", "embed_ms", "mode", "concurrency", "slots")},
+        "turns": len(turns),
+        "llm_turns": len(llm_turns),
+        "fast_path_turns": len(turns) - len(llm_turns),
+        "elapsed_s": round(elapsed, 3),
+        "turns_per_sec": round(len(turns) / elapsed, 2),
+        "llm_calls_per_llm_turn": round(sum(t["llm_calls"] for t in llm_turns) / max(len(llm_turns), 1), 2),
+        "total": percentiles([t["total"] for t in turns]),
+        "own_code": percentiles([sum(s["own"] for s in t["stages"].values()) for t in turns]),
+        "stages": {},
+        "span_ms_per_turn": {name: round(seconds * 1000 / max(len(turns), 1), 3)
+                             for name, seconds in sorted(span_seconds.items()) if seconds > 0},
+    }
+    if args.mode == "stream":
+        report["first_token"] = percentiles([t["first_token"] for t in turns if t["first_token"] is not None])
+
+    print(f"{len(turns)} turns ({len(llm_turns)} through the LLM) in {elapsed:.2f}s: {report['turns_per_sec']} turns/sec, "
+          f"{report['llm_calls_per_llm_turn']} LLM calls per LLM turn")
+    print(format_stats("turn, wall", report["total"]))
+    print(format_stats("turn, own code (wall - injected waits)", report["own_code"]))
+    for path, path_turns in (("llm", llm_turns), ("fast_path", [t for t in turns if t["path"] == "fast_path"])):
+        for stage in STAGES:
+            rows = [t["stages"][stage] for t in path_turns if stage in t["stages"]]
+            if not rows:
+                continue
+            own, waited = percentiles([r["own"] for r in rows]), percentiles([r["waited"] for r in rows])
+            report["stages"][f"{path}.{stage}"] = {"own": own, "waited": waited}
+            print(format_stats(f"{path:<9} {stage:<9} own", own) + f"  (+{waited['mean_ms']:.1f}ms injected wait on average)")
+    if "first_token" in report:
+        print(format_stats("first token", report["first_token"]))
+    print("mean per turn in traced operations: " + ", ".join(f"{name} {ms:.2f}ms" for name, ms in report["span_ms_per_turn"].items()))
+
+    stuck = [t["input"] for t in llm_turns if t["llm_calls"] < 2]
+    if stuck:
+        print(f"BENCH: warning: {len(stuck)} LLM turn(s) made no tool call, e.g. {stuck[0]!r}; the script may not match --conversations")
+    if args.output:
+        for t in turns:
+            t.pop("reply", None)
+        with open(args.output, "w") as f:
+            json.dump({**report, "turn_details": turns}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
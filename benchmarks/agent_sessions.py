@@ -0,0 +1,69 @@
+"""
+Cost of opening agent sessions: time and memory per 1,000 concurrent ParkingAgent sessions.
+
+    python -m benchmarks.agent_sessions --sessions 1000 --rebuilds 20
+
+Needs the agent's dependencies (langchain-classic, langchain-openai) but no network:
+nothing here calls the LLM, and OPENAI_API_KEY defaults to a placeholder. History goes to a
+temp NumPy store (HISTORY_STORE=numpy) unless HISTORY_STORE is set. Reports:
+  * what every session used to pay: building a full AgentRuntime (LLM client, history store,
+    prompt, agent, executor), timed over --rebuilds builds,
+  * what a session pays now: ParkingAgent(session_id) against the shared runtime, for
+    --sessions sessions held open at once, with the Python memory they retain (tracemalloc).
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from .common import format_stats, percentiles, quiet_logs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--rebuilds", type=int, default=20)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="agent_sessions_bench_")
+    os.environ.setdefault("OPENAI_API_KEY", "unused-by-this-benchmark")
+    os.environ.setdefault("HISTORY_STORE", "numpy")
+    os.environ.setdefault("EMBEDDING_PROVIDER", "local")
+    os.environ["VECTOR_STORE_PATH"] = os.path.join(root, "vector_store")
+    os.environ["MILVUS_DATA_PATH"] = os.path.join(root, "milvus")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(root, "embedding_cache")
+
+    from agent.parking_agent import AgentRuntime, ParkingAgent, get_agent_runtime
+
+    quiet_logs()
+    samples = []
+    for _ in range(args.rebuilds):
+        started = time.perf_counter()
+        AgentRuntime()
+        samples.append(time.perf_counter() - started)
+    print(format_stats("per-session runtime build (before)", percentiles(samples)))
+
+    get_agent_runtime()
+    session_ids = [str(uuid.uuid4()) for _ in range(args.sessions)]
+    samples = []
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    agents = []
+    for session_id in session_ids:
+        started = time.perf_counter()
+        agents.append(ParkingAgent(session_id))
+        samples.append(time.perf_counter() - started)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(format_stats("ParkingAgent(session_id) (now)", percentiles(samples)))
+    retained = after - before
+    print(f"{len(agents)} open sessions retain {retained / 1024:,.1f} KiB "
+          f"({retained / len(agents) * 1000 / 2 ** 20:.2f} MiB per 1,000 sessions)")
+    if len({id(agent.agent_executor) for agent in agents}) != 1:
+        raise SystemExit("FAIL: sessions did not share one agent executor")
+
+
+if __name__ == "__main__":
+    main()
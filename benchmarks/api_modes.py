@@ -0,0 +1,156 @@
+"""
+Load test comparing PARKING_API_MODE=sync and PARKING_API_MODE=async.
+
+    python -m benchmarks.api_modes --clients 500 --duration 15
+
+Seeds a scratch database, then for each mode starts uvicorn in a subprocess and runs
+--clients concurrent clients against it for --duration seconds with a mixed workload
+(searches, booking lookups, bookings). Prints requests/sec and latency percentiles per
+mode as JSON. The load generator is a single asyncio process, so on small machines it
+can become the bottleneck before the server does; compare the two modes, not absolutes.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+from .common import percentiles, use_scratch_database
+
+LOCATIONS = [f"Zone {i:02d}" for i in range(50)]
+VEHICLE_TYPES = ["car", "suv", "two-wheeler"]
+
+
+def seed(slots: int, bookings: int):
+    import datetime
+
+    from app import models
+    from app.database import create_db_and_tables, engine
+
+    create_db_and_tables()
+    rng = random.Random(3)
+    with engine.begin() as conn:
+        conn.execute(models.ParkingSlot.__table__.insert(), [
+            {"location": LOCATIONS[i % len(LOCATIONS)], "slot_type": "open", "vehicle_type": VEHICLE_TYPES[i % 3],
+             "is_available": True, "price_per_hour": 3.0}
+            for i in range(slots)
+        ])
+        start = datetime.datetime.utcnow() + datetime.timedelta(days=30)
+        conn.execute(models.Booking.__table__.insert(), [
+            {"slot_id": rng.randint(1, slots), "user_id": f"user-{i % 200}", "vehicle_number": "SEED",
+             "start_time": start + datetime.timedelta(hours=i), "end_time": start + datetime.timedelta(hours=i + 1),
+             "duration_hours": 1, "total_cost": 3.0, "is_confirmed": True}
+            for i in range(bookings)
+        ])
+
+
+async def drive(base_url: str, clients: int, duration: float, slots: int, bookings: int):
+    latencies = {"search": [], "booking_lookup": [], "book": []}
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client(n: int, http: httpx.AsyncClient):
+        nonlocal errors
+        rng = random.Random(n)
+        while time.perf_counter() < deadline:
+            roll = rng.random()
+            started = time.perf_counter()
+            try:
+                if roll < 0.7:
+                    kind = "search"
+                    response = await http.post("/get-parking-spots/", json={
+                        "vehicle_type": rng.choice(VEHICLE_TYPES), "location": rng.choice(LOCATIONS),
+                        "duration_hours": rng.randint(1, 4), "date": "tomorrow"})
+                elif roll < 0.9:
+                    kind = "booking_lookup"
+                    response = await http.get(f"/bookings/{rng.randint(1, bookings)}")
+                else:
+                    kind = "book"
+                    response = await http.post("/book-parking/", json={
+                        "slot_id": rng.randint(1, slots), "user_id": f"load-{n}", "vehicle_number": "LOAD",
+                        "duration_hours": 1, "date": f"2031-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"})
+                if response.status_code >= 500:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies[kind].append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(n, http) for n in range(clients)))
+        elapsed = time.perf_counter() - started
+
+    all_samples = [s for samples in latencies.values() for s in samples]
+    return {
+        "requests": len(all_samples),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 2),
+        "requests_per_sec": round(len(all_samples) / elapsed, 1),
+        "overall": percentiles(all_samples),
+        **{kind: percentiles(samples) for kind, samples in latencies.items()},
+    }
+
+
+@contextlib.contextmanager
+def running_server(mode: str, port: int, startup_timeout: float = 20.0):
+    """Runs uvicorn on app.main:app in a subprocess with PARKING_API_MODE=mode; yields its base URL once /health answers."""
+    env = dict(os.environ, PARKING_API_MODE=mode)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.perf_counter() + startup_timeout
+        while True:
+            try:
+                if httpx.get(f"{base_url}/health").status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if server.poll() is not None or time.perf_counter() > deadline:
+                raise RuntimeError(f"{mode} server did not start on port {port}")
+            time.sleep(0.2)
+        yield base_url
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run_mode(mode: str, port: int, args) -> dict:
+    with running_server(mode, port) as base_url:
+        return asyncio.run(drive(base_url, args.clients, args.duration, args.slots, args.bookings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--slots", type=int, default=5000)
+    parser.add_argument("--bookings", type=int, default=20000)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--modes", default="sync,async")
+    parser.add_argument("--db", default=None, help="Scratch database path (default: a temp file)")
+    args = parser.parse_args()
+
+    use_scratch_database(args.db)
+    seed(args.slots, args.bookings)
+
+    report = {"clients": args.clients, "duration_s": args.duration}
+    for offset, mode in enumerate(args.modes.split(",")):
+        print(f"BENCH: Driving {mode} mode with {args.clients} clients for {args.duration}s...")
+        report[mode] = run_mode(mode, args.port + offset, args)
+        print(f"BENCH: {mode}: {report[mode]['requests_per_sec']} req/s, p99 {report[mode]['overall']['p99_ms']:.1f}ms")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
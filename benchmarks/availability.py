@@ -0,0 +1,110 @@
+"""
+Search latency vs. booking history size for the interval availability index.
+
+    python -m benchmarks.availability --slots 100000 --bookings 1000000
+
+Loads the slots into a scratch SQLite database, then adds bookings in stages and
+re-measures find_available_slots and single-slot free checks after each stage.
+With the index the numbers should stay flat as the bookings table grows.
+"""
+import argparse
+import datetime
+import random
+import time
+
+from .common import format_stats, percentiles, quiet_logs, time_calls, use_scratch_database
+
+VEHICLE_TYPES = ["car", "suv", "two-wheeler"]
+SLOT_TYPES = ["covered", "open", "ev_charging", "long-term"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=100_000)
+    parser.add_argument("--bookings", type=int, default=1_000_000)
+    parser.add_argument("--locations", type=int, default=500)
+    parser.add_argument("--stages", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--db", default=None, help="Scratch database path (default: a temp file)")
+    args = parser.parse_args()
+
+    use_scratch_database(args.db)
+
+    from app import crud, models, schemas
+    from app.availability import availability_index
+    from app.database import SessionLocal, create_db_and_tables, engine
+
+    create_db_and_tables()
+    rng = random.Random(42)
+    locations = [f"Location {i:04d}" for i in range(args.locations)]
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(models.ParkingSlot.__table__.insert(), [
+            {
+                "location": locations[i % args.locations],
+                "slot_type": SLOT_TYPES[i % len(SLOT_TYPES)],
+                "vehicle_type": VEHICLE_TYPES[i % len(VEHICLE_TYPES)],
+                "is_available": True,
+                "price_per_hour": 2.0 + (i % 7),
+            }
+            for i in range(args.slots)
+        ])
+    print(f"BENCH: Inserted {args.slots} slots in {time.perf_counter() - started:.2f}s")
+
+    now = datetime.datetime.utcnow()
+    horizon_hours = 24 * 60
+
+    def random_window(duration_hours):
+        start = now + datetime.timedelta(hours=rng.randrange(horizon_hours))
+        return start, start + datetime.timedelta(hours=duration_hours)
+
+    def search(_):
+        params = schemas.ParkingSearchRequest(
+            vehicle_type=rng.choice(VEHICLE_TYPES),
+            location=rng.choice(locations),
+            date=(now + datetime.timedelta(days=rng.randrange(1, 60))).date().isoformat(),
+            duration_hours=rng.randint(1, 8),
+        )
+        crud.find_available_slots(db, params)
+
+    def point_check(_):
+        availability_index.is_free(rng.randint(1, args.slots), *random_window(rng.randint(1, 8)))
+
+    db = SessionLocal()
+    # find_available_slots prints per call; silence it so console I/O doesn't dominate the timings.
+    quiet_logs()
+
+    per_stage = args.bookings // args.stages if args.stages else 0
+    loaded = 0
+    for stage in range(args.stages + 1):
+        if stage:
+            rows = []
+            for _ in range(per_stage):
+                duration = rng.randint(1, 8)
+                start, end = random_window(duration)
+                rows.append({
+                    "slot_id": rng.randint(1, args.slots), "user_id": f"user-{rng.randrange(50_000)}",
+                    "vehicle_number": "BENCH", "start_time": start, "end_time": end,
+                    "duration_hours": duration, "total_cost": 10.0, "is_confirmed": True,
+                })
+            with engine.begin() as conn:
+                conn.execute(models.Booking.__table__.insert(), rows)
+            for row in rows:
+                availability_index.add(row["slot_id"], row["start_time"], row["end_time"])
+            loaded += per_stage
+
+        print(f"\n-- bookings loaded: {loaded} (index holds {len(availability_index)} coalesced windows)")
+        print(format_stats("find_available_slots", percentiles(time_calls(search, args.queries))))
+        print(format_stats("availability_index.is_free", percentiles(time_calls(point_check, args.queries * 20))))
+
+    db.close()
+
+    with SessionLocal() as rebuild_db:
+        started = time.perf_counter()
+        availability_index.rebuild(rebuild_db, now=now)
+        print(f"\nBENCH: Rebuilt index from {loaded} bookings in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
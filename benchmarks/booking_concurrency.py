@@ -0,0 +1,121 @@
+"""
+Concurrency stress test for /book-parking/.
+
+    python -m benchmarks.booking_concurrency --requests 5000 --concurrency 200 --slots 20
+
+Fires many parallel booking requests at a small slot pool, then checks the bookings
+table for overlapping windows on the same slot. Any overlap is a double booking and
+makes the script exit non-zero. Reports bookings/sec and the 201/409 split.
+
+By default requests go through the ASGI app in-process (sync handlers still run on
+Starlette's threadpool, so they race for real). Pass --url to hit a running server,
+in which case --db must point at the same database file the server uses.
+"""
+import argparse
+import asyncio
+import collections
+import random
+import sys
+import time
+
+import httpx
+
+from .common import format_stats, percentiles, quiet_logs, use_scratch_database
+
+DATES = [None, "tomorrow", "2030-01-01", "2030-01-02"]
+
+
+def count_double_bookings(engine) -> int:
+    from sqlalchemy import text
+
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT COUNT(*) FROM bookings a JOIN bookings b "
+            "ON a.slot_id = b.slot_id AND a.id < b.id "
+            "AND a.start_time < b.end_time AND b.start_time < a.end_time"
+        )).scalar()
+
+
+async def fire(client: httpx.AsyncClient, total: int, concurrency: int, slots: int, seed: int):
+    rng = random.Random(seed)
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses = collections.Counter()
+    latencies = []
+
+    async def one(i: int):
+        payload = {
+            "slot_id": rng.randint(1, slots),
+            "user_id": f"stress-{i}",
+            "vehicle_number": f"KA01AB{i:04d}",
+            "duration_hours": rng.randint(1, 6),
+        }
+        date = rng.choice(DATES)
+        if date:
+            payload["date"] = date
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post("/book-parking/", json=payload)
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return statuses, latencies, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--slots", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--url", default=None, help="Base URL of a running API (default: in-process ASGI app)")
+    parser.add_argument("--db", default=None, help="Scratch database path (default: a temp file)")
+    args = parser.parse_args()
+
+    use_scratch_database(args.db)
+
+    from app import models
+    from app.database import create_db_and_tables, engine
+
+    create_db_and_tables()
+    if args.url is None:
+        with engine.begin() as conn:
+            conn.execute(models.ParkingSlot.__table__.insert(), [
+                {"location": f"Stress Lot {i % 4}", "slot_type": "open", "vehicle_type": "car",
+                 "is_available": True, "price_per_hour": 3.0}
+                for i in range(args.slots)
+            ])
+        from app.main import app
+
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://stress"
+    else:
+        transport = None
+        base_url = args.url
+
+    quiet_logs()
+
+    async def run():
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=60) as client:
+            return await fire(client, args.requests, args.concurrency, args.slots, args.seed)
+
+    statuses, latencies, elapsed = asyncio.run(run())
+    booked = statuses.get(201, 0) + statuses.get(200, 0)
+    doubles = count_double_bookings(engine)
+
+    print(f"\nrequests={args.requests} concurrency={args.concurrency} slots={args.slots} elapsed={elapsed:.2f}s")
+    print(f"status counts: {dict(statuses)}")
+    print(f"bookings/sec (successful): {booked / elapsed:.1f}   requests/sec: {args.requests / elapsed:.1f}")
+    print(format_stats("POST /book-parking/", percentiles(latencies)))
+    print(f"double bookings found: {doubles}")
+    if doubles:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Query-count guard for booking reads.
+
+    python -m benchmarks.booking_queries --bookings 300
+
+Gives one user a few hundred bookings spread over many slots, then counts the SQL
+statements each booking read issues through the API. Every page of /user-bookings/ and
+every /bookings/{id} must cost exactly one query (the slot is joined in), whatever the
+page size; the script exits non-zero otherwise. It also shows what the old lazy-loading
+read would have cost, for comparison.
+"""
+import argparse
+import datetime
+import sys
+
+from .common import QueryCounter, use_scratch_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bookings", type=int, default=300)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--db", default=None, help="Scratch database path (default: a temp file)")
+    args = parser.parse_args()
+
+    use_scratch_database(args.db)
+
+    from fastapi.testclient import TestClient
+
+    from app import database, models
+    from app.database import SessionLocal, create_db_and_tables, engine
+
+    create_db_and_tables()
+    start = datetime.datetime(2030, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(models.ParkingSlot.__table__.insert(), [
+            {"location": f"Lot {i}", "slot_type": "open", "vehicle_type": "car", "is_available": True, "price_per_hour": 2.0}
+            for i in range(args.bookings)
+        ])
+        conn.execute(models.Booking.__table__.insert(), [
+            {"slot_id": i + 1, "user_id": "heavy-user", "vehicle_number": "KA01AB1234",
+             # Pairs of bookings share a start_time so the (start_time, id) tie-break is exercised.
+             "start_time": start + datetime.timedelta(hours=i // 2), "end_time": start + datetime.timedelta(hours=i // 2 + 1),
+             "duration_hours": 1, "total_cost": 2.0, "is_confirmed": True}
+            for i in range(args.bookings)
+        ])
+
+    from app.main import app
+
+    # Under PARKING_API_MODE=async the endpoints run on the aiosqlite engine instead.
+    api_engine = database.get_async_engine().sync_engine if database.API_MODE == "async" else engine
+    failures = []
+    client = TestClient(app)
+
+    seen_ids = []
+    cursor = None
+    pages = 0
+    while True:
+        params = {"limit": args.page_size, **({"cursor": cursor} if cursor else {})}
+        with QueryCounter(api_engine) as counter:
+            body = client.get("/user-bookings/heavy-user", params=params).json()
+        pages += 1
+        seen_ids.extend(item["id"] for item in body["items"])
+        if counter.count != 1:
+            failures.append(f"/user-bookings/ page {pages} ran {counter.count} queries, expected 1")
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    print(f"/user-bookings/ ({database.API_MODE}): {pages} page(s) of {args.page_size}, {len(seen_ids)} bookings")
+    if sorted(seen_ids) != list(range(1, args.bookings + 1)) or len(set(seen_ids)) != len(seen_ids):
+        failures.append("keyset pagination skipped or repeated bookings")
+
+    with QueryCounter(api_engine) as counter:
+        client.get("/bookings/1")
+    print(f"/bookings/{{id}}: {counter.count} query")
+    if counter.count != 1:
+        failures.append(f"/bookings/{{id}} ran {counter.count} queries, expected 1")
+
+    with SessionLocal() as db, QueryCounter(engine) as counter:
+        legacy = db.query(models.Booking).filter(models.Booking.user_id == "heavy-user").all()
+        for booking in legacy:
+            booking.slot.location
+    print(f"old lazy-loading read of the same user: {counter.count} queries")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
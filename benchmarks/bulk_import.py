@@ -0,0 +1,96 @@
+"""
+Bulk slot ingestion throughput.
+
+    python -m benchmarks.bulk_import --slots 100000
+
+Writes a synthetic CSV and NDJSON inventory, then loads it three ways into a scratch
+database: the CLI path (app.bulk_import.import_slots_file), the streaming HTTP endpoint
+POST /parking-slots/bulk through the in-process ASGI app, and, for reference, the old
+one-commit-per-row crud.create_parking_slot loop on a small sample.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from .common import quiet_logs, use_scratch_database
+
+VEHICLE_TYPES = ["car", "suv", "two-wheeler"]
+SLOT_TYPES = ["covered", "open", "ev_charging", "long-term"]
+
+
+def write_inventory(directory: str, slots: int, locations: int):
+    rng = random.Random(5)
+    rows = [
+        {"location": f"District {rng.randrange(locations):03d} Lot", "slot_type": rng.choice(SLOT_TYPES),
+         "vehicle_type": rng.choice(VEHICLE_TYPES), "price_per_hour": round(rng.uniform(1, 9), 2)}
+        for _ in range(slots)
+    ]
+    csv_path = os.path.join(directory, "slots.csv")
+    with open(csv_path, "w") as f:
+        f.write("location,slot_type,vehicle_type,price_per_hour\n")
+        for row in rows:
+            f.write(f"{row['location']},{row['slot_type']},{row['vehicle_type']},{row['price_per_hour']}\n")
+    ndjson_path = os.path.join(directory, "slots.ndjson")
+    with open(ndjson_path, "w") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+    return csv_path, ndjson_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=100_000)
+    parser.add_argument("--locations", type=int, default=300)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--per-row-sample", type=int, default=500)
+    parser.add_argument("--db", default=None, help="Scratch database path (default: a temp file)")
+    args = parser.parse_args()
+
+    use_scratch_database(args.db)
+
+    from fastapi.testclient import TestClient
+
+    from app import bulk_import, crud, schemas
+    from app.database import SessionLocal, create_db_and_tables
+
+    create_db_and_tables()
+    directory = tempfile.mkdtemp(prefix="parking_bulk_")
+    csv_path, ndjson_path = write_inventory(directory, args.slots, args.locations)
+
+    started = time.perf_counter()
+    result = bulk_import.import_slots_file(csv_path, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - started
+    print(f"CLI CSV:            {result.inserted} rows in {elapsed:.2f}s ({result.inserted / elapsed:,.0f} rows/s), {result.failed} failed")
+
+    from app.main import app
+
+    def stream_file(path):
+        with open(path, "rb") as f:
+            while chunk := f.read(256 * 1024):
+                yield chunk
+
+    with TestClient(app) as client:
+        started = time.perf_counter()
+        response = client.post(f"/parking-slots/bulk?batch_size={args.batch_size}", content=stream_file(ndjson_path),
+                               headers={"content-type": "application/x-ndjson"})
+        elapsed = time.perf_counter() - started
+    body = response.json()
+    print(f"HTTP NDJSON stream: {body['inserted']} rows in {elapsed:.2f}s ({body['inserted'] / elapsed:,.0f} rows/s), {body['failed']} failed")
+
+    quiet_logs()
+    sample = [schemas.ParkingSlotCreate(location="Per Row Lot", slot_type="open", vehicle_type="car", price_per_hour=2.0)
+              for _ in range(args.per_row_sample)]
+    with SessionLocal() as db:
+        started = time.perf_counter()
+        for slot in sample:
+            crud.create_parking_slot(db, slot)
+        elapsed = time.perf_counter() - started
+    print(f"per-row crud loop:  {len(sample)} rows in {elapsed:.2f}s ({len(sample) / elapsed:,.0f} rows/s)"
+          f" -> ~{args.slots * elapsed / len(sample):.0f}s for {args.slots}")
+
+
+if __name__ == "__main__":
+    main()
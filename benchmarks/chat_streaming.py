@@ -0,0 +1,117 @@
+"""
+Streamlit chat with a long conversation: rerun render time and time to first token.
+
+    python -m benchmarks.chat_streaming --messages 200 --tokens 120 --first-token-ms 600 --token-ms 15
+
+Runs ui/app.py headless with Streamlit's AppTest, with --messages messages already in the
+conversation and a stand-in agent whose stream_agent waits --first-token-ms (the LLM and
+tools) and then yields --tokens tokens --token-ms apart, so no OpenAI key is used. Reports:
+  * a rerun with no input: whole-script time, and the time spent emitting the chat history,
+  * one turn: time to first token in the reply bubble and to the full reply, as the app
+    records them in st.session_state.ui_timings,
+  * for comparison, what the previous UI did: rebuild the HTML of every message on each
+    rerun, and show nothing until the whole reply was generated.
+"""
+import argparse
+import html
+import os
+import textwrap
+import time
+
+from .common import format_stats, percentiles
+
+APP_PATH = os.path.join(os.path.dirname(__file__), "..", "ui", "app.py")
+
+
+class StreamingStandIn:
+    """Yields a fixed reply token by token on the same schedule every turn."""
+
+    def __init__(self, tokens: int, first_token: float, per_token: float):
+        self.tokens = tokens
+        self.first_token = first_token
+        self.per_token = per_token
+
+    def stream_agent(self, user_input: str):
+        time.sleep(self.first_token)
+        for i in range(self.tokens):
+            if i:
+                time.sleep(self.per_token)
+            yield f"word{i} "
+
+
+def conversation(messages: int):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant",
+         "content": f"Message {i}: parking near Zone {i % 50} for {i % 5 + 1} hours, car, tomorrow.\nSecond line."}
+        for i in range(messages)
+    ]
+
+
+def full_rebuild(messages) -> str:
+    """The previous display_messages: every bubble's HTML rebuilt and joined on every rerun."""
+    parts = ["<div class='chat-container' id='chat-area'>"]
+    for message in messages:
+        message_class = "user-message" if message["role"] == "user" else "assistant-message"
+        content = html.escape(message["content"]).replace("\n", "<br />\n")
+        parts.append(textwrap.dedent(f"""
+            <div class="message-bubble {message_class}">
+                <span class="icon">x</span>
+                <div class="message-content">
+                    {content}
+                </div>
+            </div>
+            """).strip())
+    parts.append("</div>")
+    return "".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=120)
+    parser.add_argument("--first-token-ms", type=float, default=600)
+    parser.add_argument("--token-ms", type=float, default=15)
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args()
+
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    at.session_state["parking_agent_initialized"] = True
+    at.session_state["parking_agent"] = StreamingStandIn(args.tokens, args.first_token_ms / 1000, args.token_ms / 1000)
+    at.session_state["messages"] = conversation(args.messages)
+    at.run()
+    if at.exception:
+        raise SystemExit(f"FAIL: the app raised {at.exception}")
+
+    script, history = [], []
+    for _ in range(args.reruns):
+        started = time.perf_counter()
+        at.run()
+        script.append(time.perf_counter() - started)
+        history.append(at.session_state["ui_timings"]["render_ms"] / 1000)
+    print(format_stats(f"rerun with {args.messages} messages", percentiles(script)))
+    print(format_stats("  of which emitting the history", percentiles(history)))
+
+    rebuilds = []
+    for _ in range(args.reruns):
+        started = time.perf_counter()
+        full_rebuild(at.session_state["messages"])
+        rebuilds.append(time.perf_counter() - started)
+    print(format_stats("before: full HTML rebuild per rerun", percentiles(rebuilds)))
+
+    at.text_input[0].input("Find parking near Zone 3 tomorrow")
+    at.button[0].click()
+    at.run()
+    if at.exception:
+        raise SystemExit(f"FAIL: the app raised {at.exception}")
+    timings = at.session_state["ui_timings"]
+    blocking = args.first_token_ms + args.token_ms * (args.tokens - 1)
+    print(f"turn: first token shown after {timings['first_token_ms']:.0f}ms, full reply after {timings['response_ms']:.0f}ms "
+          f"(before: nothing shown until ~{blocking:.0f}ms)")
+    if at.session_state["messages"][-1]["content"] != "".join(f"word{i} " for i in range(args.tokens)):
+        raise SystemExit("FAIL: the streamed reply was not stored as the last message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+
+import logging
+import os
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import event
+
+
+def use_scratch_database(path: Optional[str] = None) -> str:
+    """
+    Points app.database at a throwaway SQLite file. Must run before anything imports 'app',
+    because the engine is created at import time from DATABASE_URL.
+    """
+    if path is None:
+        handle, path = tempfile.mkstemp(prefix="parking_bench_", suffix=".db")
+        os.close(handle)
+    if os.path.exists(path):
+        os.remove(path)
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    print(f"BENCH: Using scratch database {path}")
+    return path
+
+
+class QueryCounter:
+    """Counts SQL statements sent on an engine while the with-block runs."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def quiet_logs(level: int = logging.WARNING):
+    """Raises the project's loggers to level, so per-call log lines don't skew the timings."""
+    from observability.logs import PROJECT_LOGGERS, configure_logging
+
+    configure_logging()
+    for name in PROJECT_LOGGERS:
+        logging.getLogger(name).setLevel(level)
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 and mean of a list of latencies, in milliseconds."""
+    if not samples:
+        return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+    }
+
+
+def time_calls(fn: Callable[[int], object], repeat: int) -> List[float]:
+    """Calls fn(i) 'repeat' times and returns per-call wall time in seconds."""
+    samples = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def format_stats(label: str, stats: Dict[str, float]) -> str:
+    return (f"{label:<40} n={stats['count']:<7} mean={stats['mean_ms']:.3f}ms "
+            f"p50={stats['p50_ms']:.3f}ms p95={stats['p95_ms']:.3f}ms p99={stats['p99_ms']:.3f}ms")
@@ -0,0 +1,95 @@
+"""
+Embedding cache hit rate and time saved on a conversation-like stream of texts.
+
+    python -m benchmarks.embedding_cache --turns 2000 --latency-ms 40
+
+Replays --turns agent turns the way ParkingAgent does (embed the user input to search
+history, embed it again to store it, embed the reply) against a stand-in embedder that
+sleeps --latency-ms per call to mimic the API round trip. User inputs are drawn from a
+skewed vocabulary, so short confirmations and popular locations repeat. Runs without the
+cache, with a cold cache, and after a "restart" served by the on-disk tier.
+"""
+import argparse
+import hashlib
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from milvus_utils.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+DIMENSION = 1536
+PHRASES = ["yes", "book it", "no thanks", "ok", "tomorrow", "for 2 hours", "a car", "an SUV", "confirm"]
+LOCATIONS = [f"Zone {i}" for i in range(40)]
+
+
+class SlowEmbedder:
+    """Deterministic vectors from the text hash, after sleeping like a network call."""
+
+    def __init__(self, latency: float, dimension: int = DIMENSION):
+        self.latency = latency
+        self.dimension = dimension
+        self.name = f"slow-stand-in:{dimension}"
+        self.calls = 0
+
+    def _vector(self, text: str):
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        return np.random.default_rng(seed).random(self.dimension, dtype=np.float32).tolist()
+
+    def embed_query(self, text: str):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self._vector(text)
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+
+def conversation(turns: int, seed: int = 5):
+    rng = random.Random(seed)
+    for turn in range(turns):
+        roll = rng.random()
+        if roll < 0.5:
+            user = rng.choice(PHRASES)
+        elif roll < 0.8:
+            user = f"parking near {LOCATIONS[min(int(rng.paretovariate(1.2)) - 1, len(LOCATIONS) - 1)]}"
+        else:
+            user = f"free text question number {turn}"
+        yield user, f"reply {turn}"
+
+
+def replay(embedder, turns: int) -> float:
+    started = time.perf_counter()
+    for user, reply in conversation(turns):
+        embedder.embed_query(user)   # get_relevant_history
+        embedder.embed_query(user)   # add_conversation_history(user)
+        embedder.embed_query(reply)  # add_conversation_history(ai)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+
+    baseline = SlowEmbedder(latency)
+    elapsed = replay(baseline, args.turns)
+    print(f"no cache:      {baseline.calls} embedding call(s), {elapsed:.2f}s")
+
+    path = tempfile.mkdtemp(prefix="embedding_cache_")
+    for label in ("cold cache:", "after restart:"):
+        model = SlowEmbedder(latency)
+        cache = EmbeddingCache(DIMENSION, "bench", path=path)
+        elapsed = replay(CachedEmbeddings(model, cache), args.turns)
+        stats = cache.stats()
+        print(f"{label:<14} {model.calls} embedding call(s), {elapsed:.2f}s, hit rate {stats['hit_rate']:.1%} "
+              f"(memory {stats['memory_hits']}, disk {stats['disk_hits']}, misses {stats['misses']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Embedding throughput of a provider, one text per call vs batched.
+
+    python -m benchmarks.embedding_providers --provider local --texts 5000 --batch 64
+
+Embeds --texts distinct conversation-like messages with embed_query one at a time, then again
+with embed_documents in --batch sized chunks, and reports embeddings/sec for both. The
+default "local" provider needs no network or API key; "openai" measures the API instead.
+"""
+import argparse
+import time
+
+from milvus_utils.embedding_providers import get_embedding_provider
+
+
+def messages(count: int):
+    return [f"I need a parking slot near Zone {i % 50} for {i % 5 + 1} hours, message {i}" for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provider", default="local")
+    parser.add_argument("--texts", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=64)
+    args = parser.parse_args()
+
+    provider = get_embedding_provider(args.provider)
+    texts = messages(args.texts)
+    print(f"BENCH: provider {provider.name}, {provider.dimension} dimensions, {len(texts)} texts")
+
+    started = time.perf_counter()
+    for text in texts:
+        provider.embed_query(text)
+    elapsed = time.perf_counter() - started
+    print(f"single:  {len(texts) / elapsed:,.0f} embeddings/s ({elapsed / len(texts) * 1000:.3f}ms per call)")
+
+    started = time.perf_counter()
+    for i in range(0, len(texts), args.batch):
+        vectors = provider.embed_documents(texts[i:i + args.batch])
+    elapsed = time.perf_counter() - started
+    print(f"batched: {len(texts) / elapsed:,.0f} embeddings/s (batch of {args.batch}, "
+          f"{elapsed / -(-len(texts) // args.batch) * 1000:.3f}ms per call)")
+    if len(vectors[0]) != provider.dimension:
+        raise SystemExit(f"FAIL: got {len(vectors[0])}-d vectors from a {provider.dimension}-d provider")
+
+
+if __name__ == "__main__":
+    main()
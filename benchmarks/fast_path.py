@@ -0,0 +1,128 @@
+"""
+Deterministic fast path: share of turns answered without the LLM, and their latency.
+
+    python -m benchmarks.fast_path --sessions 50 --turns 20 --slots 2000
+
+Seeds a scratch database and replays a mixed conversation for each session through the
+FastPathRouter that ParkingAgent puts in front of the LLM, with the tools' API client going
+in-process (AGENT_API_TRANSPORT=inprocess). Each session alternates between:
+  * structured turns the router must answer: "book slot N for <plate>", "show my bookings",
+    "booking N status", including bookings that rely on the duration and date a previous
+    search left in the session state,
+  * free-form turns that must go to the LLM ("anything cheaper near Zone 3?", "cancel booking 4"),
+  * bookings that say something about the duration, date or vehicle the rules can't parse
+    ("for 30 minutes", "next friday", "my other car"). The session state has a duration, date
+    and plate by then, so answering them would book the wrong thing; they must go to the LLM.
+The LLM is not called; a free-form turn is recorded as handed off and, for search-like turns,
+the SearchParkingSpots call the agent would make is fed to the session state. Reports the
+fast-path fraction and latency, and the cost of a hand-off (parsing only). Fails if a
+structured turn is handed off or a free-form turn is answered.
+"""
+import argparse
+import os
+import random
+import time
+
+from .api_modes import LOCATIONS, VEHICLE_TYPES, seed
+from .common import format_stats, percentiles, quiet_logs, use_scratch_database
+
+FREE_FORM = [
+    "anything cheaper near {location}?",
+    "I need parking near {location} for a few hours, what do you have?",
+    "cancel booking {booking_id}",
+    "can you extend my booking {booking_id} by an hour",
+    "which is better, slot {slot_id} or slot {other_slot}?",
+    "thanks! how do I get to {location} from the station",
+]
+# Would book with the session's duration, date or plate if the leftover words were ignored.
+MISREAD_BOOKINGS = [
+    "book slot {slot_id} for 30 minutes",
+    "book slot {slot_id} for 100 hours",
+    "book slot {slot_id} for 2 days",
+    "book slot {slot_id} next friday",
+    "book slot {slot_id} the day after tomorrow",
+    "book slot {slot_id} for my other car",
+    "book slot {slot_id} for abc1",
+]
+
+
+def session_turns(rng: random.Random, session: int, turns: int, slots: int, bookings: int):
+    """(text, expected fast path?, agent tool call for a handed-off search turn) per turn."""
+    # Seeded booking i + 1 belongs to user-(i % 200).
+    own_bookings = list(range(session + 1, bookings + 1, 200))
+    for turn in range(turns):
+        plate = f"KA{rng.randint(1, 99):02d}AB{rng.randint(1000, 9999)}"
+        fields = {"location": rng.choice(LOCATIONS), "booking_id": rng.choice(own_bookings),
+                  "slot_id": rng.randint(1, slots), "other_slot": rng.randint(1, slots)}
+        kind = turn % 6
+        if kind == 0:
+            search = {"vehicle_type": rng.choice(VEHICLE_TYPES), "location": fields["location"],
+                      "duration_hours": rng.randint(1, 4), "date": "tomorrow"}
+            yield f"find me a {search['vehicle_type']} spot near {search['location']}", False, search
+        elif kind == 1:
+            # Duration and date come from the search above.
+            yield f"book slot {fields['slot_id']} for {plate}", True, None
+        elif kind == 2:
+            yield rng.choice(["show my bookings", "my bookings?", f"booking {fields['booking_id']} status",
+                              f"what's the status of booking {fields['booking_id']}?"]), True, None
+        elif kind == 3:
+            yield f"Book spot #{fields['slot_id']} for car {plate} for {rng.randint(1, 6)} hours today", True, None
+        elif kind == 4:
+            yield rng.choice(FREE_FORM).format(**fields), False, None
+        else:
+            yield MISREAD_BOOKINGS[(session + turn) % len(MISREAD_BOOKINGS)].format(**fields), False, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--slots", type=int, default=2000)
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--db", default=None, help="Scratch database path (default: a temp file)")
+    args = parser.parse_args()
+    if not 0 < args.sessions <= 200 or args.bookings < 200:
+        raise SystemExit("--sessions must be 1..200 and --bookings at least 200 (sessions are the seeded users)")
+
+    use_scratch_database(args.db)
+    os.environ["AGENT_API_TRANSPORT"] = "inprocess"
+    seed(args.slots, args.bookings)
+
+    from agent.fast_path import FastPathRouter, SessionState
+
+    quiet_logs()
+    router = FastPathRouter()
+    # Warm up the in-process app (indexes, caches) before timing.
+    router.handle("show my bookings", "user-0", SessionState())
+    router = FastPathRouter()
+
+    rng = random.Random(11)
+    served, handed_off, wrong = [], [], []
+    for session in range(args.sessions):
+        session_id, state = f"user-{session}", SessionState()
+        for text, expected, search in session_turns(rng, session, args.turns, args.slots, args.bookings):
+            started = time.perf_counter()
+            reply = router.handle(text, session_id, state)
+            elapsed = time.perf_counter() - started
+            if (reply is not None) != expected:
+                wrong.append((text, reply))
+            if reply is None:
+                handed_off.append(elapsed)
+                if search:
+                    state.observe_tool_call("SearchParkingSpots", search)
+            else:
+                served.append(elapsed)
+
+    stats = router.stats()
+    print(f"{stats['turns_total']} turns, {stats['fast_path_total']} answered by the fast path "
+          f"({stats['fast_path_fraction']:.0%}), by intent: {stats['by_intent']}")
+    print(format_stats("fast-path turn (parse + API + reply)", percentiles(served)))
+    print(format_stats("hand-off to the LLM (parse only)", percentiles(handed_off)))
+    if wrong:
+        for text, reply in wrong[:10]:
+            print(f"  misrouted: {text!r} -> {'LLM' if reply is None else reply[:80]!r}")
+        raise SystemExit(f"FAIL: {len(wrong)} turns were routed the wrong way")
+
+
+if __name__ == "__main__":
+    main()
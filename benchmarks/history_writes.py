@@ -0,0 +1,68 @@
+"""
+Conversation-history write cost per agent turn: synchronous inserts vs the write-behind buffer.
+
+    python -m benchmarks.history_writes --turns 200 --sessions 20
+
+Needs Milvus Lite (pymilvus with milvus-lite installed); data goes to a temp MILVUS_DATA_PATH.
+Embeddings come from the stand-in embedder in benchmarks.embedding_cache (--latency-ms per
+call), so no OpenAI key is used. For each mode it replays --turns turns, each doing what
+ParkingAgent.invoke_agent does after the LLM answers (store the user message and the reply),
+and reports the per-turn latency the user waits for plus end-to-end inserts/sec including
+the final drain, then checks every message is searchable.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from .common import format_stats, percentiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    args = parser.parse_args()
+
+    os.environ["MILVUS_DATA_PATH"] = tempfile.mkdtemp(prefix="milvus_bench_")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(os.environ["MILVUS_DATA_PATH"], "embedding_cache")
+
+    from milvus_utils import milvus_connector
+    from milvus_utils.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+    from .embedding_cache import SlowEmbedder
+
+    for write_behind in (False, True):
+        label = "write-behind" if write_behind else "synchronous"
+        model = SlowEmbedder(args.latency_ms / 1000)
+        service = milvus_connector.MilvusService(provider=model, write_behind=write_behind)
+        # A fresh memory-only cache per mode, so the second mode doesn't reuse the first one's embeddings.
+        service.embeddings_model = CachedEmbeddings(model, EmbeddingCache(model.dimension, label, path=None))
+
+        samples = []
+        started = time.perf_counter()
+        for turn in range(args.turns):
+            session_id = f"{label}-session-{turn % args.sessions}"
+            turn_started = time.perf_counter()
+            service.add_conversation_history(session_id, f"user message {turn}", "user")
+            service.add_conversation_history(session_id, f"agent reply {turn}", "ai")
+            samples.append(time.perf_counter() - turn_started)
+        if write_behind:
+            service.flush_pending(timeout=300)
+        elapsed = time.perf_counter() - started
+
+        messages = args.turns * 2
+        print(format_stats(f"{label}: per-turn write latency", percentiles(samples)))
+        print(f"{label}: {messages} messages durable in {elapsed:.2f}s ({messages / elapsed:,.1f} inserts/s), "
+              f"{model.calls} embedding call(s)")
+
+        session_id = f"{label}-session-0"
+        found = service.get_relevant_history(session_id, "user message 0", k=3)
+        if not any(item["content"] == "user message 0" for item in found):
+            raise SystemExit(f"FAIL: {label} did not return a message it stored")
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Load test for the parking API: synthetic inventory, mixed workload, JSON report comparable across commits.
+
+    python -m benchmarks.load_test --slots 100000 --bookings 200000 --concurrency 10,50,200 --duration 20 \\
+        --output results/load_$(git rev-parse --short HEAD).json
+    python -m benchmarks.load_test ... --compare results/load_<older commit>.json
+
+Seeds a scratch SQLite database with --slots slots spread over --locations locations (vehicle and
+slot types mixed) and --bookings bookings by --users users, from 30 days ago to 30 days ahead.
+Then starts uvicorn (PARKING_API_MODE=--mode) and, for each --concurrency level, runs that many
+clients for --duration seconds (after --warmup seconds that aren't measured) with the --mix
+workload over:
+  search         POST /get-parking-spots/
+  book           POST /book-parking/ (random slot and future date; 409 is an expected answer)
+  slots          GET /parking-slots/, each client following next_cursor through the inventory
+  user_bookings  GET /user-bookings/{user_id}
+Reports requests/sec, errors (5xx and transport failures), status codes and p50/p95/p99 per
+endpoint as JSON. --compare prints the change against an earlier report run with the same
+parameters. --base-url drives a server that is already running (and already has data) instead.
+
+Seeding and the search mix use --seed, so two runs with the same arguments send the same
+requests in the same order per client. The load generator is one asyncio process: on a small
+machine it competes with the server for CPU, so compare runs from the same machine.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from typing import Dict, List
+
+import httpx
+
+from .api_modes import running_server
+from .common import percentiles, use_scratch_database
+
+ENDPOINTS = ("search", "book", "slots", "user_bookings")
+DEFAULT_MIX = "search=60,book=10,slots=15,user_bookings=15"
+VEHICLE_TYPES = ("car", "car", "car", "suv", "two-wheeler", "two-wheeler")
+SLOT_TYPES = ("open", "covered", "ev_charging", "long-term")
+# Rows per executemany while seeding, so a 1M-slot inventory doesn't sit in memory at once.
+SEED_CHUNK = 50000
+
+
+def locations(count: int) -> List[str]:
+    return [f"Location {i:04d}" for i in range(count)]
+
+
+def seed(slots: int, bookings: int, location_count: int, users: int, rng_seed: int) -> float:
+    """Fills the (empty) scratch database. Returns the seconds it took."""
+    from app import models
+    from app.database import create_db_and_tables, engine
+
+    started = time.perf_counter()
+    create_db_and_tables()
+    names = locations(location_count)
+    rng = random.Random(rng_seed)
+    now = datetime.datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    with engine.begin() as conn:
+        for offset in range(0, slots, SEED_CHUNK):
+            conn.execute(models.ParkingSlot.__table__.insert(), [
+                {"location": names[i % location_count], "slot_type": SLOT_TYPES[i % len(SLOT_TYPES)],
+                 "vehicle_type": rng.choice(VEHICLE_TYPES), "is_available": True, "price_per_hour": rng.choice((1.5, 3.0, 4.5, 6.0))}
+                for i in range(offset, min(offset + SEED_CHUNK, slots))
+            ])
+        for offset in range(0, bookings, SEED_CHUNK):
+            rows = []
+            for i in range(offset, min(offset + SEED_CHUNK, bookings)):
+                start = now + datetime.timedelta(hours=rng.randint(-30 * 24, 30 * 24))
+                hours = rng.randint(1, 8)
+                rows.append({"slot_id": rng.randint(1, slots), "user_id": f"user-{rng.randrange(users)}", "vehicle_number": "SEED",
+                             "start_time": start, "end_time": start + datetime.timedelta(hours=hours),
+                             "duration_hours": hours, "total_cost": 3.0 * hours, "is_confirmed": True})
+            conn.execute(models.Booking.__table__.insert(), rows)
+    return time.perf_counter() - started
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint {name!r} in --mix; use {', '.join(ENDPOINTS)}")
+        weights[name] = float(weight)
+    total = sum(weights.values())
+    if total <= 0:
+        raise SystemExit("--mix weights must add up to more than 0")
+    return {name: weight / total for name, weight in weights.items()}
+
+
+async def run_level(base_url: str, concurrency: int, duration: float, warmup: float, mix: Dict[str, float], args) -> dict:
+    """concurrency clients for warmup + duration seconds; only requests that start after the warmup are recorded."""
+    names = locations(args.locations)
+    kinds, weights = list(mix), list(mix.values())
+    latencies: Dict[str, List[float]] = {kind: [] for kind in kinds}
+    statuses: Dict[str, Dict[str, int]] = {kind: {} for kind in kinds}
+    errors = 0
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    async def client(n: int, http: httpx.AsyncClient):
+        nonlocal errors
+        rng = random.Random(args.seed * 100003 + n)
+        slot_cursor = None
+        while True:
+            request_started = time.perf_counter()
+            if request_started >= deadline:
+                return
+            kind = rng.choices(kinds, weights)[0]
+            try:
+                if kind == "search":
+                    response = await http.post("/get-parking-spots/", json={
+                        "vehicle_type": rng.choice(VEHICLE_TYPES), "location": rng.choice(names),
+                        "duration_hours": rng.randint(1, 4), "date": rng.choice(("today", "tomorrow", None))})
+                elif kind == "book":
+                    day = datetime.date.today() + datetime.timedelta(days=rng.randint(31, 365))
+                    response = await http.post("/book-parking/", json={
+                        "slot_id": rng.randint(1, args.slots), "user_id": f"load-{n}", "vehicle_number": "LOAD",
+                        "duration_hours": rng.randint(1, 4), "date": day.isoformat()})
+                elif kind == "slots":
+                    response = await http.get("/parking-slots/", params={"limit": args.page_size, **({"cursor": slot_cursor} if slot_cursor else {})})
+                else:
+                    response = await http.get(f"/user-bookings/user-{rng.randrange(args.users)}", params={"limit": args.page_size})
+            except httpx.HTTPError:
+                if request_started >= measure_from:
+                    errors += 1
+                continue
+            elapsed = time.perf_counter() - request_started
+            if kind == "slots" and response.status_code == 200:
+                slot_cursor = response.json()["next_cursor"]
+            if request_started < measure_from:
+                continue
+            latencies[kind].append(elapsed)
+            status = str(response.status_code)
+            statuses[kind][status] = statuses[kind].get(status, 0) + 1
+            if response.status_code >= 500:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        await asyncio.gather(*(client(n, http) for n in range(concurrency)))
+    elapsed = max(time.perf_counter() - measure_from, 1e-9)
+
+    all_samples = [s for samples in latencies.values() for s in samples]
+    return {
+        "concurrency": concurrency,
+        "requests": len(all_samples),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 2),
+        "requests_per_sec": round(len(all_samples) / elapsed, 1),
+        "overall": percentiles(all_samples),
+        "endpoints": {kind: {**percentiles(latencies[kind]), "status": statuses[kind]} for kind in kinds},
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(report: dict, baseline: dict):
+    """Prints requests/sec and p50/p99 per endpoint against baseline, level by level."""
+
+    def change(new: float, old: float) -> str:
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    print(f"BENCH: {report['commit']} vs {baseline.get('commit', '?')}")
+    if baseline.get("parameters") != report["parameters"]:
+        print("BENCH: warning: the baseline was run with different parameters; the comparison may not mean much.")
+    old_levels = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    for level in report["levels"]:
+        old = old_levels.get(level["concurrency"])
+        if old is None:
+            continue
+        print(f"  concurrency {level['concurrency']}: {level['requests_per_sec']} req/s ({change(level['requests_per_sec'], old['requests_per_sec'])})")
+        for kind, stats in level["endpoints"].items():
+            before = old["endpoints"].get(kind)
+            if before:
+                print(f"    {kind:<14} p50 {stats['p50_ms']:.2f}ms ({change(stats['p50_ms'], before['p50_ms'])})  "
+                      f"p99 {stats['p99_ms']:.2f}ms ({change(stats['p99_ms'], before['p99_ms'])})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=10000)
+    parser.add_argument("--locations", type=int, default=200)
+    parser.add_argument("--bookings", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", default="10,50", help="Comma-separated client counts, run one after another")
+    parser.add_argument("--duration", type=float, default=15, help="Measured seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=2, help="Unmeasured seconds before each level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Relative weights per endpoint (default {DEFAULT_MIX})")
+    parser.add_argument("--page-size", type=int, default=50, help="limit for /parking-slots/ and /user-bookings/")
+    parser.add_argument("--mode", default="sync", choices=("sync", "async"), help="PARKING_API_MODE of the server")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--port", type=int, default=8770)
+    parser.add_argument("--startup-timeout", type=float, default=120, help="Seconds to wait for the server (it indexes the inventory on start)")
+    parser.add_argument("--base-url", default=None, help="Drive this running server instead of seeding and starting one")
+    parser.add_argument("--output", default=None, help="Also write the JSON report here")
+    parser.add_argument("--compare", default=None, help="An earlier --output report to compare against")
+    parser.add_argument("--db", default=None, help="Scratch database path (default: a temp file)")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    parameters = {key: getattr(args, key) for key in ("slots", "locations", "bookings", "users", "duration", "warmup", "page_size", "mode", "seed")}
+    parameters.update(mix=mix, concurrency=levels)
+    report = {
+        "commit": git_commit(),
+        "started_at": datetime.datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "parameters": parameters,
+        "levels": [],
+    }
+
+    def run_levels(base_url: str):
+        for concurrency in levels:
+            print(f"BENCH: {concurrency} clients for {args.duration}s (+{args.warmup}s warmup)...")
+            result = asyncio.run(run_level(base_url, concurrency, args.duration, args.warmup, mix, args))
+            print(f"BENCH: {concurrency} clients: {result['requests_per_sec']} req/s, p99 {result['overall']['p99_ms']:.1f}ms, "
+                  f"{result['errors']} error(s)")
+            report["levels"].append(result)
+
+    if args.base_url:
+        report["parameters"]["base_url"] = args.base_url
+        run_levels(args.base_url)
+    else:
+        use_scratch_database(args.db)
+        print(f"BENCH: Seeding {args.slots} slots and {args.bookings} bookings...")
+        report["seed_s"] = round(seed(args.slots, args.bookings, args.locations, args.users, args.seed), 2)
+        started = time.perf_counter()
+        with running_server(args.mode, args.port, args.startup_timeout) as base_url:
+            report["server_startup_s"] = round(time.perf_counter() - started, 2)
+            run_levels(base_url)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
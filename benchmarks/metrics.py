@@ -0,0 +1,162 @@
+"""
+/metrics: what recording costs per request, and whether the numbers it serves are right.
+
+    python -m benchmarks.metrics --requests 2000 --slots 2000 --max-overhead-us 5
+
+Seeds a scratch database, then:
+  * times a counter increment, a histogram observation and one pass through MetricsMiddleware
+    around an ASGI app that does nothing; fails if the middleware adds more than
+    --max-overhead-us per request,
+  * sends --requests searches and a set of bookings (new, double-booked and unknown slots)
+    through the in-process transport, scrapes GET /metrics, checks every line parses as the
+    Prometheus text format, and that the search histogram count, booking results and free-slot
+    gauges match what was sent. Also prints the p99 the search histogram gives next to the
+    p99 measured on the client.
+"""
+import argparse
+import asyncio
+import math
+import os
+import re
+import time
+
+from .api_modes import LOCATIONS, seed
+from .common import percentiles, quiet_logs, use_scratch_database
+
+SAMPLE_LINE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*\})? (-?[0-9.e+-]+|\+Inf|NaN)$')
+
+
+def parse_metrics(text: str):
+    """{(name, frozenset of label pairs): value}; raises on a line that isn't valid exposition format."""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        if not SAMPLE_LINE.match(line):
+            raise ValueError(f"not Prometheus text format: {line!r}")
+        series, value = line.rsplit(" ", 1)
+        name, _, labels = series.partition("{")
+        pairs = frozenset(re.findall(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"', labels))
+        samples[(name, pairs)] = float(value)
+    return samples
+
+
+def histogram_quantile(q: float, buckets):
+    """Prometheus' histogram_quantile over [(upper bound, cumulative count)], linear within the bucket."""
+    total = buckets[-1][1]
+    rank = q * total
+    previous_bound, previous_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if math.isinf(bound):
+                return previous_bound
+            return previous_bound + (bound - previous_bound) * (rank - previous_count) / max(count - previous_count, 1)
+        previous_bound, previous_count = bound, count
+    return previous_bound
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--slots", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=200000, help="Calls per microbenchmark")
+    parser.add_argument("--max-overhead-us", type=float, default=5.0)
+    parser.add_argument("--db", default=None, help="Scratch database path (default: a temp file)")
+    args = parser.parse_args()
+
+    use_scratch_database(args.db)
+    os.environ["AGENT_API_TRANSPORT"] = "inprocess"
+    seed(args.slots, 200)
+
+    from agent.api_client import build_api_client
+    from observability.metrics import MetricsMiddleware, Registry
+
+    quiet_logs()
+
+    scratch = Registry()
+    counter = scratch.counter("bench_events", "Benchmark counter.", ("kind",))
+    histogram = scratch.histogram("bench_latency_seconds", "Benchmark histogram.", ("route",))
+    for label, call in (("counter.labels(...).inc()", lambda: counter.labels("a").inc()),
+                        ("histogram.labels(...).observe()", lambda: histogram.labels("/x").observe(0.0012))):
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            call()
+        print(f"{label:<34} {(time.perf_counter() - started) / args.iterations * 1e6:.3f}us")
+
+    async def noop_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    async def noop_send(message):
+        pass
+
+    async def time_app(app, n: int) -> float:
+        scope = {"type": "http", "method": "POST", "path": "/get-parking-spots/"}
+        started = time.perf_counter()
+        for _ in range(n):
+            await app(dict(scope), None, noop_send)
+        return (time.perf_counter() - started) / n
+
+    bare = asyncio.run(time_app(noop_app, args.iterations))
+    wrapped = asyncio.run(time_app(MetricsMiddleware(noop_app, registry=scratch), args.iterations))
+    overhead_us = (wrapped - bare) * 1e6
+    print(f"{'MetricsMiddleware per request':<34} {overhead_us:.3f}us (bare ASGI call {bare * 1e6:.3f}us)")
+
+    client = build_api_client("inprocess")
+    samples = []
+    for i in range(args.requests):
+        payload = {"vehicle_type": "car", "location": LOCATIONS[i % len(LOCATIONS)], "duration_hours": 1 + i % 4}
+        started = time.perf_counter()
+        client.post("/get-parking-spots/", json=payload).raise_for_status()
+        samples.append(time.perf_counter() - started)
+
+    free_before = [slot["id"] for slot in client.post("/get-parking-spots/", json={"vehicle_type": "car", "location": "Zone 01", "duration_hours": 1}).json()]
+    slot_ids = free_before[:5]
+    statuses = []
+    for slot_id in slot_ids + slot_ids[:3] + [10 ** 9]:
+        statuses.append(client.post("/book-parking/", json={"slot_id": slot_id, "user_id": "bench", "vehicle_number": "METRIC1",
+                                                            "duration_hours": 1}).status_code)
+
+    text = client.get("/metrics").text
+    try:
+        metrics = parse_metrics(text)
+    except ValueError as e:
+        raise SystemExit(f"FAIL: {e}")
+
+    def value(name, **labels):
+        return metrics.get((name, frozenset(labels.items())), 0.0)
+
+    route = {"method": "POST", "route": "/get-parking-spots/"}
+    buckets = sorted(((float(dict(key[1])["le"]), count) for key, count in metrics.items()
+                      if key[0] == "parking_http_request_duration_seconds_bucket" and set(route.items()) <= key[1]), key=lambda b: b[0])
+    search_count = value("parking_http_request_duration_seconds_count", **route)
+    results = {result: value("parking_bookings_total", result=result) for result in ("success", "conflict", "not_found")}
+    expected = {"success": statuses.count(200), "conflict": statuses.count(409), "not_found": statuses.count(400)}
+    free_at_zone_01 = value("parking_free_slots", vehicle_type="car", location="Zone 01")
+    expected_free = len(free_before) - expected["success"]
+    crud_spans = sorted({dict(key[1])["span"] for key in metrics if key[0] == "parking_span_duration_seconds_count"
+                         and dict(key[1])["span"].startswith("crud.")})
+
+    measured = percentiles(samples)
+    print(f"GET /metrics: {len(text.splitlines())} lines, {len(metrics)} samples")
+    print(f"POST /get-parking-spots/ count {search_count:.0f} (sent {args.requests + 1}); p99 from histogram "
+          f"{histogram_quantile(0.99, buckets) * 1000:.3f}ms, measured on the client {measured['p99_ms']:.3f}ms")
+    print(f"bookings by result {results} (expected {expected}); car slots free at Zone 01: {free_at_zone_01:.0f} (expected {expected_free})")
+    print(f"crud spans with latency histograms: {crud_spans}")
+
+    problems = []
+    if search_count != args.requests + 1:
+        problems.append("search request count")
+    if results != {k: float(v) for k, v in expected.items()}:
+        problems.append("booking results")
+    if free_at_zone_01 != expected_free:
+        problems.append("free slot gauge")
+    if "crud.search_available_slots" not in crud_spans:
+        problems.append("crud latency histograms")
+    if overhead_us > args.max_overhead_us:
+        problems.append(f"middleware overhead {overhead_us:.2f}us > {args.max_overhead_us}us")
+    if problems:
+        raise SystemExit(f"FAIL: {', '.join(problems)}")
+
+
+if __name__ == "__main__":
+    main()
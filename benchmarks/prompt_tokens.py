@@ -0,0 +1,165 @@
+"""
+Tokens per completed booking: what the agent sends to the LLM with the full vs compact system
+prompt, and with the old history handling (last 10 retrieved messages, whatever their size) vs
+the token-budgeted HistoryPacker.
+
+    python -m benchmarks.prompt_tokens --sessions 20 --prior-turns 6 --max-tokens-per-booking 45000
+
+No LLM is called. Each session replays a scripted conversation: --prior-turns earlier turns
+(searches whose replies list many slots, small talk), then a booking flow of three turns and
+five LLM calls (ask for details; SearchParkingSpots then the answer; BookParkingSpot then the
+confirmation). Tool outputs are real, from the tools on a seeded scratch database through the
+in-process transport; history goes through a temp NumPy store with local embeddings, as in
+the agent. For every LLM call the prompt is rebuilt as the agent would send it (system prompt,
+function schemas, chat history, input, scratchpad) and counted with tiktoken (or the
+4-characters-per-token estimate when its encoding files can't be downloaded). Completion tokens
+are the scripted replies and function calls.
+
+With --max-tokens-per-booking, fails if the configuration the agent runs with (PROMPT_VARIANT,
+HISTORY_TOKEN_BUDGET) exceeds it, so prompt growth shows up as a regression.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+
+from .api_modes import LOCATIONS, seed
+from .common import quiet_logs, use_scratch_database
+
+SMALL_TALK = [
+    ("Hi there!", "Hello! How can I help you with parking today?"),
+    ("Do you have EV charging spots?", "Some locations have EV charging slots. Tell me where, when and for how long, and I'll check."),
+    ("What's the price range usually?", "Prices depend on the location and slot type; I'll show the hourly price for each slot I find."),
+]
+
+
+def listing_reply(vehicle_type: str, location: str, date: str, duration: int, slots: list) -> str:
+    """The answer the prompt asks for after a search: every slot on its own line."""
+    lines = [f"For your {vehicle_type} at {location} on {date} for {duration} hours, I found these options:"]
+    lines += [f"Slot ID: {slot['id']}, Type: {slot['slot_type']}, Price: ${slot['price_per_hour']}/hr" for slot in slots]
+    lines.append("Would you like to book one of these? If so, please tell me the Slot ID and your vehicle registration number.")
+    return "\n".join(lines)
+
+
+class Turn:
+    def __init__(self, user: str, reply: str, tool_calls=()):
+        self.user = user
+        self.reply = reply
+        # (tool name, arguments, tool output) per tool call, each one extra LLM call.
+        self.tool_calls = list(tool_calls)
+
+
+def session_script(rng: random.Random, session_id: str, prior_turns: int, tools) -> list:
+    turns = []
+    for i in range(prior_turns):
+        if i % 2 == 0:
+            location = rng.choice(LOCATIONS)
+            args = {"vehicle_type": "car", "location": location, "duration_hours": rng.randint(1, 4), "date": "tomorrow"}
+            output = tools.search_parking_tool._run(**args)
+            slots = json.loads(output[output.index("["):]) if "[" in output else []
+            turns.append(Turn(f"Any car parking at {location} tomorrow for {args['duration_hours']} hours?",
+                              listing_reply("car", location, "tomorrow", args["duration_hours"], slots),
+                              [("SearchParkingSpots", args, output)]))
+        else:
+            turns.append(Turn(*rng.choice(SMALL_TALK)))
+
+    location, duration = rng.choice(LOCATIONS), rng.randint(1, 4)
+    turns.append(Turn("I need parking for my car.", "Sure! Which location, which date, and for how many hours?"))
+    search = {"vehicle_type": "car", "location": location, "duration_hours": duration, "date": "tomorrow"}
+    output = tools.search_parking_tool._run(**search)
+    slots = json.loads(output[output.index("["):])
+    turns.append(Turn(f"{location}, tomorrow, {duration} hours.", listing_reply("car", location, "tomorrow", duration, slots),
+                      [("SearchParkingSpots", search, output)]))
+    plate = f"KA{rng.randint(10, 99)}AB{rng.randint(1000, 9999)}"
+    booking = {"slot_id": slots[0]["id"], "user_id": session_id, "vehicle_number": plate, "duration_hours": duration, "date": "tomorrow"}
+    confirmation = tools.book_parking_tool._run(**booking)
+    turns.append(Turn(f"Book slot {slots[0]['id']} for {plate}.", confirmation, [("BookParkingSpot", booking, confirmation)]))
+    return turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--prior-turns", type=int, default=6)
+    parser.add_argument("--slots", type=int, default=3000)
+    parser.add_argument("--max-tokens-per-booking", type=int, default=None)
+    parser.add_argument("--db", default=None, help="Scratch database path (default: a temp file)")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="prompt_tokens_bench_")
+    use_scratch_database(args.db)
+    os.environ["AGENT_API_TRANSPORT"] = "inprocess"
+    os.environ["VECTOR_STORE_PATH"] = os.path.join(root, "vector_store")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(root, "embedding_cache")
+    seed(args.slots, 200)
+
+    from langchain_core.messages import AIMessage, FunctionMessage, HumanMessage, SystemMessage
+    from langchain_core.utils.function_calling import convert_to_openai_function
+
+    from agent import prompts, tools
+    from agent.token_budget import HistoryPacker, count_message_tokens, count_tokens, token_counter_name
+    from milvus_utils import vector_store
+    from milvus_utils.embedding_providers import get_embedding_provider
+
+    quiet_logs()
+    functions_tokens = sum(count_tokens(json.dumps(convert_to_openai_function(tool))) for tool in tools.list_of_tools)
+
+    def old_history(raw_history):
+        """What ParkingAgent sent before: the retrieved messages oldest first, the last 10, unclipped."""
+        messages = [HumanMessage(content=m["content"]) if m["role"] == "user" else AIMessage(content=m["content"])
+                    for m in reversed(raw_history) if m["role"] in ("user", "ai")]
+        return messages[-10:]
+
+    packer = HistoryPacker()
+    configs = {
+        "full prompt, last 10 messages (before)": (prompts.SYSTEM_PROMPT_TEMPLATE, old_history),
+        "full prompt, packed history": (prompts.SYSTEM_PROMPT_TEMPLATE, lambda raw: packer.pack(raw)[0]),
+        "compact prompt, packed history": (prompts.COMPACT_SYSTEM_PROMPT_TEMPLATE, lambda raw: packer.pack(raw)[0]),
+    }
+    current = f"{'compact' if prompts.PROMPT_VARIANT == 'compact' else 'full'} prompt, packed history"
+
+    rng = random.Random(13)
+    scripts = [(f"session-{i}", session_script(rng, f"session-{i}", args.prior_turns, tools)) for i in range(args.sessions)]
+    print(f"Counting with {token_counter_name()}; function schemas {functions_tokens} tokens, "
+          f"history budget {packer.budget} tokens, {args.sessions} bookings")
+
+    results = {}
+    for label, (template, history_for) in configs.items():
+        store = vector_store.NumpyVectorStore(provider=get_embedding_provider("local"), write_behind=False,
+                                              path=os.path.join(root, "vector_store", str(len(results))))
+        system = SystemMessage(content=template.replace("{session_id}", "session-x"))
+        prompt_tokens = completion_tokens = calls = history_tokens = 0
+        for session_id, turns in scripts:
+            for turn in turns:
+                history = history_for(store.get_relevant_history(session_id, turn.user, k=5, recent=5))
+                history_tokens += count_message_tokens(history) * (1 + len(turn.tool_calls))
+                scratchpad = []
+                for tool_name, tool_args, tool_output in turn.tool_calls:
+                    call = AIMessage(content="", additional_kwargs={"function_call": {"name": tool_name, "arguments": json.dumps(tool_args)}})
+                    prompt_tokens += functions_tokens + count_message_tokens([system, *history, HumanMessage(content=turn.user), *scratchpad])
+                    completion_tokens += count_tokens(tool_name) + count_tokens(json.dumps(tool_args))
+                    calls += 1
+                    # count_message_tokens only sees content; add the function call itself.
+                    scratchpad += [call, FunctionMessage(name=tool_name, content=tool_output)]
+                    prompt_tokens += count_tokens(json.dumps(tool_args))
+                prompt_tokens += functions_tokens + count_message_tokens([system, *history, HumanMessage(content=turn.user), *scratchpad])
+                completion_tokens += count_tokens(turn.reply)
+                calls += 1
+                store.add_conversation_history(session_id, turn.user, "user")
+                store.add_conversation_history(session_id, turn.reply, "ai")
+        results[label] = (prompt_tokens + completion_tokens) / args.sessions
+        print(f"{label:<42} prompt {prompt_tokens / args.sessions:>8.0f}  completion {completion_tokens / args.sessions:>6.0f}  "
+              f"total {results[label]:>8.0f} tokens per booking over {calls / args.sessions:.0f} LLM calls "
+              f"(history {history_tokens / calls:.0f} per call)")
+
+    before = results["full prompt, last 10 messages (before)"]
+    for label, total in results.items():
+        if total != before:
+            print(f"  {label}: {1 - total / before:.0%} fewer tokens than before")
+    if args.max_tokens_per_booking and results[current] > args.max_tokens_per_booking:
+        raise SystemExit(f"FAIL: {current} uses {results[current]:.0f} tokens per booking, over {args.max_tokens_per_booking}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Search result cache: hit rate and latency for repeated searches, and whether invalidation keeps
+cached results exactly equal to a fresh query.
+
+    python -m benchmarks.search_cache --slots 20000 --searches 5000 --distinct 200 --events 100
+
+Seeds a scratch database, then:
+  * replays --searches searches drawn (skewed, like users coming back to compare) from
+    --distinct distinct ones, through the /get-parking-spots/ endpoint on the in-process
+    transport, with the cache off (before) and on; reports latency and the hit rate,
+  * interleaves bookings (now and tomorrow), new slots and slot releases with cached searches,
+    and after each event checks every cached search against crud.find_available_slots. Partial
+    locations ("zone 0") are included, so the substring-matching invalidation is exercised.
+    Fails on any mismatch.
+"""
+import argparse
+import datetime
+import os
+import random
+import time
+
+from .api_modes import LOCATIONS, VEHICLE_TYPES, seed
+from .common import format_stats, percentiles, quiet_logs, use_scratch_database
+
+
+def distinct_searches(rng: random.Random, count: int):
+    locations = LOCATIONS + ["zone 0", "Zone 1", "zone"]
+    searches = set()
+    while len(searches) < count:
+        searches.add((rng.choice(VEHICLE_TYPES), rng.choice(locations), rng.choice([None, "tomorrow"]), rng.randint(1, 4)))
+    return [{"vehicle_type": vehicle_type, "location": location, "date": date, "duration_hours": duration}
+            for vehicle_type, location, date, duration in sorted(searches, key=str)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=20000)
+    parser.add_argument("--bookings", type=int, default=20000)
+    parser.add_argument("--searches", type=int, default=5000)
+    parser.add_argument("--distinct", type=int, default=200)
+    parser.add_argument("--events", type=int, default=100, help="Bookings/new slots/releases in the correctness check")
+    parser.add_argument("--db", default=None, help="Scratch database path (default: a temp file)")
+    args = parser.parse_args()
+
+    use_scratch_database(args.db)
+    os.environ["AGENT_API_TRANSPORT"] = "inprocess"
+    seed(args.slots, args.bookings)
+
+    from agent.api_client import build_api_client
+    from app import crud, schemas
+    from app.database import SessionLocal
+    from app.release_scheduler import release_scheduler
+    from app.search_cache import search_cache
+
+    quiet_logs()
+    client = build_api_client("inprocess")
+    rng = random.Random(5)
+    searches = distinct_searches(rng, args.distinct)
+    # Most repeats go to a few searches: weight i-th search by 1 / (i + 1).
+    workload = rng.choices(searches, weights=[1 / (i + 1) for i in range(len(searches))], k=args.searches)
+
+    ttl = search_cache.ttl_seconds
+    for label, cache_ttl in (("cache off (before)", 0), ("cache on", ttl)):
+        search_cache.ttl_seconds = cache_ttl
+        search_cache.clear()
+        hits_before, misses_before = search_cache.hits, search_cache.misses
+        samples = []
+        for payload in workload:
+            started = time.perf_counter()
+            client.post("/get-parking-spots/", json={k: v for k, v in payload.items() if v is not None}).raise_for_status()
+            samples.append(time.perf_counter() - started)
+        print(format_stats(f"POST /get-parking-spots/ {label}", percentiles(samples)))
+        if cache_ttl:
+            hits, misses = search_cache.hits - hits_before, search_cache.misses - misses_before
+            print(f"  hit rate {hits / (hits + misses):.1%} ({hits} hits, {misses} misses over {len(searches)} distinct searches)")
+
+    search_cache.ttl_seconds = ttl
+    search_cache.clear()
+    mismatches = 0
+    checked = 0
+    now_bookings = []
+
+    def check_all(db):
+        nonlocal mismatches, checked
+        for payload in searches:
+            params = schemas.ParkingSearchRequest(**payload)
+            # The search has no ORDER BY, so only the set of slots is compared.
+            cached = {slot.id for slot in crud.search_available_slots(db, params)}
+            fresh = {slot.id for slot in crud.find_available_slots(db, params)}
+            checked += 1
+            if cached != fresh:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"  MISMATCH for {payload}: {len(cached - fresh)} stale and {len(fresh - cached)} missing slot(s)")
+
+    with SessionLocal() as db:
+        check_all(db)
+        for event in range(args.events):
+            kind = event % 4
+            if kind in (0, 1):
+                # Book a slot a cached search returned, so there is something to invalidate.
+                payload = rng.choice(searches)
+                found = crud.search_available_slots(db, schemas.ParkingSearchRequest(**payload))
+                if found:
+                    booking = schemas.BookingCreate(slot_id=rng.choice(found).id, user_id="bench", vehicle_number="CACHE1",
+                                                    duration_hours=1, date=None if kind == 0 else "tomorrow")
+                    try:
+                        created = crud.create_booking(db, booking)
+                        if kind == 0 and created is not None:
+                            now_bookings.append(created.slot_id)
+                    except crud.BookingConflictError:
+                        pass
+            elif kind == 2:
+                crud.create_parking_slot(db, schemas.ParkingSlotCreate(
+                    location=rng.choice(LOCATIONS), slot_type="open", vehicle_type=rng.choice(VEHICLE_TYPES), price_per_hour=2.0))
+            elif now_bookings:
+                # Jump past the end of the "now" bookings so the scheduler releases their slots.
+                release_scheduler.release_due(now=datetime.datetime.utcnow() + datetime.timedelta(hours=2))
+                now_bookings.clear()
+            db.expire_all()
+            check_all(db)
+
+    stats = search_cache.stats()
+    print(f"invalidation check: {args.events} events, {checked} cached-vs-fresh comparisons, {mismatches} mismatches; "
+          f"{stats['invalidations']} invalidations dropped {stats['invalidated_entries']} entries")
+    if mismatches:
+        raise SystemExit(f"FAIL: {mismatches} cached searches differed from a fresh query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Per-session history retrieval across many sessions: the old collection layout vs the new one.
+
+    python -m benchmarks.session_history --sessions 10000 --messages 10 --dim 128
+
+Needs Milvus Lite; data goes to a temp MILVUS_DATA_PATH. Loads the same --sessions x --messages
+vectors into two collections:
+  * legacy: no partition key, IVF_FLAT (nlist 128, nprobe 10), as collections were created before,
+  * current: what MilvusService creates now, session_id partition key and a FLAT index,
+and runs get_relevant_history for random sessions against each. Reports latency and recall@k
+against an exact NumPy search of that session's vectors, plus the latency of the recency-aware
+mode (first lookup for a session, and later turns). --dim defaults below the real 1536 to keep memory modest; recall doesn't depend on it.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from .common import format_stats, percentiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=10, help="Messages per session")
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ["MILVUS_DATA_PATH"] = tempfile.mkdtemp(prefix="milvus_bench_")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(os.environ["MILVUS_DATA_PATH"], "embedding_cache")
+
+    from pymilvus import Collection, CollectionSchema, DataType, FieldSchema
+
+    from milvus_utils import milvus_connector as mc
+    from milvus_utils.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+    from .embedding_cache import SlowEmbedder
+
+    embedder = SlowEmbedder(0, dimension=args.dim)
+    service = mc.MilvusService(provider=embedder, write_behind=False)
+    service.embeddings_model = CachedEmbeddings(embedder, EmbeddingCache(args.dim, "bench", path=None))
+
+    legacy = Collection("parking_conversations_legacy", CollectionSchema([
+        FieldSchema(name=mc.ID_FIELD_NAME, dtype=DataType.INT64, is_primary=True, auto_id=True),
+        FieldSchema(name=mc.SESSION_ID_FIELD_NAME, dtype=DataType.VARCHAR, max_length=255),
+        FieldSchema(name=mc.TEXT_FIELD_NAME, dtype=DataType.VARCHAR, max_length=65535),
+        FieldSchema(name=mc.ROLE_FIELD_NAME, dtype=DataType.VARCHAR, max_length=10),
+        FieldSchema(name=mc.INDEX_FIELD_NAME, dtype=DataType.FLOAT_VECTOR, dim=args.dim),
+    ]))
+    current = service.collection
+
+    total = args.sessions * args.messages
+    session_ids = [f"session-{i % args.sessions}" for i in range(total)]
+    texts = [f"message {i}" for i in range(total)]
+    vectors = np.asarray(embedder.embed_documents(texts), dtype=np.float32)
+    for name, collection in (("legacy", legacy), ("current", current)):
+        started = time.perf_counter()
+        for offset in range(0, total, 10000):
+            end = min(offset + 10000, total)
+            collection.insert([session_ids[offset:end], texts[offset:end], ["user"] * (end - offset), vectors[offset:end].tolist()])
+        collection.flush()
+        if name == "legacy":
+            collection.create_index(mc.INDEX_FIELD_NAME, {"metric_type": mc.METRIC_TYPE, "index_type": "IVF_FLAT", "params": {"nlist": 128}})
+        collection.load()
+        print(f"BENCH: Loaded {total} messages for {args.sessions} sessions into {name} in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(7)
+    queries = [(rng.randrange(args.sessions), f"query {i}") for i in range(args.queries)]
+    def run(label, recent):
+        latencies, recalls = [], []
+        for session, query in queries:
+            started = time.perf_counter()
+            found = service.get_relevant_history(f"session-{session}", query, k=args.k, recent=recent)
+            latencies.append(time.perf_counter() - started)
+            rows = np.arange(session, total, args.sessions)
+            distances = ((vectors[rows] - np.asarray(embedder.embed_query(query), dtype=np.float32)) ** 2).sum(axis=1)
+            truth = {texts[row] for row in rows[np.argsort(distances)[:args.k]]}
+            recalls.append(len(truth & {item["content"] for item in found}) / args.k)
+        print(format_stats(label, percentiles(latencies)) + f" recall@{args.k}={np.mean(recalls):.2f}")
+
+    for name, collection in (("legacy", legacy), ("current", current)):
+        service.collection = collection
+        service._recent.clear()
+        run(name, 0)
+        # The first recency lookup per session reads its last turns from Milvus; later turns reuse them.
+        run(f"{name} + recent 4, first turn", 4)
+        run(f"{name} + recent 4, later turns", 4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Inventory mirroring: OFFSET paging vs keyset paging vs the NDJSON export.
+
+    python -m benchmarks.slot_export --slots 500000
+
+Times a page of /parking-slots/ at increasing depths with the old OFFSET query and the
+keyset query. Then measures the export generator's peak Python memory (tracemalloc) and
+mirrors the whole table through GET /parking-slots/export, checking every slot comes back
+exactly once and in order. TestClient buffers the response body, so the memory figure is
+taken from the generator the endpoint streams, not from the HTTP round trip.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from .common import format_stats, percentiles, time_calls, use_scratch_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=500_000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--db", default=None, help="Scratch database path (default: a temp file)")
+    args = parser.parse_args()
+
+    use_scratch_database(args.db)
+
+    from app import crud, models
+    from app.bulk_import import import_slot_dicts
+    from app.database import SessionLocal, create_db_and_tables
+
+    create_db_and_tables()
+    started = time.perf_counter()
+    import_slot_dicts(
+        {"location": f"Zone {i % 300}", "slot_type": "open", "vehicle_type": "car", "price_per_hour": 2.0}
+        for i in range(args.slots)
+    )
+    print(f"BENCH: Inserted {args.slots} slots in {time.perf_counter() - started:.2f}s")
+
+    with SessionLocal() as db:
+        for depth in (0.0, 0.5, 0.99):
+            skip = int(args.slots * depth)
+            offset_stats = percentiles(time_calls(
+                lambda i: db.query(models.ParkingSlot).offset(skip).limit(args.page_size).all(), args.repeat))
+            cursor = crud.encode_slot_cursor(models.ParkingSlot(id=skip)) if skip else None
+            keyset_stats = percentiles(time_calls(
+                lambda i: crud.get_parking_slots_page(db, limit=args.page_size, cursor=cursor), args.repeat))
+            print(format_stats(f"offset page at row {skip}", offset_stats))
+            print(format_stats(f"keyset page at row {skip}", keyset_stats))
+
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    tracemalloc.start()
+    for _ in crud.export_slots_ndjson():
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"export generator: peak Python memory {peak / 2**20:.2f} MiB for {args.slots} slots")
+
+    client = TestClient(app)
+    seen = 0
+    last_id = 0
+    started = time.perf_counter()
+    with client.stream("GET", "/parking-slots/export") as response:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            slot_id = json.loads(line)["id"]
+            assert slot_id > last_id, f"export out of order at id {slot_id}"
+            last_id = slot_id
+            seen += 1
+    elapsed = time.perf_counter() - started
+    print(f"GET /parking-slots/export: {seen} slots in {elapsed:.2f}s ({seen / elapsed:,.0f} rows/s)")
+    if seen != args.slots:
+        raise SystemExit(f"FAIL: export returned {seen} slots, expected {args.slots}")
+
+
+if __name__ == "__main__":
+    main()
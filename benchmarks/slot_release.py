@@ -0,0 +1,124 @@
+"""
+Throughput and lag of the slot release scheduler.
+
+    python -m benchmarks.slot_release --bookings 20000 --future 2000 --window 10
+
+Seeds --bookings taken slots whose bookings end spread evenly over the next --window seconds
+(20000 over 10s is 120k expirations a minute), and --future free slots with future-dated
+bookings that start over the first half of the window and end after it. Half of those are in
+the table at the startup rebuild, the other half are scheduled afterwards the way
+crud.record_booking does. Starts the scheduler, checks once every future booking has started
+that its slot is taken, then waits for everything to end. Reports SQL statements issued, lag
+and whether every slot came back; exits non-zero if a future booking's slot wasn't taken in
+time, any slot is still taken at the end, or the location index's free counts disagree with
+the table.
+"""
+import argparse
+import datetime
+import time
+
+from .common import QueryCounter, quiet_logs, use_scratch_database
+
+# How long after the last future booking starts the scheduler gets to take its slot.
+TAKE_DEADLINE_SECONDS = 1.8
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bookings", type=int, default=20000)
+    parser.add_argument("--future", type=int, default=2000, help="Future-dated bookings, on slots of their own")
+    parser.add_argument("--window", type=float, default=10.0)
+    parser.add_argument("--db", default=None, help="Scratch database path (default: a temp file)")
+    args = parser.parse_args()
+
+    use_scratch_database(args.db)
+
+    from app import models
+    from app.availability import LocationAvailabilityIndex, location_index
+    from app.database import SessionLocal, create_db_and_tables, engine
+    from app.release_scheduler import release_scheduler
+
+    quiet_logs()
+    create_db_and_tables()
+    now = datetime.datetime.utcnow()
+    # Leave a couple of seconds for seeding and the startup rebuild before the first expiry.
+    first_end = now + datetime.timedelta(seconds=2)
+    step = args.window / args.bookings
+    future_step = args.window / 2 / max(args.future, 1)
+    # Future bookings end well after the take check, so it sees all of them in progress.
+    future_hold = datetime.timedelta(seconds=args.window / 2 + 3)
+    future = [(args.bookings + i + 1, first_end + datetime.timedelta(seconds=i * future_step)) for i in range(args.future)]
+    # Odd ones are booked after startup: not in the table at the rebuild, scheduled like record_booking does.
+    booked_before, booked_later = future[0::2], future[1::2]
+
+    def future_rows(bookings):
+        return [{"slot_id": slot_id, "user_id": "future", "vehicle_number": "FUTURE", "start_time": start,
+                 "end_time": start + future_hold, "duration_hours": 1, "total_cost": 2.0, "is_confirmed": True}
+                for slot_id, start in bookings]
+
+    with engine.begin() as conn:
+        conn.execute(models.ParkingSlot.__table__.insert(), [
+            {"location": f"Zone {i % 50}", "slot_type": "open", "vehicle_type": "car", "is_available": i >= args.bookings, "price_per_hour": 2.0}
+            for i in range(args.bookings + args.future)
+        ])
+        conn.execute(models.Booking.__table__.insert(), [
+            {"slot_id": i + 1, "user_id": f"user-{i}", "vehicle_number": "BENCH",
+             "start_time": now - datetime.timedelta(hours=1), "end_time": first_end + datetime.timedelta(seconds=i * step),
+             "duration_hours": 1, "total_cost": 2.0, "is_confirmed": True}
+            for i in range(args.bookings)
+        ] + future_rows(booked_before))
+    with SessionLocal() as db:
+        release_scheduler.rebuild(db)
+        location_index.rebuild(db)
+    if booked_later:
+        with engine.begin() as conn:
+            conn.execute(models.Booking.__table__.insert(), future_rows(booked_later))
+    for slot_id, start in booked_later:
+        release_scheduler.schedule_start(slot_id, start, start + future_hold)
+    print(f"BENCH: {args.bookings} bookings ending over {args.window}s "
+          f"({args.bookings / args.window * 60:,.0f} expirations/minute), {args.future} starting over {args.window / 2}s")
+
+    def index_mismatches() -> int:
+        with SessionLocal() as db:
+            table = LocationAvailabilityIndex()
+            table.rebuild(db)
+        expected, actual = table.snapshot(), location_index.snapshot()
+        return sum(1 for key in set(actual) | set(expected) if actual.get(key, 0) != expected.get(key, 0))
+
+    future_ids = ",".join(str(slot_id) for slot_id, _ in future) or "0"
+    with QueryCounter(engine) as counter:
+        release_scheduler.start()
+        last_start = future[-1][1] if future else first_end
+        time.sleep(max(0.0, (last_start - datetime.datetime.utcnow()).total_seconds() + TAKE_DEADLINE_SECONDS))
+        with engine.connect() as conn:
+            future_taken = conn.exec_driver_sql(f"SELECT count(*) FROM parking_slots WHERE is_available = 0 AND id IN ({future_ids})").scalar()
+        mid_mismatches = index_mismatches()
+        deadline = time.monotonic() + args.window + future_hold.total_seconds() + 5
+        while len(release_scheduler) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        # Let the final batch commit.
+        time.sleep(0.5)
+        release_scheduler.stop()
+
+    with engine.connect() as conn:
+        still_taken = conn.exec_driver_sql("SELECT count(*) FROM parking_slots WHERE is_available = 0").scalar()
+    end_mismatches = index_mismatches()
+    stats = release_scheduler.stats()
+    print(f"released {stats['released_total']} and took {stats['taken_total']} slot(s) in {stats['batches_total']} batch(es) "
+          f"using {counter.count} SQL statement(s); {still_taken} still taken")
+    print(f"future bookings: {future_taken} of {args.future} slot(s) taken {TAKE_DEADLINE_SECONDS}s after the last one started")
+    print(f"location index groups disagreeing with the table: {mid_mismatches} mid-run, {end_mismatches} at the end")
+    print(f"lag: mean {stats['mean_lag_seconds'] * 1000:.1f}ms, max {stats['max_lag_seconds'] * 1000:.1f}ms")
+    problems = []
+    if future_taken != args.future:
+        problems.append(f"{args.future - future_taken} future booking(s) never took their slot")
+    if still_taken:
+        problems.append(f"{still_taken} slot(s) were never released")
+    if mid_mismatches or end_mismatches:
+        problems.append("location index free counts drifted from is_available")
+    if problems:
+        raise SystemExit(f"FAIL: {', '.join(problems)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Before/after benchmark for the slot search filter.
+
+    python -m benchmarks.slot_search --slots 1000000
+
+"before" is the original ILIKE filter (lower() on every row plus a leading-wildcard LIKE,
+so a full table scan). "after" is the normalized *_key columns with the composite lookup
+index plus the FTS5 trigram location index, i.e. what crud.find_available_slots runs now.
+Both return the same rows; the script checks that before timing.
+"""
+import argparse
+import random
+import time
+
+from sqlalchemy import text
+
+from .common import format_stats, percentiles, time_calls, use_scratch_database
+
+VEHICLE_TYPES = ["Car", "SUV", "two-wheeler"]
+SLOT_TYPES = ["covered", "Open", "ev_charging", "long-term"]
+AREAS = ["Downtown", "Airport", "Tech Park", "Harbour", "Old Town", "University", "Stadium", "Riverside"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=1_000_000)
+    parser.add_argument("--locations", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--db", default=None, help="Scratch database path (default: a temp file)")
+    args = parser.parse_args()
+
+    use_scratch_database(args.db)
+
+    from app import crud, database, models
+    from app.database import SessionLocal, create_db_and_tables, engine
+
+    create_db_and_tables()
+    rng = random.Random(11)
+    locations = [f"{AREAS[i % len(AREAS)]} Block {i:04d}" for i in range(args.locations)]
+
+    started = time.perf_counter()
+    batch = 50_000
+    for offset in range(0, args.slots, batch):
+        with engine.begin() as conn:
+            conn.execute(models.ParkingSlot.__table__.insert(), [
+                {
+                    "location": locations[rng.randrange(args.locations)],
+                    "slot_type": rng.choice(SLOT_TYPES),
+                    "vehicle_type": rng.choice(VEHICLE_TYPES),
+                    "is_available": rng.random() < 0.8,
+                    "price_per_hour": 2.0 + (i % 7),
+                }
+                for i in range(offset, min(offset + batch, args.slots))
+            ])
+    print(f"BENCH: Inserted {args.slots} slots (with FTS triggers) in {time.perf_counter() - started:.2f}s")
+    database.refresh_planner_stats()
+    print(f"BENCH: FTS5 location index enabled: {database.location_search_enabled}")
+
+    Slot = models.ParkingSlot
+    db = SessionLocal()
+
+    def params(i):
+        rng_i = random.Random(i)
+        vehicle_type = rng_i.choice(VEHICLE_TYPES).upper()
+        location = rng_i.choice(locations)
+        # Users type partial, oddly-cased names: "block 0412", "downtown block 04"...
+        location = location[rng_i.randrange(0, 6):].lower()
+        slot_type = rng_i.choice(SLOT_TYPES + [None])
+        return vehicle_type, location, slot_type
+
+    def before(i):
+        vehicle_type, location, slot_type = params(i)
+        query = db.query(Slot).filter(
+            Slot.is_available == True,
+            Slot.vehicle_type.ilike(vehicle_type),
+            Slot.location.ilike(f"%{location}%"),
+        )
+        if slot_type:
+            query = query.filter(Slot.slot_type.ilike(slot_type))
+        return query.all()
+
+    def after(i):
+        vehicle_type, location, slot_type = params(i)
+        query = db.query(Slot).filter(
+            Slot.is_available == True,
+            Slot.vehicle_type_key == models.normalize_key(vehicle_type),
+            crud._location_matches(location),
+        )
+        if slot_type:
+            query = query.filter(Slot.slot_type_key == models.normalize_key(slot_type))
+        return query.all()
+
+    for i in range(20):
+        assert {s.id for s in before(i)} == {s.id for s in after(i)}, f"result mismatch for {params(i)}"
+
+    print(format_stats("before: ILIKE scan", percentiles(time_calls(before, max(args.queries // 10, 5)))))
+    print(format_stats("after: key index + FTS5 trigram", percentiles(time_calls(after, args.queries))))
+
+    query = db.query(Slot).filter(Slot.vehicle_type_key == "car", crud._location_matches("block 0042"))
+    sql = str(query.statement.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        print("\nEXPLAIN QUERY PLAN (after):")
+        for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")):
+            print("   ", row[-1])
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
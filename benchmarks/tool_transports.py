@@ -0,0 +1,113 @@
+"""
+Latency of the agent's tool calls for each way of reaching the parking API.
+
+    python -m benchmarks.tool_transports --calls 300 --slots 2000
+
+Seeds a scratch database and starts uvicorn on it in a subprocess, then runs the real
+SearchParkingSpots and GetAvailableLocationsForVehicle tools --calls times each through:
+  * per-call httpx (before): httpx.post/httpx.get, a new TCP connection per call,
+  * pooled http: the shared keep-alive client (AGENT_API_TRANSPORT=http),
+  * in-process: the ASGI transport into app.main in this process (AGENT_API_TRANSPORT=inprocess),
+and, as a floor, crud.find_available_slots called directly with a session.
+"""
+import argparse
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+from .api_modes import LOCATIONS, VEHICLE_TYPES, seed
+from .common import format_stats, percentiles, quiet_logs, use_scratch_database
+
+
+def search_payload(rng: random.Random) -> dict:
+    return {"vehicle_type": rng.choice(VEHICLE_TYPES), "location": rng.choice(LOCATIONS),
+            "duration_hours": rng.randint(1, 4), "date": "tomorrow"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--slots", type=int, default=2000)
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--port", type=int, default=8775)
+    parser.add_argument("--db", default=None, help="Scratch database path (default: a temp file)")
+    args = parser.parse_args()
+
+    use_scratch_database(args.db)
+    seed(args.slots, args.bookings)
+
+    from agent import api_client, tools
+
+    quiet_logs()
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning", "--no-access-log"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        for _ in range(100):
+            try:
+                if httpx.get(f"{base_url}/health").status_code == 200:
+                    break
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        else:
+            raise RuntimeError(f"server did not start on port {args.port}")
+
+        rng = random.Random(7)
+        samples = {"search": [], "locations": []}
+        for _ in range(args.calls):
+            started = time.perf_counter()
+            httpx.post(f"{base_url}/get-parking-spots/", json=search_payload(rng)).raise_for_status()
+            samples["search"].append(time.perf_counter() - started)
+            started = time.perf_counter()
+            httpx.get(f"{base_url}/get-available-locations-for-vehicle/", params={"vehicle_type": rng.choice(VEHICLE_TYPES)}).raise_for_status()
+            samples["locations"].append(time.perf_counter() - started)
+        for kind, kind_samples in samples.items():
+            print(format_stats(f"per-call httpx (before) {kind}", percentiles(kind_samples)))
+
+        api_client.API_BASE_URL = base_url
+        for transport in ("http", "inprocess"):
+            api_client._client = api_client.build_api_client(transport)
+            rng = random.Random(7)
+            samples = {"search": [], "locations": []}
+            for call in range(args.calls + 10):
+                payload = search_payload(rng)
+                started = time.perf_counter()
+                output = tools.search_parking_tool._run(**payload)
+                searched = time.perf_counter() - started
+                started = time.perf_counter()
+                tools.get_available_locations_tool._run(vehicle_type=rng.choice(VEHICLE_TYPES))
+                located = time.perf_counter() - started
+                if "error" in output.lower():
+                    raise SystemExit(f"FAIL: {transport} search returned an error: {output}")
+                # The first calls open the pool / build the app's caches; leave them out.
+                if call >= 10:
+                    samples["search"].append(searched)
+                    samples["locations"].append(located)
+            for kind, kind_samples in samples.items():
+                print(format_stats(f"{transport} tool {kind}", percentiles(kind_samples)))
+            api_client._client.close()
+    finally:
+        server.terminate()
+        server.wait()
+
+    from app import crud, schemas
+    from app.database import SessionLocal
+
+    rng = random.Random(7)
+    samples = []
+    for _ in range(args.calls):
+        request = schemas.ParkingSearchRequest(**search_payload(rng))
+        started = time.perf_counter()
+        with SessionLocal() as db:
+            crud.find_available_slots(db, search_params=request)
+        samples.append(time.perf_counter() - started)
+    print(format_stats("crud.find_available_slots (floor)", percentiles(samples)))
+
+
+if __name__ == "__main__":
+    main()
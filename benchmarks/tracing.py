@@ -0,0 +1,113 @@
+"""
+Tracing: what a span costs, what exporting costs on a tool call, and whether one user turn ends
+up as one connected trace.
+
+    python -m benchmarks.tracing --spans 100000 --calls 300 --slots 2000
+
+Seeds a scratch database and exports spans to a temp JSONL file (TRACE_EXPORT_PATH), then:
+  * times an empty span() block, with the exporter off and on,
+  * times SearchParkingSpots tool calls through the in-process transport with the exporter off
+    (spans are still created) and on,
+  * replays one turn under a "ui.turn" root span: history lookup and write on a temp NumPy
+    store with local embeddings, an LLM call (a fake chat model with the agent's
+    TokenUsageCallback), a search and a booking through the tools. Reads the JSONL back and
+    fails unless the turn's spans share one trace id, every parent is in the trace, and the
+    tool -> API -> crud chain, embeddings, vector store and LLM spans are all there.
+No OpenAI key or Milvus is needed.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from .api_modes import seed
+from .common import format_stats, percentiles, quiet_logs, use_scratch_database
+
+EXPECTED_SPANS = {
+    "ui.turn", "embedding.embed_query", "milvus.search", "milvus.insert", "llm.call",
+    "tool.call", "http.request", "crud.search_available_slots", "crud.create_booking",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spans", type=int, default=100000)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--slots", type=int, default=2000)
+    parser.add_argument("--db", default=None, help="Scratch database path (default: a temp file)")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="tracing_bench_")
+    trace_path = os.path.join(root, "traces.jsonl")
+    use_scratch_database(args.db)
+    os.environ["AGENT_API_TRANSPORT"] = "inprocess"
+    os.environ["TRACE_EXPORT_PATH"] = trace_path
+    os.environ["VECTOR_STORE_PATH"] = os.path.join(root, "vector_store")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(root, "embedding_cache")
+    seed(args.slots, 200)
+
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    from agent import tools
+    from agent.token_budget import TokenUsageCallback
+    from milvus_utils.embedding_providers import get_embedding_provider
+    from milvus_utils.vector_store import NumpyVectorStore
+    from observability.tracing import exporter, span
+
+    quiet_logs()
+
+    for label, path in (("exporter off", ""), ("exporter on", trace_path)):
+        exporter.path = path
+        started = time.perf_counter()
+        for _ in range(args.spans):
+            with span("bench.empty"):
+                pass
+        elapsed = time.perf_counter() - started
+        print(f"empty span, {label:<13} {elapsed / args.spans * 1e6:.2f}us per span")
+    exporter.flush()
+
+    search = {"vehicle_type": "car", "location": "Zone 07", "duration_hours": 2, "date": "tomorrow"}
+    tools.search_parking_tool._run(**search)
+    for label, path in (("exporter off", ""), ("exporter on", trace_path)):
+        exporter.path = path
+        samples = []
+        for _ in range(args.calls):
+            started = time.perf_counter()
+            tools.search_parking_tool._run(**search)
+            samples.append(time.perf_counter() - started)
+        print(format_stats(f"SearchParkingSpots, {label}", percentiles(samples)))
+    exporter.flush()
+
+    store = NumpyVectorStore(provider=get_embedding_provider("local"), write_behind=False, path=os.path.join(root, "vector_store"))
+    llm = FakeListChatModel(responses=["Slot 12 at Zone 07 is free tomorrow. Shall I book it?"])
+    with span("ui.turn", session_id="user-7") as turn:
+        store.get_relevant_history("user-7", "car parking at Zone 07 tomorrow", k=5, recent=5)
+        llm.invoke("car parking at Zone 07 tomorrow", config={"callbacks": [TokenUsageCallback()]})
+        output = tools.search_parking_tool._run(**search)
+        slots = json.loads(output[output.index("["):])
+        tools.book_parking_tool._run(slot_id=slots[0]["id"], user_id="user-7", vehicle_number="KA01AB1234", duration_hours=2, date="tomorrow")
+        store.add_conversation_history("user-7", "book the first one", "user")
+    if not exporter.flush():
+        raise SystemExit("FAIL: the exporter didn't write the spans in time")
+
+    with open(trace_path) as f:
+        spans = [json.loads(line) for line in f]
+    trace = [s for s in spans if s["trace_id"] == turn.trace_id]
+    ids = {s["span_id"] for s in trace}
+    orphans = [s["name"] for s in trace if s["parent_id"] is not None and s["parent_id"] not in ids]
+    missing = EXPECTED_SPANS - {s["name"] for s in trace}
+    crud_under_api = all(
+        next(p for p in trace if p["span_id"] == s["parent_id"])["name"] in ("http.request", "crud.search_available_slots")
+        for s in trace if s["name"].startswith("crud.")
+    )
+    print(f"{len(spans)} span(s) exported to {trace_path}; the turn's trace has {len(trace)}:")
+    for s in sorted(trace, key=lambda s: s["start_time"]):
+        print(f"  {s['name']:<32} {s['duration_ms']:>8.3f}ms  {json.dumps(s['attributes'], default=str)[:90]}")
+    if missing or orphans or not crud_under_api:
+        raise SystemExit(f"FAIL: missing spans {sorted(missing)}, spans with a parent outside the trace {orphans}, "
+                         f"crud spans under the API request: {crud_under_api}")
+
+
+if __name__ == "__main__":
+    main()
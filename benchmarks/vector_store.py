@@ -0,0 +1,167 @@
+"""
+NumpyVectorStore vs MilvusService: result parity, query latency, startup time and memory.
+
+    python -m benchmarks.vector_store --sessions 2000 --messages 20 --queries 500
+
+Needs Milvus Lite; both stores write to a temp directory. Embeddings come from the stand-in
+embedder in benchmarks.embedding_cache (--dim), so no OpenAI key is used. Loads the same
+--sessions x --messages conversation into both stores, then:
+  * parity: get_relevant_history (plain and recency mode) for --queries random sessions must
+    return the same messages in the same order from both; exits non-zero otherwise. In plain
+    mode a difference is accepted only where distances tie to float32 precision.
+  * latency of get_relevant_history for each store,
+  * startup and memory: a fresh process opens each store and runs one query; reports the time
+    from launch until the store is ready and the resident memory of the process plus its
+    children (Milvus Lite runs a server process), read from /proc, so Linux only.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from .common import format_stats, percentiles
+
+STARTUP_SCRIPT = """
+import json, os, sys, time
+started = time.perf_counter()
+from milvus_utils.vector_store import get_history_store
+store = get_history_store(sys.argv[1], write_behind=False)
+ready = time.perf_counter() - started
+store.get_relevant_history("session-0", "parking near Zone 3", k=5)
+print(json.dumps({"startup_seconds": ready}))
+"""
+
+
+def rss_bytes(pid: int) -> int:
+    """Resident memory of a process and all its descendants."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except OSError:
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        stack.extend(children.get(current, []))
+        try:
+            with open(f"/proc/{current}/status") as f:
+                total += next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            pass
+    return total
+
+
+def measure_startup(kind: str):
+    """Starts a process that opens the store and queries it once; samples its memory while it runs."""
+    process = subprocess.Popen([sys.executable, "-c", STARTUP_SCRIPT, kind], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    peak = 0
+    while process.poll() is None:
+        peak = max(peak, rss_bytes(process.pid))
+        time.sleep(0.05)
+    output = process.stdout.read().strip().splitlines()
+    if process.returncode != 0 or not output:
+        raise SystemExit(f"FAIL: the {kind} startup process exited with {process.returncode}")
+    return json.loads(output[-1])["startup_seconds"], peak
+
+
+def same_results(a, b, query_vector, vectors_by_text, recent: int) -> bool:
+    if a == b:
+        return True
+    if recent:
+        return False
+    # Different messages or order are fine only where distances tie to float32 precision.
+    def distances(results):
+        return [float(((vectors_by_text[m["content"]] - query_vector) ** 2).sum()) for m in results]
+    return len(a) == len(b) and np.allclose(distances(a), distances(b), rtol=1e-5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=20, help="Messages per session")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="vector_store_bench_")
+    os.environ["MILVUS_DATA_PATH"] = os.path.join(root, "milvus")
+    os.environ["VECTOR_STORE_PATH"] = os.path.join(root, "numpy")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(root, "embedding_cache")
+    os.environ["EMBEDDING_PROVIDER"] = "local"
+    os.environ["LOCAL_EMBEDDING_DIMENSION"] = str(args.dim)
+
+    from pymilvus import connections
+
+    from milvus_utils.vector_store import get_history_store
+
+    from .embedding_cache import SlowEmbedder
+
+    # Random vectors rather than the hashing encoder: similar texts hash to exactly tied
+    # distances, and the two stores are free to break ties differently.
+    provider = SlowEmbedder(0, dimension=args.dim)
+    stores = {kind: get_history_store(kind, provider=provider, write_behind=False) for kind in ("milvus", "numpy")}
+
+    rng = random.Random(11)
+    total = args.sessions * args.messages
+    session_ids = [f"session-{i % args.sessions}" for i in range(total)]
+    roles = ["user" if (i // args.sessions) % 2 == 0 else "ai" for i in range(total)]
+    texts = [f"{role} message {i}: parking near Zone {rng.randrange(50)} for {rng.randrange(1, 9)} hours"
+             for i, role in enumerate(roles)]
+    vectors = provider.embed_documents(texts)
+    started = time.perf_counter()
+    for kind, store in stores.items():
+        load_started = time.perf_counter()
+        for i in range(0, total, 2000):
+            store._insert_rows(session_ids[i:i + 2000], texts[i:i + 2000], roles[i:i + 2000], vectors[i:i + 2000])
+        print(f"BENCH: loaded {total} messages into {kind} in {time.perf_counter() - load_started:.2f}s")
+
+    vectors_by_text = {text: np.asarray(vector, dtype=np.float32) for text, vector in zip(texts, vectors)}
+    queries = [(f"session-{rng.randrange(args.sessions)}", f"parking near Zone {rng.randrange(50)} for {rng.randrange(1, 9)} hours")
+               for _ in range(args.queries)]
+    samples = {kind: [] for kind in stores}
+    mismatches = 0
+    for session_id, query in queries:
+        query_vector = np.asarray(provider.embed_query(query), dtype=np.float32)
+        for recent in (0, 3):
+            results = {}
+            for kind, store in stores.items():
+                call_started = time.perf_counter()
+                results[kind] = store.get_relevant_history(session_id, query, k=args.k, recent=recent)
+                if recent == 0:
+                    samples[kind].append(time.perf_counter() - call_started)
+            if not same_results(results["milvus"], results["numpy"], query_vector, vectors_by_text, recent):
+                mismatches += 1
+                if mismatches <= 3:
+                    print(f"MISMATCH {session_id} {query!r} recent={recent}:\n  milvus {results['milvus']}\n  numpy  {results['numpy']}")
+
+    for kind in stores:
+        print(format_stats(f"{kind}: get_relevant_history", percentiles(samples[kind])))
+    print(f"parity: {mismatches} mismatch(es) over {len(queries) * 2} lookups")
+
+    for store in stores.values():
+        store.close()
+    connections.disconnect("default")
+    # Stop this process's Milvus Lite server so the startup process can take the data directory lock.
+    from milvus_lite.server_manager import server_manager_instance
+    server_manager_instance.release_all()
+    for kind in stores:
+        startup, peak = measure_startup(kind)
+        print(f"{kind}: ready {startup * 1000:.0f}ms after launch, peak memory {peak / 2 ** 20:.0f} MiB")
+    print(f"BENCH: total {time.perf_counter() - started:.1f}s")
+    if mismatches:
+        raise SystemExit(f"FAIL: {mismatches} lookup(s) differ between MilvusService and NumpyVectorStore")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import collections
+import contextlib
+import hashlib
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from observability.logs import get_logger
+from observability.tracing import span
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so keep one process per cache directory there.
+    fcntl = None
+
+logger = get_logger(__name__)
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./data/embedding_cache")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+DIGEST_SIZE = 32
+
+
+class EmbeddingCache:
+    """
+    Content-hash keyed embedding cache with two tiers:
+      * memory: an LRU of the most recently used vectors (EMBEDDING_CACHE_SIZE entries),
+      * disk: an append-only float32 file read through np.memmap, plus a sidecar file of
+        sha256 digests where digest i belongs to row i. It survives restarts and is shared
+        by every MilvusService in the process. Appends hold an flock on the digest file and
+        take their row number from it, so processes sharing the directory keep both files
+        in step.
+    Keys hash the model name together with the text, so switching models never returns stale
+    vectors. Pass path=None to keep the memory tier only.
+    """
+
+    def __init__(self, dimension: int, namespace: str, path: Optional[str] = EMBEDDING_CACHE_PATH, capacity: int = EMBEDDING_CACHE_SIZE):
+        self.dimension = dimension
+        self.namespace = namespace
+        self.capacity = capacity
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lru: "collections.OrderedDict[bytes, np.ndarray]" = collections.OrderedDict()
+        self._rows: Dict[bytes, int] = {}
+        self._lock = threading.Lock()
+        self._vectors_path = self._keys_path = None
+        self._mapped: Optional[np.ndarray] = None
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self._vectors_path = os.path.join(path, f"vectors_{dimension}.f32")
+            self._keys_path = os.path.join(path, f"keys_{dimension}.bin")
+            self._load_disk_index()
+
+    @contextlib.contextmanager
+    def _locked_keys(self):
+        """The digest file, opened for append under an exclusive lock that also covers the vectors file."""
+        with open(self._keys_path, "ab") as keys:
+            if fcntl is not None:
+                fcntl.flock(keys, fcntl.LOCK_EX)
+            keys.seek(0, os.SEEK_END)
+            yield keys
+
+    def _trim(self, keys, rows: int):
+        # Vectors are written before their digest, so a torn write leaves a trailing vector without
+        # a key, or part of one. Cut both files back to whole rows so the next append lines up.
+        keys.truncate(rows * DIGEST_SIZE)
+        if os.path.exists(self._vectors_path) and os.path.getsize(self._vectors_path) > rows * self.dimension * 4:
+            os.truncate(self._vectors_path, rows * self.dimension * 4)
+
+    def _load_disk_index(self):
+        with self._locked_keys() as keys:
+            vector_bytes = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+            rows = min(keys.tell() // DIGEST_SIZE, vector_bytes // (self.dimension * 4))
+            self._trim(keys, rows)
+            digests = open(self._keys_path, "rb").read(rows * DIGEST_SIZE)
+        self._rows = {digests[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE]: i for i in range(rows)}
+        logger.info("Loaded %d cached embedding(s) from %s", rows, self._vectors_path)
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).digest()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        key = self.key(text)
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+                return vector.tolist()
+            row = self._rows.get(key)
+            if row is not None:
+                vector = np.array(self._row(row))
+                self._remember(key, vector)
+                self.disk_hits += 1
+                return vector.tolist()
+            self.misses += 1
+            return None
+
+    def put(self, text: str, embedding: List[float]):
+        key = self.key(text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.shape != (self.dimension,):
+            return
+        with self._lock:
+            self._remember(key, vector)
+            if self._vectors_path and key not in self._rows:
+                with self._locked_keys() as keys:
+                    # The digest file decides the row; another process may have appended since we loaded.
+                    row = keys.tell() // DIGEST_SIZE
+                    self._trim(keys, row)
+                    with open(self._vectors_path, "ab") as f:
+                        f.write(vector.tobytes())
+                    keys.write(key)
+                self._rows[key] = row
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._lru),
+                "disk_entries": len(self._rows),
+            }
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    def _row(self, row: int) -> np.ndarray:
+        # Remap only when the file has grown past what is mapped; appends don't invalidate earlier rows.
+        if self._mapped is None or row >= self._mapped.shape[0]:
+            rows = os.path.getsize(self._vectors_path) // (self.dimension * 4)
+            self._mapped = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dimension))
+        return self._mapped[row]
+
+
+class CachedEmbeddings:
+    """
+    Wraps a LangChain embeddings model (anything with embed_query/embed_documents) with an
+    EmbeddingCache. embed_documents sends only the cache misses to the model, in one call.
+    Both are traced as "embedding.*" spans, with whether the model had to be called.
+    """
+
+    def __init__(self, model, cache: EmbeddingCache):
+        self.model = model
+        self.cache = cache
+
+    def embed_query(self, text: str) -> List[float]:
+        with span("embedding.embed_query") as active:
+            embedding = self.cache.get(text)
+            active.set(cached=embedding is not None)
+            if embedding is None:
+                embedding = self.model.embed_query(text)
+                self.cache.put(text, embedding)
+            return embedding
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with span("embedding.embed_documents", texts=len(texts)) as active:
+            return self._embed_documents(texts, active)
+
+    def _embed_documents(self, texts: List[str], active) -> List[List[float]]:
+        embeddings = [self.cache.get(text) for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        active.set(misses=len(missing))
+        if missing:
+            # Duplicates within one batch are embedded once.
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            fresh = dict(zip(unique, self.model.embed_documents(unique)))
+            for text, embedding in fresh.items():
+                self.cache.put(text, embedding)
+            for i in missing:
+                embeddings[i] = fresh[texts[i]]
+        return embeddings
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(dimension: int, namespace: str) -> EmbeddingCache:
+    """Process-wide cache per (model, dimension), so every MilvusService shares one memory tier and file handle."""
+    with _caches_lock:
+        cache_key = f"{namespace}:{dimension}"
+        if cache_key not in _caches:
+            _caches[cache_key] = EmbeddingCache(dimension, namespace)
+        return _caches[cache_key]
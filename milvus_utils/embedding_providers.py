@@ -0,0 +1,111 @@
+import abc
+import os
+import re
+import zlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# "openai" (default) calls the OpenAI embeddings API; "local" runs the hashing encoder below on
+# the CPU with no network access, for air-gapped test and staging environments.
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai").lower()
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+LOCAL_EMBEDDING_DIMENSION = int(os.getenv("LOCAL_EMBEDDING_DIMENSION", "512"))
+
+OPENAI_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+
+class EmbeddingProvider(abc.ABC):
+    """
+    What MilvusService needs from an embedding backend. 'name' namespaces the embedding cache
+    and 'dimension' sizes the Milvus vector field, so both must change when the vectors do.
+    """
+
+    name: str
+    dimension: int
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    @abc.abstractmethod
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """One vector per text, in order."""
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    def __init__(self, model: str = OPENAI_EMBEDDING_MODEL):
+        # Imported here so the local backend works without langchain_openai configured.
+        from langchain_openai import OpenAIEmbeddings
+
+        self._client = OpenAIEmbeddings(model=model, api_key=os.getenv("OPENAI_API_KEY"))
+        # The bare model name, which is what the embedding cache was keyed by before providers existed.
+        self.name = model
+        self.dimension = OPENAI_DIMENSIONS.get(model, 1536)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._client.embed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._client.embed_documents(texts)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Local CPU encoder: signed feature hashing of lowercased words and character trigrams into
+    'dimension' buckets, L2-normalised. Deterministic across processes (crc32, not hash()),
+    needs no model files, and embeds a batch with one np.bincount over all texts' features.
+    Lexical rather than semantic, which is enough to find "the turn where I mentioned Downtown".
+    """
+
+    _WORD = re.compile(r"\w+")
+    _FEATURE_CACHE_SIZE = 100_000
+
+    def __init__(self, dimension: int = LOCAL_EMBEDDING_DIMENSION):
+        self.dimension = dimension
+        self.name = f"hashing-v1:{dimension}"
+        self._features: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def _word_features(self, word: str) -> Tuple[np.ndarray, np.ndarray]:
+        cached = self._features.get(word)
+        if cached is not None:
+            return cached
+        padded = f" {word} "
+        grams = [word] + [padded[i:i + 3] for i in range(len(padded) - 2)]
+        hashes = np.array([zlib.crc32(gram.encode("utf-8")) for gram in grams], dtype=np.uint64)
+        buckets = (hashes % self.dimension).astype(np.int64)
+        signs = np.where((hashes >> np.uint64(31)) & np.uint64(1), 1.0, -1.0).astype(np.float32)
+        if len(self._features) >= self._FEATURE_CACHE_SIZE:
+            self._features.clear()
+        self._features[word] = (buckets, signs)
+        return buckets, signs
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        flat_index, weights = [], []
+        for row, text in enumerate(texts):
+            for word in self._WORD.findall(text.lower()):
+                buckets, signs = self._word_features(word)
+                flat_index.append(buckets + row * self.dimension)
+                weights.append(signs)
+        size = len(texts) * self.dimension
+        if flat_index:
+            matrix = np.bincount(np.concatenate(flat_index), weights=np.concatenate(weights), minlength=size)
+        else:
+            matrix = np.zeros(size)
+        matrix = matrix.reshape(len(texts), self.dimension).astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        return matrix.tolist()
+
+
+def get_embedding_provider(kind: str = EMBEDDING_PROVIDER) -> EmbeddingProvider:
+    if kind in ("local", "hashing"):
+        return HashingEmbeddingProvider()
+    if kind == "openai":
+        return OpenAIEmbeddingProvider()
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER '{kind}'; expected 'openai' or 'local'.")
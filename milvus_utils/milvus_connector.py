@@ -1,131 +1,411 @@
 
+import asyncio
+import atexit
+import collections
+import itertools
+import json
 import os
-from pymilvus import connections, utility, Collection, CollectionSchema, FieldSchema, DataType
-from langchain_openai import OpenAIEmbeddings
+import threading
+import time
+import numpy as np
 from dotenv import load_dotenv
+from .embedding_cache import CachedEmbeddings, get_embedding_cache
+from .embedding_providers import EmbeddingProvider, get_embedding_provider
+from observability.logs import get_logger
+from observability.tracing import span
 
 load_dotenv()
 
+# Named explicitly: run as a script, __name__ is "__main__".
+logger = get_logger("milvus_utils.milvus_connector")
+
 
 MILVUS_DATA_PATH = os.getenv("MILVUS_DATA_PATH", "./data/milvus_data") 
-COLLECTION_NAME = "parking_conversations"
-DIMENSION = 1536 
+COLLECTION_NAME = os.getenv("MILVUS_COLLECTION_NAME", "parking_conversations")
 INDEX_FIELD_NAME = "embedding"
 ID_FIELD_NAME = "id"
 SESSION_ID_FIELD_NAME = "session_id"
 TEXT_FIELD_NAME = "text"
 ROLE_FIELD_NAME = "role" 
 METRIC_TYPE = "L2" 
+# session_id is the partition key, so Milvus hashes each session into one of these partitions and
+# a session-filtered search only scans that partition. Within it the FLAT index is exact: a
+# filtered IVF search probes clusters chosen for the whole collection and misses most of a
+# single session's messages (see benchmarks/session_history.py).
+NUM_PARTITIONS = int(os.getenv("MILVUS_NUM_PARTITIONS", "64"))
+INDEX_PARAMS = {"metric_type": METRIC_TYPE, "index_type": "FLAT", "params": {}}
+# How many of a session's newest stored messages are read back when picking its recent ones.
+RECENT_SCAN_LIMIT = 1000
+# Recency mode keeps each session's latest messages in process (loaded from Milvus on first use,
+# then appended to on every write) for this many sessions, this many messages each.
+RECENT_SESSIONS = 10000
+RECENT_KEEP = 50
+
+# Write-behind for conversation history: add_conversation_history only queues the message, and a
+# background thread embeds, inserts and flushes queued messages in batches.
+WRITE_BEHIND = os.getenv("MILVUS_WRITE_BEHIND", "true").lower() not in ("0", "false", "no")
+FLUSH_BATCH_SIZE = int(os.getenv("MILVUS_FLUSH_BATCH_SIZE", "64"))
+FLUSH_INTERVAL_SECONDS = float(os.getenv("MILVUS_FLUSH_INTERVAL", "2.0"))
+
+def session_filter(session_id: str) -> str:
+    # json.dumps gives a double-quoted, escaped literal, so quotes in a session id can't break the expression.
+    return f"{SESSION_ID_FIELD_NAME} == {json.dumps(session_id)}"
 
 class MilvusService:
-    def __init__(self):
-        self.embeddings_model = OpenAIEmbeddings(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, provider: EmbeddingProvider = None, write_behind: bool = WRITE_BEHIND):
+        # EMBEDDING_PROVIDER picks the backend (OpenAI by default); the vector field is sized from it.
+        self.provider = provider or get_embedding_provider()
+        self.dimension = self.provider.dimension
+        # Repeated texts (the user input is embedded to search and again to store, plus
+        # "yes", "book it", location names...) are served from the cache instead of the API.
+        self.embeddings_model = CachedEmbeddings(self.provider, get_embedding_cache(self.dimension, self.provider.name))
+        self.write_behind = write_behind
+        # Messages waiting for the writer, and the batch it is currently inserting. Both are
+        # searched by get_relevant_history so a session always sees its own latest turns.
+        self._pending = []
+        self._inflight = []
+        self._sequence = itertools.count()
+        self._recent: "collections.OrderedDict[str, collections.deque]" = collections.OrderedDict()
+        self._recent_lock = threading.Lock()
+        self._buffer = threading.Condition()
+        self._writer = None
+        self._flush_requested = False
+        self._closed = False
+        self.inserted_total = 0
+        self.insert_batches_total = 0
         self._connect()
         self._create_collection_if_not_exists()
 
     def _connect(self):
+        # pymilvus is imported here rather than at module level (it takes ~0.4s), so
+        # NumpyVectorStore, which reuses this class without Milvus, starts without it.
+        from pymilvus import connections
+
         try:
-            print(f"Attempting to connect to Milvus Lite, data will be stored in: {MILVUS_DATA_PATH}")
+            logger.info("Attempting to connect to Milvus Lite, data will be stored in: %s", MILVUS_DATA_PATH)
             os.makedirs(MILVUS_DATA_PATH, exist_ok=True) 
             connections.connect(alias="default", uri=f"{MILVUS_DATA_PATH}/milvus_parking.db") 
-            print("Successfully connected to Milvus Lite.")
+            logger.info("Successfully connected to Milvus Lite.")
         except Exception as e:
-            print(f"Failed to connect to Milvus: {e}")
+            logger.error("Failed to connect to Milvus: %s", e)
             raise
 
     def _create_collection_if_not_exists(self):
+        from pymilvus import utility, Collection, CollectionSchema, FieldSchema, DataType
+
         if not utility.has_collection(COLLECTION_NAME, using="default"):
-            print(f"Collection '{COLLECTION_NAME}' does not exist. Creating...")
+            logger.info("Collection '%s' does not exist. Creating...", COLLECTION_NAME)
             fields = [
                 FieldSchema(name=ID_FIELD_NAME, dtype=DataType.INT64, is_primary=True, auto_id=True),
-                FieldSchema(name=SESSION_ID_FIELD_NAME, dtype=DataType.VARCHAR, max_length=255, description="User session ID"),
+                FieldSchema(name=SESSION_ID_FIELD_NAME, dtype=DataType.VARCHAR, max_length=255, is_partition_key=True, description="User session ID"),
                 FieldSchema(name=TEXT_FIELD_NAME, dtype=DataType.VARCHAR, max_length=65535, description="Conversation text"), 
                 FieldSchema(name=ROLE_FIELD_NAME, dtype=DataType.VARCHAR, max_length=10, description="Role (user/ai)"),
-                FieldSchema(name=INDEX_FIELD_NAME, dtype=DataType.FLOAT_VECTOR, dim=DIMENSION)
+                FieldSchema(name=INDEX_FIELD_NAME, dtype=DataType.FLOAT_VECTOR, dim=self.dimension)
             ]
             schema = CollectionSchema(fields, description="Parking conversation history")
-            self.collection = Collection(COLLECTION_NAME, schema=schema, using="default")
+            self.collection = Collection(COLLECTION_NAME, schema=schema, using="default", num_partitions=NUM_PARTITIONS)
             self._create_index()
-            print(f"Collection '{COLLECTION_NAME}' created and indexed.")
+            logger.info("Collection '%s' created and indexed.", COLLECTION_NAME)
         else:
-            print(f"Collection '{COLLECTION_NAME}' already exists.")
+            logger.info("Collection '%s' already exists.", COLLECTION_NAME)
             self.collection = Collection(COLLECTION_NAME, using="default")
+            dimension = next(field.params.get("dim") for field in self.collection.schema.fields if field.name == INDEX_FIELD_NAME)
+            if int(dimension) != self.dimension:
+                raise ValueError(
+                    f"Collection '{COLLECTION_NAME}' stores {dimension}-d vectors but embedding provider "
+                    f"'{self.provider.name}' produces {self.dimension}-d ones. Set MILVUS_COLLECTION_NAME to "
+                    f"a collection for this provider."
+                )
 
             if not self.collection.has_index():
-                print(f"Index not found for collection '{COLLECTION_NAME}'. Creating index...")
+                logger.info("Index not found for collection '%s'. Creating index...", COLLECTION_NAME)
+                self._create_index()
+            elif self.collection.index().params.get("index_type") != INDEX_PARAMS["index_type"]:
+                logger.info("Rebuilding the index of '%s' as %s for exact per-session search...", COLLECTION_NAME, INDEX_PARAMS["index_type"])
+                self.collection.release()
+                self.collection.drop_index()
                 self._create_index()
             else:
 
                 self.collection.load()
 
+            if self.collection.schema.partition_key_field is None:
+                logger.warning("Collection '%s' predates the session_id partition key; searches scan every session. "
+                               "Set MILVUS_COLLECTION_NAME to a new name (or clear %s) to start a partitioned one.", COLLECTION_NAME, MILVUS_DATA_PATH)
+
 
     def _create_index(self):
-        index_params = {
-            "metric_type": METRIC_TYPE,
-            "index_type": "IVF_FLAT", 
-            "params": {"nlist": 128}, 
-        }
-        self.collection.create_index(INDEX_FIELD_NAME, index_params)
+        self.collection.create_index(INDEX_FIELD_NAME, INDEX_PARAMS)
         self.collection.load() 
-        print(f"Index created for field '{INDEX_FIELD_NAME}' and collection loaded.")
+        logger.info("Index created for field '%s' and collection loaded.", INDEX_FIELD_NAME)
+
 
+    def embedding_cache_stats(self):
+        return self.embeddings_model.cache.stats()
 
     def add_conversation_history(self, session_id: str, text: str, role: str):
+        """
+        Queues a message for the background writer (or, with write_behind off, embeds and
+        inserts it right away and returns its id). Queued messages are visible to
+        get_relevant_history immediately.
+        """
         if not text.strip(): 
             return None
-        embedding = self.embeddings_model.embed_query(text)
-        data = [
-            [session_id],
-            [text],
-            [role],
-            [embedding]
-        ]
+        seq = next(self._sequence)
+        # The same dict sits in the recent ring and the queue; the writer fills in its id once stored.
+        message = {"role": role, "content": text, "order": (1, seq), "distance": 0.0, "seq": seq, "id": None}
+        self._remember_recent(session_id, message)
+        if not self.write_behind:
+            return self._insert_now(session_id, message)
+        with self._buffer:
+            self._pending.append({"session_id": session_id, "text": text, "role": role, "queued_at": time.monotonic(), "message": message})
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name="milvus-history-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+            if len(self._pending) >= FLUSH_BATCH_SIZE:
+                self._buffer.notify_all()
+        return None
+
+    def _insert_now(self, session_id: str, message):
+        embedding = self.embeddings_model.embed_query(message["content"])
         try:
+            with span("milvus.insert", store=type(self).__name__, rows=1):
+                message["id"] = self._insert_rows([session_id], [message["content"]], [message["role"]], [embedding])[0]
+        except Exception as e:
+            logger.error("Error inserting data into Milvus: %s", e)
+            return None
+        return message["id"]
+
+    def _insert_rows(self, session_ids, texts, roles, embeddings):
+        """
+        Stores the rows, makes them searchable and returns their ids. The storage hooks (this,
+        _search_stored and _query_stored) are what NumpyVectorStore overrides.
+        """
+        insert_result = self.collection.insert([session_ids, texts, roles, embeddings])
+        self.collection.flush()
+        return list(insert_result.primary_keys)
+
+    def flush_pending(self, timeout: float = 30.0) -> bool:
+        """Asks the writer to write everything queued now and waits for it. False if it didn't finish in time."""
+        deadline = time.monotonic() + timeout
+        with self._buffer:
+            self._flush_requested = True
+            self._buffer.notify_all()
+            while self._pending or self._inflight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._writer is None:
+                    return False
+                self._buffer.wait(remaining)
+        return True
 
-            insert_result = self.collection.insert(data)
-            self.collection.flush() 
+    def close(self):
+        """Writes out anything still queued and stops the writer thread."""
+        if self._writer is None:
+            return
+        self.flush_pending()
+        with self._buffer:
+            self._closed = True
+            self._buffer.notify_all()
+        self._writer.join(5)
+        self._writer = None
 
-            return insert_result
+    def _run_writer(self):
+        while True:
+            with self._buffer:
+                while not self._closed:
+                    if self._pending and (self._flush_requested or len(self._pending) >= FLUSH_BATCH_SIZE):
+                        break
+                    if self._pending:
+                        age = time.monotonic() - self._pending[0]["queued_at"]
+                        if age >= FLUSH_INTERVAL_SECONDS:
+                            break
+                        self._buffer.wait(FLUSH_INTERVAL_SECONDS - age)
+                    else:
+                        self._flush_requested = False
+                        self._buffer.wait()
+                if self._closed and not self._pending:
+                    return
+                batch, self._pending = self._pending, []
+                self._inflight = batch
+
+            written = self._write_batch(batch)
+
+            with self._buffer:
+                self._inflight = []
+                if not written:
+                    # Keep the messages (ahead of anything queued since) and back off before retrying.
+                    self._pending = batch + self._pending
+                self._buffer.notify_all()
+                if not written and not self._closed:
+                    self._buffer.wait(FLUSH_INTERVAL_SECONDS)
+
+    def _write_batch(self, batch) -> bool:
+        """One embed_documents call, one insert and one flush for the whole batch."""
+        try:
+            # The writer thread has no caller's trace, so each batch is a trace of its own.
+            with span("milvus.write_batch", store=type(self).__name__, rows=len(batch)):
+                embeddings = self.embeddings_model.embed_documents([item["text"] for item in batch])
+                with span("milvus.insert", store=type(self).__name__, rows=len(batch)):
+                    ids = self._insert_rows(
+                        [item["session_id"] for item in batch],
+                        [item["text"] for item in batch],
+                        [item["role"] for item in batch],
+                        embeddings,
+                    )
+            for item, message_id in zip(batch, ids):
+                item["message"]["id"] = message_id
         except Exception as e:
-            print(f"Error inserting data into Milvus: {e}")
-            return None
+            logger.error("Error inserting %d buffered message(s) into Milvus, will retry: %s", len(batch), e)
+            return False
+        self.inserted_total += len(batch)
+        self.insert_batches_total += 1
+        return True
+
+    def _buffered_for(self, session_id: str):
+        with self._buffer:
+            return [item for item in self._inflight + self._pending if item["session_id"] == session_id]
 
-    def get_relevant_history(self, session_id: str, query_text: str, k: int = 5):
+    def get_relevant_history(self, session_id: str, query_text: str, k: int = 5, recent: int = 0):
+        """
+        The k messages of this session closest to query_text, best match first. With recent > 0,
+        the session's last 'recent' messages are merged in (recency-aware mode) and the result is
+        ordered newest first instead, so short replies like "yes" keep their context.
+        Messages still queued for the writer are included either way.
+        """
         if not query_text.strip():
             return []
         query_embedding = self.embeddings_model.embed_query(query_text)
+        relevant = self._relevant_messages(session_id, query_embedding, k)
+        return self._merge_history(relevant, self._recent_messages(session_id, recent) if recent > 0 else None)
+
+    async def aget_relevant_history(self, session_id: str, query_text: str, k: int = 5, recent: int = 0):
+        """
+        get_relevant_history for async callers. The query is embedded while the session's recent
+        messages load (each in a worker thread), then the search runs with the embedding.
+        """
+        if not query_text.strip():
+            return []
+        embedding = asyncio.ensure_future(asyncio.to_thread(self.embeddings_model.embed_query, query_text))
+        recent_messages = await asyncio.to_thread(self._recent_messages, session_id, recent) if recent > 0 else None
+        relevant = await asyncio.to_thread(self._relevant_messages, session_id, await embedding, k)
+        return self._merge_history(relevant, recent_messages)
+
+    def _relevant_messages(self, session_id: str, query_embedding, k: int):
+        """The k stored or still-buffered messages of the session nearest query_embedding, nearest first."""
+        try:
+            with span("milvus.search", store=type(self).__name__, k=k) as active:
+                stored = self._search_stored(session_id, query_embedding, k)
+                active.set(hits=len(stored))
+        except Exception as e:
+            logger.error("Error searching Milvus: %s", e)
+            stored = []
+
+        buffered = self._buffered_messages(session_id, stored)
+        if buffered:
+            # Rank by the same L2 distance; embedding them here warms the cache for the writer.
+            vectors = np.asarray(self.embeddings_model.embed_documents([m["content"] for m in buffered]), dtype=np.float32)
+            distances = ((vectors - np.asarray(query_embedding, dtype=np.float32)) ** 2).sum(axis=1)
+            # Copies: the queued dicts are shared with other readers and the recent ring.
+            buffered = [dict(message, distance=float(distance)) for message, distance in zip(buffered, distances)]
+        return sorted(stored + buffered, key=lambda m: m["distance"])[:k]
+
+    def _merge_history(self, relevant, recent_messages):
+        # relevance_rank is the message's place in the similarity results (0 = closest), or None
+        # if it is only there because it is recent; the agent's history packer uses it.
+        # Messages are matched by identity, not text: a session can say "yes" twice.
+        ranks = {}
+        for rank, m in enumerate(relevant):
+            ranks.setdefault(self._identity(m), rank)
+        if recent_messages is None:
+            return [self._public(m, ranks) for m in relevant]
+        merged = {self._identity(m): m for m in recent_messages}
+        for m in relevant:
+            merged.setdefault(self._identity(m), m)
+        return [self._public(m, ranks) for m in sorted(merged.values(), key=lambda m: m["order"], reverse=True)]
+
+    def _search_stored(self, session_id: str, query_embedding, k: int):
         search_params = {
             "metric_type": METRIC_TYPE,
-            "params": {"nprobe": 10}, 
+            "params": {}, 
         }
+        results = self.collection.search(
+            data=[query_embedding],
+            anns_field=INDEX_FIELD_NAME,
+            param=search_params,
+            limit=k,
+            expr=session_filter(session_id), 
+            output_fields=[TEXT_FIELD_NAME, ROLE_FIELD_NAME] 
+        )
+        return [self._stored_message(hit.id, hit.entity, hit.distance) for hit in results[0]] if results else []
 
-        expr = f"{SESSION_ID_FIELD_NAME} == '{session_id}'"
-        
+    def _recent_messages(self, session_id: str, n: int):
+        """
+        Last n messages of a session, oldest first. The first call for a session reads them from
+        Milvus (auto ids increase with insertion, so they order a session's turns); after that
+        they come from the in-process list add_conversation_history appends to.
+        """
+        with self._recent_lock:
+            recent = self._recent.get(session_id)
+            if recent is not None:
+                self._recent.move_to_end(session_id)
+                return list(recent)[-n:]
         try:
-
-            results = self.collection.search(
-                data=[query_embedding],
-                anns_field=INDEX_FIELD_NAME,
-                param=search_params,
-                limit=k,
-                expr=expr, 
-                output_fields=[TEXT_FIELD_NAME, ROLE_FIELD_NAME, SESSION_ID_FIELD_NAME] 
-            )
-
-            history = []
-            if results:
-                for hit in results[0]: 
-
-                    if hit.entity.get(SESSION_ID_FIELD_NAME) == session_id:
-                        history.append({
-                            "role": hit.entity.get(ROLE_FIELD_NAME),
-                            "content": hit.entity.get(TEXT_FIELD_NAME)
-                        })
-
-            return history
+            stored = self._query_stored(session_id)
         except Exception as e:
-            print(f"Error searching Milvus: {e}")
+            logger.error("Error querying recent history from Milvus: %s", e)
             return []
+        stored += self._buffered_messages(session_id, stored)
+        stored.sort(key=lambda m: m["order"])
+        with self._recent_lock:
+            # A write that raced with the query is already in stored (via the buffer) or will be appended.
+            self._recent[session_id] = collections.deque(stored[-RECENT_KEEP:], maxlen=RECENT_KEEP)
+            while len(self._recent) > RECENT_SESSIONS:
+                self._recent.popitem(last=False)
+        return stored[-n:]
+
+    def _query_stored(self, session_id: str):
+        # A query with a limit returns whichever rows it meets first, not the newest. The iterator
+        # pages through the session in id order, so the deque is left holding the latest ones.
+        newest = collections.deque(maxlen=RECENT_SCAN_LIMIT)
+        iterator = self.collection.query_iterator(
+            batch_size=RECENT_SCAN_LIMIT,
+            expr=session_filter(session_id),
+            output_fields=[ID_FIELD_NAME, TEXT_FIELD_NAME, ROLE_FIELD_NAME],
+        )
+        try:
+            page = iterator.next()
+            while page:
+                newest.extend(page)
+                page = iterator.next()
+        finally:
+            iterator.close()
+        return [self._stored_message(row[ID_FIELD_NAME], row) for row in newest]
+
+    def _remember_recent(self, session_id: str, message):
+        with self._recent_lock:
+            recent = self._recent.get(session_id)
+            if recent is not None:
+                recent.append(message)
+
+    def _buffered_messages(self, session_id: str, stored):
+        """This session's queued/in-flight messages, minus any the writer has already stored and that are in stored."""
+        seen = {m["id"] for m in stored}
+        return [item["message"] for item in self._buffered_for(session_id) if item["message"]["id"] not in seen]
+
+    @staticmethod
+    def _identity(message):
+        """Stored messages are known by id; queued ones by sequence number until the writer gives them an id."""
+        return ("id", message["id"]) if message["id"] is not None else ("seq", message["seq"])
+
+    @staticmethod
+    def _stored_message(message_id, entity, distance: float = 0.0):
+        return {"role": entity.get(ROLE_FIELD_NAME), "content": entity.get(TEXT_FIELD_NAME), "order": (0, message_id), "distance": distance,
+                "id": message_id}
+
+    @staticmethod
+    def _public(message, ranks):
+        return {"role": message["role"], "content": message["content"], "relevance_rank": ranks.get(MilvusService._identity(message))}
 
 if __name__ == "__main__":
     milvus_service = MilvusService()
@@ -134,10 +414,12 @@ if __name__ == "__main__":
     milvus_service.add_conversation_history(session_id, "Sure, for what vehicle type and location?", "ai")
     milvus_service.add_conversation_history(session_id, "A car, near Downtown Mall.", "user")
 
-    history = milvus_service.get_relevant_history(session_id, "What about parking duration?")
+    history = milvus_service.get_relevant_history(session_id, "What about parking duration?", recent=2)
     print("\nRetrieved history for 'What about parking duration?':")
     for item in history:
         print(f"- {item['role']}: {item['content']}")
 
+    milvus_service.flush_pending()
     history_other_session = milvus_service.get_relevant_history("other_session", "My car needs parking.")
-    print(f"\nHistory for other_session: {history_other_session}")
\ No newline at end of file
+    print(f"\nHistory for other_session: {history_other_session}")
+    print(f"Embedding cache: {milvus_service.embedding_cache_stats()}")
\ No newline at end of file
@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+from array import array
+from typing import Dict, List
+
+import numpy as np
+
+from .embedding_providers import EmbeddingProvider
+from observability.logs import get_logger
+from .milvus_connector import (
+    COLLECTION_NAME,
+    RECENT_SCAN_LIMIT,
+    ROLE_FIELD_NAME,
+    SESSION_ID_FIELD_NAME,
+    TEXT_FIELD_NAME,
+    WRITE_BEHIND,
+    MilvusService,
+)
+
+# "milvus" (default) keeps conversation history in Milvus Lite; "numpy" uses NumpyVectorStore,
+# which needs no Milvus at all and suits small and single-node deployments.
+HISTORY_STORE = os.getenv("HISTORY_STORE", "milvus").lower()
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "./data/vector_store")
+
+logger = get_logger(__name__)
+
+
+class NumpyVectorStore(MilvusService):
+    """
+    Conversation history in two append-only files instead of a Milvus collection:
+      * vectors: float32 rows read through np.memmap,
+      * messages: one JSON line per row (session_id, text, role).
+    A per-session index of row numbers (and the byte offset of every message line) is rebuilt
+    from the messages file at startup. A search gathers the session's rows from the map and
+    ranks them with one vectorised squared-L2 pass, exactly like the FLAT index does, so
+    results match MilvusService. Write-behind, the recent-message ring and the embedding cache
+    are inherited unchanged; only the storage hooks differ.
+    """
+
+    def __init__(self, provider: EmbeddingProvider = None, write_behind: bool = WRITE_BEHIND, path: str = VECTOR_STORE_PATH):
+        self.path = path
+        super().__init__(provider=provider, write_behind=write_behind)
+
+    def _connect(self):
+        os.makedirs(self.path, exist_ok=True)
+        self._vectors_path = os.path.join(self.path, f"{COLLECTION_NAME}_{self.dimension}.f32")
+        self._messages_path = os.path.join(self.path, f"{COLLECTION_NAME}_{self.dimension}.jsonl")
+        self._store_lock = threading.Lock()
+        self._mapped = None
+        logger.info("Using %s", self._vectors_path)
+
+    def _create_collection_if_not_exists(self):
+        self._sessions: Dict[str, array] = {}
+        self._offsets = array("q")
+        row_bytes = self.dimension * 4
+        vector_rows = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        end = 0
+        if os.path.exists(self._messages_path):
+            with open(self._messages_path, "rb") as f:
+                for line in f:
+                    # Vectors are appended before their message line, so a torn write leaves a
+                    # trailing vector without a message, or a last line without its newline.
+                    if len(self._offsets) == vector_rows or not line.endswith(b"\n"):
+                        break
+                    message = json.loads(line)
+                    self._sessions.setdefault(message[SESSION_ID_FIELD_NAME], array("q")).append(len(self._offsets))
+                    self._offsets.append(end)
+                    end += len(line)
+        # Drop any torn tail so the next append lines rows and messages back up.
+        rows = len(self._offsets)
+        for path, size in ((self._vectors_path, rows * row_bytes), (self._messages_path, end)):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                os.truncate(path, size)
+        self._end = end
+        logger.info("Loaded %d message(s) across %d session(s).", rows, len(self._sessions))
+
+    def _insert_rows(self, session_ids, texts, roles, embeddings):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.shape != (len(texts), self.dimension):
+            raise ValueError(f"Expected {len(texts)} vector(s) of dimension {self.dimension}, got shape {vectors.shape}")
+        lines = [
+            (json.dumps({SESSION_ID_FIELD_NAME: session_id, TEXT_FIELD_NAME: text, ROLE_FIELD_NAME: role}) + "\n").encode("utf-8")
+            for session_id, text, role in zip(session_ids, texts, roles)
+        ]
+        with self._store_lock:
+            first = len(self._offsets)
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._messages_path, "ab") as f:
+                f.write(b"".join(lines))
+            for i, (session_id, line) in enumerate(zip(session_ids, lines)):
+                self._sessions.setdefault(session_id, array("q")).append(first + i)
+                self._offsets.append(self._end)
+                self._end += len(line)
+        return list(range(first, first + len(lines)))
+
+    def _session_rows(self, session_id: str):
+        """The session's row numbers and a map covering all of them."""
+        with self._store_lock:
+            rows = self._sessions.get(session_id)
+            if not rows:
+                return np.empty(0, dtype=np.int64), None
+            rows = np.array(rows, dtype=np.int64)
+            # Remap only when rows were appended past what is mapped; earlier rows never move.
+            if self._mapped is None or self._mapped.shape[0] < len(self._offsets):
+                self._mapped = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(len(self._offsets), self.dimension))
+            return rows, self._mapped
+
+    def _read_messages(self, rows) -> List[dict]:
+        if not len(rows):
+            return []
+        with self._store_lock:
+            offsets = [self._offsets[row] for row in rows]
+        with open(self._messages_path, "rb") as f:
+            messages = []
+            for offset in offsets:
+                f.seek(offset)
+                messages.append(json.loads(f.readline()))
+            return messages
+
+    def _search_stored(self, session_id: str, query_embedding, k: int):
+        rows, mapped = self._session_rows(session_id)
+        if not len(rows):
+            return []
+        diff = mapped[rows] - np.asarray(query_embedding, dtype=np.float32)
+        distances = np.einsum("ij,ij->i", diff, diff)
+        if len(rows) > k:
+            top = np.argpartition(distances, k - 1)[:k]
+            rows, distances = rows[top], distances[top]
+        # Nearest first; ties go to the older row.
+        order = np.lexsort((rows, distances))
+        rows, distances = rows[order], distances[order]
+        return [
+            self._stored_message(int(row), message, float(distance))
+            for row, message, distance in zip(rows, self._read_messages(rows), distances)
+        ]
+
+    def _query_stored(self, session_id: str):
+        rows, _ = self._session_rows(session_id)
+        rows = rows[-RECENT_SCAN_LIMIT:]
+        return [self._stored_message(int(row), message) for row, message in zip(rows, self._read_messages(rows))]
+
+
+def get_history_store(kind: str = HISTORY_STORE, **kwargs) -> MilvusService:
+    """The conversation history store picked by HISTORY_STORE; both have the same API."""
+    if kind == "numpy":
+        return NumpyVectorStore(**kwargs)
+    if kind == "milvus":
+        return MilvusService(**kwargs)
+    raise ValueError(f"Unknown HISTORY_STORE '{kind}'; expected 'milvus' or 'numpy'.")
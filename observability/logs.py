@@ -0,0 +1,72 @@
+import json
+import logging
+import os
+import sys
+import threading
+
+from .tracing import current_span
+
+# DEBUG shows per-call detail (every search, tool request and raw API reply); INFO, the default,
+# keeps startup, per-turn timings and errors.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" for humans, "json" for one object per line that a log pipeline can aggregate.
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Loggers of the project's packages; everything else (uvicorn, httpx, langchain) is left alone.
+PROJECT_LOGGERS = ("agent", "app", "milvus_utils", "observability", "ui")
+
+# Attributes every LogRecord has; anything else on a record came in through extra=.
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "trace_id", "span_id"}
+_configured = False
+_configure_lock = threading.Lock()
+
+
+class TraceContextFilter(logging.Filter):
+    """Stamps each record with the current span's trace and span ids ("-" outside a trace)."""
+
+    def filter(self, record):
+        active = current_span()
+        record.trace_id = active.trace_id if active is not None else "-"
+        record.span_id = active.span_id if active is not None else "-"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "trace_id": getattr(record, "trace_id", "-"),
+            "span_id": getattr(record, "span_id", "-"),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS})
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Installs one stderr handler on the project's loggers. Safe to call more than once."""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        handler = logging.StreamHandler(sys.stderr)
+        handler.addFilter(TraceContextFilter())
+        if fmt == "json":
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [trace=%(trace_id)s] %(message)s"))
+        for name in PROJECT_LOGGERS:
+            logger = logging.getLogger(name)
+            logger.setLevel(level)
+            logger.addHandler(handler)
+            logger.propagate = False
+        _configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    """logging.getLogger(name), with the project's handler installed on first use."""
+    configure_logging()
+    return logging.getLogger(name)
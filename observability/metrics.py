@@ -0,0 +1,274 @@
+import abc
+import bisect
+import http.server
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from a cached search (~100us) to a slow LLM call.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# The API serves its metrics at /metrics. A process without the API (the Streamlit UI running the
+# agent) can serve its own on this port; 0 keeps them in memory only.
+AGENT_METRICS_PORT = int(os.getenv("AGENT_METRICS_PORT", "0"))
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(abc.ABC):
+    """A metric family: one series per combination of label values, created on first use."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[LabelValues, object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            with self._lock:
+                series = self._series.setdefault(values, self._new_series())
+        return series
+
+    @abc.abstractmethod
+    def _new_series(self):
+        """The object labels() hands out for a new combination of label values."""
+
+    @abc.abstractmethod
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """(metric name with suffix, rendered labels, value) for every series."""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{labels} {_number(value)}" for name, labels, value in self.samples()]
+        return lines
+
+
+class _CounterSeries:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_series(self):
+        return _CounterSeries()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def value(self, *values: str) -> float:
+        series = self._series.get(values)
+        return series.value if series is not None else 0
+
+    def samples(self):
+        for values, series in list(self._series.items()):
+            yield f"{self.name}_total", _labels(self.labelnames, values), series.value
+
+
+class _HistogramSeries:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # counts[i] is observations in (buckets[i-1], buckets[i]]; the last slot is +Inf.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_series(self):
+        return _HistogramSeries(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self):
+        for values, series in list(self._series.items()):
+            with series._lock:
+                counts, total, count = list(series.counts), series.sum, series.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", _labels(self.labelnames, values, f'le="{_number(bound)}"'), cumulative
+            yield f"{self.name}_sum", _labels(self.labelnames, values), total
+            yield f"{self.name}_count", _labels(self.labelnames, values), count
+
+
+class Gauge(Metric):
+    """A gauge read at scrape time from callback, which returns {label values: value}."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], callback: Callable[[], Dict[LabelValues, float]]):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def _new_series(self):
+        raise TypeError(f"{self.name} is read from its callback; it has no series to set")
+
+    def samples(self):
+        for values, value in sorted(self.callback().items()):
+            yield self.name, _labels(self.labelnames, values), value
+
+
+class Registry:
+    """The metric families of this process, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            # Re-registering a name returns the existing family (e.g. a Streamlit rerun re-importing a module).
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str], callback) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Span durations, by span name (crud.find_available_slots, milvus.search, llm.call, tool.call...).
+# Fed by tracing when a span finishes, so every traced operation gets a latency histogram for free.
+SPAN_DURATION = registry.histogram("parking_span_duration_seconds", "Duration of traced operations, by span name.", ("span",))
+
+
+def observe_span(name: str, duration_ms: float):
+    SPAN_DURATION.labels(name).observe(duration_ms / 1000)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: request count and latency per method, route template and status. The route
+    is the matched path template (/bookings/{booking_id}), so ids don't each make a new series.
+    """
+
+    def __init__(self, app, registry: Registry = registry):
+        self.app = app
+        self.requests = registry.counter("parking_http_requests", "HTTP requests handled, by method, route and status.", ("method", "route", "status"))
+        self.latency = registry.histogram("parking_http_request_duration_seconds", "HTTP request latency, by method and route.", ("method", "route"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            self.latency.labels(method, template).observe(time.perf_counter() - started)
+            self.requests.labels(method, template, str(status)).inc()
+
+
+_servers: Dict[int, http.server.ThreadingHTTPServer] = {}
+_servers_lock = threading.Lock()
+
+
+def start_metrics_server(port: int, registry: Registry = registry) -> http.server.ThreadingHTTPServer:
+    """
+    Serves registry at http://0.0.0.0:port/metrics from a daemon thread, for processes without
+    the API (e.g. the UI). Starts once per port; later calls return the running server.
+    """
+    with _servers_lock:
+        if port in _servers:
+            return _servers[port]
+        server = _servers[port] = _metrics_server(port, registry)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        return server
+
+
+def _metrics_server(port: int, registry: Registry) -> http.server.ThreadingHTTPServer:
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return http.server.ThreadingHTTPServer(("0.0.0.0", port), Handler)
+
@@ -0,0 +1,260 @@
+import atexit
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from .metrics import observe_span
+
+# Finished spans are appended to this JSONL file, one object per line, by a background thread.
+# Empty (the default) keeps tracing in memory only: spans still carry the trace id through the
+# logs and across the tool -> API hop, but nothing is written.
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+# The exporter writes once this many spans are queued, or every TRACE_EXPORT_INTERVAL seconds.
+TRACE_EXPORT_BATCH_SIZE = int(os.getenv("TRACE_EXPORT_BATCH_SIZE", "256"))
+TRACE_EXPORT_INTERVAL_SECONDS = float(os.getenv("TRACE_EXPORT_INTERVAL", "1.0"))
+# Spans beyond this many waiting for the exporter are dropped rather than growing memory.
+TRACE_QUEUE_SIZE = 10000
+
+# Headers the agent's API client sends so the API's spans join the agent's trace.
+TRACE_ID_HEADER = "X-Trace-Id"
+PARENT_SPAN_HEADER = "X-Parent-Span-Id"
+
+_current_span: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("current_span", default=None)
+
+
+def new_id(nbytes: int = 8) -> str:
+    # Ids only need to be unique, not unguessable; getrandbits is several times cheaper than secrets.
+    return f"{random.getrandbits(nbytes * 8):0{nbytes * 2}x}"
+
+
+class Span:
+    """
+    One timed operation. trace_id ties together every span of a user turn, from the UI through
+    the agent, its tools, the API and the database; parent_id is the span it ran inside.
+    """
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start_time", "duration_ms", "status", "error", "_started")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, object]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_id()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_time = time.time()
+        self.duration_ms: Optional[float] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self._started = time.perf_counter()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self, error: Optional[BaseException] = None):
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        if error is not None:
+            self.status = "error"
+            self.error = f"{type(error).__name__}: {error}"
+        observe_span(self.name, self.duration_ms)
+        exporter.export(self)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class JsonlSpanExporter:
+    """
+    Writes finished spans to a JSONL file from a daemon thread, in batches, so finishing a span
+    on the request path only costs a queue put. Disabled when path is empty.
+    """
+
+    def __init__(self, path: str = TRACE_EXPORT_PATH, batch_size: int = TRACE_EXPORT_BATCH_SIZE,
+                 interval_seconds: float = TRACE_EXPORT_INTERVAL_SECONDS):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval_seconds = interval_seconds
+        self.exported = 0
+        self.dropped = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def export(self, span: Span):
+        if not self.path:
+            return
+        if self._writer is None:
+            self._start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Waits until everything queued so far is written. False if it didn't finish in time."""
+        if self._writer is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _start(self):
+        with self._lock:
+            if self._writer is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._writer = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                batch, waiters = [], []
+                item = self._queue.get()
+                deadline = time.monotonic() + self.interval_seconds
+                while True:
+                    if isinstance(item, threading.Event):
+                        waiters.append(item)
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                if batch:
+                    f.write("".join(json.dumps(span.to_dict(), default=str) + "\n" for span in batch))
+                    f.flush()
+                    self.exported += len(batch)
+                for waiter in waiters:
+                    waiter.set()
+
+
+exporter = JsonlSpanExporter()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def start_span(name: str, trace_id: Optional[str] = None, parent_id: Optional[str] = None, **attributes) -> Span:
+    """
+    A span that is not made current, for operations that start and end in different callbacks
+    (e.g. an LLM call). Without an explicit trace_id it joins the current span's trace, or
+    starts a new one. Call finish() on it.
+    """
+    if trace_id is None:
+        parent = _current_span.get()
+        if parent is not None:
+            trace_id, parent_id = parent.trace_id, parent_id or parent.span_id
+        else:
+            trace_id = new_id(16)
+    return Span(name, trace_id, parent_id, attributes)
+
+
+@contextlib.contextmanager
+def span(name: str, trace_id: Optional[str] = None, parent_id: Optional[str] = None, **attributes):
+    """Times the block as a child of the current span (or as the root of a new trace) and makes it current."""
+    active = start_span(name, trace_id, parent_id, **attributes)
+    token = _current_span.set(active)
+    try:
+        yield active
+    except Exception as e:
+        active.finish(error=e)
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # An async generator closed from another context; the span still finishes.
+            pass
+        active.finish()
+
+
+def traced(name: str):
+    """Decorator form of span() for functions, coroutines and async generators."""
+
+    def decorate(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def agen_wrapper(*args, **kwargs):
+                with span(name):
+                    async for item in fn(*args, **kwargs):
+                        yield item
+            return agen_wrapper
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+def propagation_headers() -> Dict[str, str]:
+    """Headers that make the receiving service's spans children of the current span."""
+    active = _current_span.get()
+    if active is None:
+        return {}
+    return {TRACE_ID_HEADER: active.trace_id, PARENT_SPAN_HEADER: active.span_id}
+
+
+class TraceMiddleware:
+    """
+    ASGI middleware: one "http.request" span per request, continuing the caller's trace when it
+    sends X-Trace-Id / X-Parent-Span-Id, and echoing X-Trace-Id on the response. The handler,
+    including sync handlers on the threadpool, runs inside the span, so crud spans nest under it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers", ())}
+        trace_id = headers.get(TRACE_ID_HEADER.lower())
+        with span("http.request", trace_id=trace_id or None, parent_id=headers.get(PARENT_SPAN_HEADER.lower()) if trace_id else None,
+                  method=scope.get("method"), path=scope.get("path")) as active:
+
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    active.set(status_code=message["status"])
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(TRACE_ID_HEADER.lower().encode(), active.trace_id.encode())]
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace)
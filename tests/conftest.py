@@ -0,0 +1,32 @@
+"""
+app.database and milvus_utils read their paths from the environment when first imported, so
+the whole suite is pointed at a scratch directory here, before any test imports them.
+"""
+import os
+import tempfile
+
+import pytest
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix="parking_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'parking.db')}"
+os.environ["MILVUS_DATA_PATH"] = os.path.join(SCRATCH_DIR, "milvus")
+os.environ["VECTOR_STORE_PATH"] = os.path.join(SCRATCH_DIR, "vector_store")
+os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(SCRATCH_DIR, "embedding_cache")
+
+
+@pytest.fixture
+def empty_database():
+    """Empty slot and booking tables (ids start again at 1) and in-memory indexes to match; yields the engine."""
+    from app import models
+    from app.availability import availability_index, location_index
+    from app.database import create_db_and_tables, engine
+    from app.search_cache import search_cache
+
+    create_db_and_tables()
+    with engine.begin() as conn:
+        conn.execute(models.Booking.__table__.delete())
+        conn.execute(models.ParkingSlot.__table__.delete())
+    availability_index.clear()
+    location_index.clear()
+    search_cache.clear()
+    yield engine
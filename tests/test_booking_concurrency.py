@@ -0,0 +1,36 @@
+"""
+A small run of benchmarks/booking_concurrency.py: parallel /book-parking/ calls racing for a
+handful of slots must never leave two bookings with overlapping windows on the same slot.
+"""
+import asyncio
+
+import httpx
+
+from benchmarks.booking_concurrency import count_double_bookings, fire
+
+REQUESTS = 300
+CONCURRENCY = 30
+SLOTS = 5
+
+
+def test_parallel_bookings_never_overlap(empty_database):
+    from app import models
+    from app.main import app
+
+    with empty_database.begin() as conn:
+        conn.execute(models.ParkingSlot.__table__.insert(), [
+            {"location": f"Stress Lot {i % 2}", "slot_type": "open", "vehicle_type": "car", "is_available": True, "price_per_hour": 3.0}
+            for i in range(SLOTS)
+        ])
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://stress", timeout=60) as client:
+            return await fire(client, REQUESTS, CONCURRENCY, SLOTS, seed=7)
+
+    statuses, _, _ = asyncio.run(run())
+
+    assert set(statuses) <= {200, 409}, statuses
+    # Enough contention that the conditional claim actually turned requests away.
+    assert statuses[200] and statuses[409]
+    assert count_double_bookings(empty_database) == 0
@@ -0,0 +1,72 @@
+"""
+A small run of benchmarks/booking_queries.py: every /user-bookings/ page and every
+/bookings/{id} must cost one SQL statement (the slot is joined in), or the reads have
+slipped back to N+1.
+"""
+import datetime
+
+from fastapi.testclient import TestClient
+
+from benchmarks.common import QueryCounter
+
+BOOKINGS = 60
+PAGE_SIZE = 25
+
+
+def api_engine(engine):
+    from app import database
+
+    # Under PARKING_API_MODE=async the endpoints run on the aiosqlite engine instead.
+    return database.get_async_engine().sync_engine if database.API_MODE == "async" else engine
+
+
+def seed_bookings(engine):
+    from app import models
+
+    start = datetime.datetime(2030, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(models.ParkingSlot.__table__.insert(), [
+            {"location": f"Lot {i}", "slot_type": "open", "vehicle_type": "car", "is_available": True, "price_per_hour": 2.0}
+            for i in range(BOOKINGS)
+        ])
+        conn.execute(models.Booking.__table__.insert(), [
+            {"slot_id": i + 1, "user_id": "heavy-user", "vehicle_number": "KA01AB1234",
+             # Pairs of bookings share a start_time so the (start_time, id) tie-break is exercised.
+             "start_time": start + datetime.timedelta(hours=i // 2), "end_time": start + datetime.timedelta(hours=i // 2 + 1),
+             "duration_hours": 1, "total_cost": 2.0, "is_confirmed": True}
+            for i in range(BOOKINGS)
+        ])
+
+
+def test_user_bookings_pages_cost_one_query_each(empty_database):
+    from app.main import app
+
+    seed_bookings(empty_database)
+    client = TestClient(app)
+    seen_ids, cursor, counts = [], None, []
+    while True:
+        params = {"limit": PAGE_SIZE, **({"cursor": cursor} if cursor else {})}
+        with QueryCounter(api_engine(empty_database)) as counter:
+            body = client.get("/user-bookings/heavy-user", params=params).json()
+        counts.append(counter.count)
+        seen_ids.extend(item["id"] for item in body["items"])
+        assert all(item["slot"]["location"] for item in body["items"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+
+    assert counts == [1] * len(counts)
+    assert len(counts) == -(-BOOKINGS // PAGE_SIZE)
+    assert sorted(seen_ids) == list(range(1, BOOKINGS + 1))
+
+
+def test_single_booking_costs_one_query(empty_database):
+    from app.main import app
+
+    seed_bookings(empty_database)
+    client = TestClient(app)
+    with QueryCounter(api_engine(empty_database)) as counter:
+        body = client.get("/bookings/1").json()
+
+    assert counter.count == 1
+    assert body["slot"]["location"] == "Lot 0"
@@ -0,0 +1,57 @@
+"""
+A small run of the parity check in benchmarks/vector_store.py: NumpyVectorStore must return
+the same history as MilvusService for the same conversation, in plain and recency mode.
+"""
+import random
+
+import numpy as np
+import pytest
+
+pytest.importorskip("milvus_lite")
+
+from benchmarks.embedding_cache import SlowEmbedder
+from benchmarks.vector_store import same_results
+
+SESSIONS = 20
+MESSAGES = 15
+DIMENSION = 64
+
+
+@pytest.fixture(scope="module")
+def loaded_stores():
+    from pymilvus import connections
+
+    from milvus_utils.vector_store import get_history_store
+
+    # Random vectors rather than the hashing encoder, so distances don't tie and both stores agree on order.
+    provider = SlowEmbedder(0, dimension=DIMENSION)
+    stores = {kind: get_history_store(kind, provider=provider, write_behind=False) for kind in ("milvus", "numpy")}
+    rng = random.Random(11)
+    total = SESSIONS * MESSAGES
+    session_ids = [f"session-{i % SESSIONS}" for i in range(total)]
+    roles = ["user" if (i // SESSIONS) % 2 == 0 else "ai" for i in range(total)]
+    texts = [f"{role} message {i}: parking near Zone {rng.randrange(50)} for {rng.randrange(1, 9)} hours"
+             for i, role in enumerate(roles)]
+    vectors = provider.embed_documents(texts)
+    for store in stores.values():
+        store._insert_rows(session_ids, texts, roles, vectors)
+    vectors_by_text = {text: np.asarray(vector, dtype=np.float32) for text, vector in zip(texts, vectors)}
+    yield stores, provider, vectors_by_text
+    for store in stores.values():
+        store.close()
+    connections.disconnect("default")
+
+
+@pytest.mark.parametrize("recent", [0, 3])
+def test_numpy_store_matches_milvus(loaded_stores, recent):
+    stores, provider, vectors_by_text = loaded_stores
+    rng = random.Random(recent)
+    for _ in range(30):
+        session_id = f"session-{rng.randrange(SESSIONS)}"
+        query = f"parking near Zone {rng.randrange(50)} for {rng.randrange(1, 9)} hours"
+        query_vector = np.asarray(provider.embed_query(query), dtype=np.float32)
+        results = {kind: store.get_relevant_history(session_id, query, k=5, recent=recent) for kind, store in stores.items()}
+
+        # Recent messages that are also among the nearest appear once.
+        assert 5 <= len(results["numpy"]) <= 5 + recent
+        assert same_results(results["milvus"], results["numpy"], query_vector, vectors_by_text, recent), (session_id, query, results)
@@ -7,12 +7,23 @@ import streamlit as st
 import uuid
 import html
 import textwrap 
+import time
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
 from agent.parking_agent import ParkingAgent 
+from observability.logs import get_logger
+from observability.metrics import AGENT_METRICS_PORT, start_metrics_server
+from observability.tracing import span
+
+# Streamlit runs this file as __main__, so the logger is named explicitly.
+logger = get_logger("ui.app")
+
+if AGENT_METRICS_PORT:
+    # The agent's counters and latencies live in this process; serve them (once, across reruns).
+    start_metrics_server(AGENT_METRICS_PORT)
 
 st.set_page_config(page_title="Parking AI Assistant", layout="centered", initial_sidebar_state="collapsed")
 
@@ -55,66 +66,64 @@ if not st.session_state.parking_agent_initialized:
         dotenv_path = os.path.join(PROJECT_ROOT, ".env")
         if os.path.exists(dotenv_path):
             load_dotenv(dotenv_path)
-            print(f"UI: Loaded .env file from {dotenv_path}")
+            logger.info("Loaded .env file from %s", dotenv_path)
         else:
-            print(f"UI: .env file not found at {dotenv_path}. Agent might fail if API keys are not set.")
+            logger.warning(".env file not found at %s. Agent might fail if API keys are not set.", dotenv_path)
 
         st.session_state.parking_agent = ParkingAgent(session_id=st.session_state.session_id)
         st.session_state.parking_agent_initialized = True
-        print(f"UI: ParkingAgent initialized for session {st.session_state.session_id}")
+        logger.info("ParkingAgent initialized for session %s", st.session_state.session_id)
     except Exception as e:
         st.error(f"Fatal Error: Failed to initialize Parking Agent. Check API keys and backend services. Error: {e}")
         st.stop()
 
 
-chat_placeholder = st.empty()
-
-def display_messages():
-    """Renders the chat messages into the chat_placeholder."""
-    message_html_list = ["<div class='chat-container' id='chat-area'>"] 
+def render_bubble(role: str, content: str) -> str:
+    """HTML for one chat bubble."""
+    avatar = USER_AVATAR if role == "user" else BOT_AVATAR
+    message_class = "user-message" if role == "user" else "assistant-message"
 
-    for message_data in st.session_state.messages:
-        avatar = USER_AVATAR if message_data["role"] == "user" else BOT_AVATAR
-        message_class = "user-message" if message_data["role"] == "user" else "assistant-message"
-        
-        raw_content = message_data["content"]
+    processed_content = html.escape(content).replace("\n", "<br />\n")
 
-        processed_content = html.escape(raw_content).replace("\n", "<br />\n")
-        
-        bubble_template = f"""
-            <div class="message-bubble {message_class}">
-                <span class="icon">{avatar}</span>
-                <div class="message-content">
-                    {processed_content}
-                </div>
+    bubble_template = f"""
+        <div class="message-bubble {message_class}">
+            <span class="icon">{avatar}</span>
+            <div class="message-content">
+                {processed_content}
             </div>
-            """
-
-        html_bubble = textwrap.dedent(bubble_template).strip()
-        message_html_list.append(html_bubble)
-    
-
-    scroll_script_html = textwrap.dedent("""
-    <script>
-        (function() {
-            const chatArea = document.getElementById('chat-area');
-            if (chatArea) {
-                setTimeout(function() { // Small delay for content rendering
-                    chatArea.scrollTop = chatArea.scrollHeight;
-                }, 50);
-            }
-        })();
-    </script>
-    """).strip()
-
-    message_html_list.append(scroll_script_html) 
-    message_html_list.append("</div>") 
-    full_html_chat = "".join(message_html_list)
-    
-    chat_placeholder.markdown(full_html_chat, unsafe_allow_html=True)
-
-
-display_messages()
+        </div>
+        """
+    return textwrap.dedent(bubble_template).strip()
+
+
+def add_message(role: str, content: str):
+    """Appends a message with its bubble HTML, built once here rather than on every rerun."""
+    message = {"role": role, "content": content, "html": render_bubble(role, content)}
+    st.session_state.messages.append(message)
+    return message
+
+
+# History is emitted in fixed blocks of HISTORY_BLOCK_SIZE messages, each one element built from
+# the bubbles' cached HTML. A rerun re-sends finished blocks unchanged, so the browser only redraws
+# the last block, and a streamed reply only redraws its own bubble.
+HISTORY_BLOCK_SIZE = 50
+chat_area = st.container(height=560, border=False, key="chat-area", autoscroll=True)
+
+render_started = time.perf_counter()
+for message_data in st.session_state.messages:
+    if "html" not in message_data:
+        message_data["html"] = render_bubble(message_data["role"], message_data["content"])
+# Messages are only ever appended, so a full block's HTML never changes once joined.
+full_blocks = st.session_state.setdefault("history_blocks", {})
+for start in range(0, len(st.session_state.messages), HISTORY_BLOCK_SIZE):
+    block_html = full_blocks.get(start)
+    if block_html is None:
+        block = st.session_state.messages[start:start + HISTORY_BLOCK_SIZE]
+        block_html = "".join(message_data["html"] for message_data in block)
+        if len(block) == HISTORY_BLOCK_SIZE:
+            full_blocks[start] = block_html
+    chat_area.markdown(block_html, unsafe_allow_html=True)
+st.session_state.ui_timings = {"render_ms": (time.perf_counter() - render_started) * 1000}
 
 
 with st.container(): 
@@ -128,21 +137,30 @@ with st.container():
         submit_button = st.form_submit_button(label="Send")
 
 if submit_button and user_input_val:
-    st.session_state.messages.append({"role": "user", "content": user_input_val})
+    submitted_at = time.perf_counter()
+    chat_area.markdown(add_message("user", user_input_val)["html"], unsafe_allow_html=True)
 
     if not st.session_state.get("parking_agent_initialized") or not hasattr(st.session_state, 'parking_agent'):
         st.error("Agent not available. Please refresh or check logs.")
-        st.session_state.messages.append({"role": "assistant", "content": "Error: Agent is not available at the moment."})
+        chat_area.markdown(add_message("assistant", "Error: Agent is not available at the moment.")["html"], unsafe_allow_html=True)
     else:
-        with st.spinner("Assistant is thinking..."):
+        reply_bubble = chat_area.empty()
+        reply_bubble.markdown(render_bubble("assistant", "…"), unsafe_allow_html=True)
+        streamed = []
+        # The root span of the turn: the agent, its tools, the API and crud all join this trace.
+        with span("ui.turn", session_id=st.session_state.session_id) as turn_span:
             try:
-
-                agent_response = st.session_state.parking_agent.invoke_agent(user_input_val)
-                st.session_state.messages.append({"role": "assistant", "content": agent_response})
+                for token in st.session_state.parking_agent.stream_agent(user_input_val):
+                    if not streamed:
+                        st.session_state.ui_timings["first_token_ms"] = (time.perf_counter() - submitted_at) * 1000
+                    streamed.append(token)
+                    reply_bubble.markdown(render_bubble("assistant", "".join(streamed).replace("**", "") + " ▌"), unsafe_allow_html=True)
+                agent_response = "".join(streamed).replace("**", "")
             except Exception as e:
-                print(f"UI: Error invoking agent: {e}") 
+                logger.exception("Error invoking agent: %s", e)
                 error_snippet = str(e)[:150] 
-                user_friendly_error = f"Sorry, I encountered an issue processing your request. (Details: {error_snippet}...)"
-                st.session_state.messages.append({"role": "assistant", "content": user_friendly_error})
-    
-    st.rerun()
\ No newline at end of file
+                agent_response = f"Sorry, I encountered an issue processing your request. (Details: {error_snippet}...)"
+            reply_bubble.markdown(add_message("assistant", agent_response)["html"], unsafe_allow_html=True)
+            st.session_state.ui_timings["response_ms"] = (time.perf_counter() - submitted_at) * 1000
+            turn_span.set(**st.session_state.ui_timings)
+        logger.info("UI timing: %s", st.session_state.ui_timings)